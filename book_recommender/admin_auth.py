@@ -0,0 +1,45 @@
+# admin_auth.py
+"""
+Control de acceso a las rutas de administración (escrituras en el catálogo,
+consultas lentas, ...).
+
+Están desactivadas mientras no se configure un token (ADMIN_TOKEN, o la
+variable de entorno del mismo nombre): responden 404 como si no existieran.
+Con un token configurado, cada petición debe enviarlo en la cabecera
+`Authorization: Bearer <token>` o en `X-Admin-Token`; si falta o no
+coincide, la respuesta es 401.
+"""
+import hmac
+from functools import wraps
+from typing import Optional
+
+from flask import current_app, jsonify, request
+
+
+def _request_token() -> Optional[str]:
+    """
+    Token enviado en la petición (None si no hay ninguno).
+    """
+    auth = request.headers.get("Authorization", "")
+    if auth.lower().startswith("bearer "):
+        return auth[7:].strip()
+    return request.headers.get("X-Admin-Token")
+
+
+def admin_required(view):
+    """
+    Decorador para las rutas que solo puede usar un administrador.
+    """
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        expected = current_app.config.get("ADMIN_TOKEN")
+        if not expected:
+            return jsonify({"error": "Las rutas de administración están desactivadas."}), 404
+
+        token = _request_token()
+        if token is None or not hmac.compare_digest(token.encode("utf-8"), expected.encode("utf-8")):
+            return jsonify({"error": "Token de administración inválido o ausente."}), 401
+        return view(*args, **kwargs)
+
+    return wrapper
@@ -0,0 +1,130 @@
+# admission.py
+"""
+Control de admisión para /api/chat.
+
+Cada petición al chatbot ocupa un hilo del servidor durante varios segundos
+mientras espera a Gemini. Sin límite, en un pico todas las peticiones se
+quedan esperando al LLM y la app deja de responder también en /health y
+/api/recommend.
+
+AdmissionController limita cuántas llamadas al LLM hay en curso a la vez y
+deja una cola de espera corta. Una petición que no consigue hueco:
+  - porque la cola está llena ("queue_full"), o
+  - porque no queda tiempo de su plazo para esperar y además hacer la
+    llamada al LLM ("deadline"),
+no se queda bloqueada: se rechaza o se degrada de inmediato a la respuesta
+SQL de libros populares.
+"""
+import threading
+import time
+from typing import Optional
+
+# Resultados posibles de acquire()
+ADMITTED = "admitted"
+QUEUE_FULL = "queue_full"
+DEADLINE = "deadline"
+
+
+class AdmissionController:
+    """
+    Semáforo con cola acotada, plazo por petición y métricas.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int = 4,
+        max_queue: int = 8,
+        queue_timeout: float = 2.0,
+        deadline: float = 15.0,
+        initial_latency: float = 3.0,
+    ):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.deadline = deadline
+
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._waiting = 0
+        # Media móvil exponencial de la duración de una llamada al LLM
+        self._latency_ewma = initial_latency
+
+        self._admitted = 0
+        self._queued = 0
+        self._shed_queue_full = 0
+        self._shed_deadline = 0
+        self._max_wait = 0.0
+
+    def _wait_budget(self) -> float:
+        """
+        Tiempo máximo que una petición puede esperar en cola y aún
+        terminar la llamada al LLM dentro de su plazo.
+        """
+        return max(0.0, min(self.queue_timeout, self.deadline - self._latency_ewma))
+
+    def acquire(self) -> str:
+        """
+        Intenta conseguir un hueco. Devuelve ADMITTED (hay que llamar a
+        release() al terminar), QUEUE_FULL o DEADLINE.
+        """
+        # Camino rápido: hay hueco libre
+        if self._slots.acquire(blocking=False):
+            with self._lock:
+                self._in_flight += 1
+                self._admitted += 1
+            return ADMITTED
+
+        with self._lock:
+            budget = self._wait_budget()
+            if budget <= 0:
+                self._shed_deadline += 1
+                return DEADLINE
+            if self._waiting >= self.max_queue:
+                self._shed_queue_full += 1
+                return QUEUE_FULL
+            self._waiting += 1
+            self._queued += 1
+
+        start = time.monotonic()
+        ok = self._slots.acquire(timeout=budget)
+        waited = time.monotonic() - start
+
+        with self._lock:
+            self._waiting -= 1
+            self._max_wait = max(self._max_wait, waited)
+            if not ok:
+                self._shed_deadline += 1
+                return DEADLINE
+            self._in_flight += 1
+            self._admitted += 1
+        return ADMITTED
+
+    def release(self, latency: Optional[float] = None) -> None:
+        """
+        Libera el hueco. `latency` (segundos) actualiza la estimación de la
+        duración de una llamada al LLM.
+        """
+        with self._lock:
+            self._in_flight -= 1
+            if latency is not None:
+                self._latency_ewma = 0.8 * self._latency_ewma + 0.2 * latency
+        self._slots.release()
+
+    def snapshot(self) -> dict:
+        """
+        Métricas actuales (para /api/admin/metrics).
+        """
+        with self._lock:
+            return {
+                "max_concurrent": self.max_concurrent,
+                "max_queue": self.max_queue,
+                "in_flight": self._in_flight,
+                "waiting": self._waiting,
+                "admitted": self._admitted,
+                "queued": self._queued,
+                "shed_queue_full": self._shed_queue_full,
+                "shed_deadline": self._shed_deadline,
+                "max_wait_seconds": round(self._max_wait, 4),
+                "llm_latency_ewma_seconds": round(self._latency_ewma, 4),
+            }
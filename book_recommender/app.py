@@ -1,5 +1,11 @@
 # app.py
-from flask import Flask, request, jsonify, render_template
+import math
+import os
+import time
+from typing import Optional
+
+from flask import Flask, Response, g, request, jsonify, render_template, stream_with_context
+from markupsafe import Markup
 from pydantic import ValidationError
 
 from database import db
@@ -9,13 +15,109 @@ from schemas import (
     RecommendationResponse,
     ChatRequest,
     ChatResponse,
+    BulkBooksRequest,
+    BulkBooksResponse,
+    CatalogChangeOut,
+    CatalogChangesResponse,
+    SuggestResponse,
+    FacetsResponse,
+    SimilarBookOut,
+    SimilarBooksResponse,
+)
+from catalog import (
+    CatalogFingerprint,
+    apply_bulk_changes,
+    cached_catalog_fingerprint,
+    changes_since,
+    get_catalog_version,
 )
-from chat_llm import chat_recommend_books
+from http_cache import DEFAULT_MAX_AGE, conditional_response, recommendation_etag
+from admission import ADMITTED, AdmissionController
+from suggest import MAX_SUGGESTIONS, SuggestIndexHolder, get_suggest_index
+from sessions import ChatSession, SessionStore, SQLiteSessionBackend
+from intent_router import RouteStats, get_router
+from slow_queries import DEFAULT_CAPACITY, SlowQueryLog
+from facets import FacetIndex, get_facet_index
+from export import EXPORT_BATCH_SIZE, EXPORT_FORMATS, csv_chunks, export_filters, iter_book_batches, ndjson_chunks
+from fragment_cache import DEFAULT_MAX_BYTES, DEFAULT_MAX_ENTRIES, FragmentCache, prerender_pages
+from retrieval import DEFAULT_STAGE_CACHE_SIZE, RetrievalEngine
+from neighbors import MAX_SIMILAR, NeighborIndex, similar_books
+from book_rows import books_by_ids
+from admin_auth import admin_required
+
+# Nota: el chatbot (chat_llm y google.generativeai) NO se importa aquí.
+# Se carga la primera vez que se llama a /api/chat, de modo que los procesos
+# que solo sirven el recomendador clásico, los scripts y los tests no pagan
+# el coste de importar todo el stack del LLM al arrancar.
+
+
+def _env_flag(name: str) -> bool:
+    """
+    Lee una variable de entorno booleana ("1", "true", "yes", "on").
+    """
+    return os.environ.get(name, "").strip().lower() in ("1", "true", "yes", "on")
+
+
+def _clamped(value: Optional[str], default, low, high, cast=float):
+    """
+    `value` convertido con `cast` y recortado a [low, high]; `default` si
+    falta o no es un número.
+    """
+    try:
+        number = cast(value)
+    except (TypeError, ValueError):
+        return default
+    if isinstance(number, float) and math.isnan(number):
+        return default
+    return min(max(number, low), high)
 
 
-def create_app():
+def _form_params(values) -> RecommendationRequest:
+    """
+    Construye un RecommendationRequest a partir del formulario HTML
+    (request.form o request.args): los valores fuera de rango se recortan a
+    los límites de RecommendationRequest y los que no son válidos toman el
+    valor por defecto.
+    """
+    favorite_genre = values.get("favorite_genre") or None
+    query = (values.get("query") or "")[:200] or None
+    min_rating = _clamped(values.get("min_rating"), 4.0, 0.0, 5.0)
+    limit = _clamped(values.get("limit"), 5, 1, 50, cast=int)
+    diversity = _clamped(values.get("diversity"), 0.0, 0.0, 1.0)
+
+    return RecommendationRequest(
+        favorite_genre=favorite_genre,
+        min_rating=min_rating,
+        limit=limit,
+        diversity=diversity,
+        query=query,
+    )
+
+
+def _save_turn(
+    sessions: SessionStore,
+    session: Optional[ChatSession],
+    chat_req: ChatRequest,
+    chat_resp: ChatResponse,
+) -> None:
+    """
+    Guarda en la sesión un turno respondido sin pasar por chat_llm
+    (router local o respuesta degradada).
+    """
+    if session is None:
+        return
+    session.add_message("user", chat_req.message)
+    session.add_message("assistant", chat_resp.reply)
+    chat_resp.session_id = session.session_id
+    sessions.put(session)
+
+
+def create_app(config: Optional[dict] = None):
     """
     Crea e inicializa la aplicación Flask.
+
+    config: valores opcionales que sobrescriben la configuración por defecto
+    (útil para tests o para arrancar en modo "solo recomendador").
     """
     app = Flask(__name__)
 
@@ -23,22 +125,169 @@ def create_app():
     app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///books.db"
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 
+    # Modo "solo recomendador": desactiva el chatbot con LLM.
+    # Se puede activar con la variable de entorno RECOMMEND_ONLY=1.
+    app.config["RECOMMEND_ONLY"] = _env_flag("RECOMMEND_ONLY")
+
+    # max-age (segundos) del Cache-Control de las recomendaciones por GET
+    app.config["RECOMMEND_CACHE_MAX_AGE"] = DEFAULT_MAX_AGE
+    # Cada cuánto (s) se relee la huella del catálogo para el ETag
+    app.config["RECOMMEND_CATALOG_REFRESH_SECONDS"] = 1.0
+
+    # Control de admisión de /api/chat (ver admission.py)
+    app.config["CHAT_MAX_CONCURRENT"] = 4  # llamadas al LLM en paralelo
+    app.config["CHAT_MAX_QUEUE"] = 8  # peticiones esperando hueco
+    app.config["CHAT_QUEUE_TIMEOUT"] = 2.0  # espera máxima en cola (s)
+    app.config["CHAT_DEADLINE"] = 15.0  # plazo total de una petición (s)
+    # "degrade": responde con libros populares (SQL); "reject": 503
+    app.config["CHAT_OVERLOAD_MODE"] = "degrade"
+
+    # Router local: responde sin Gemini las consultas simples del chat
+    app.config["CHAT_LOCAL_ROUTER"] = True
+
+    # Modelo alternativo a Gemini (función sin argumentos); None = Gemini real.
+    # Lo usa load_test.py para probar sin red (ver chat_llm._get_model)
+    app.config["CHAT_LLM_MODEL_FACTORY"] = None
+
+    # Sesiones de chat en el servidor (ver sessions.py)
+    app.config["CHAT_SESSION_BACKEND"] = "memory"  # "memory" o "sqlite"
+    app.config["CHAT_SESSION_TTL"] = 1800.0  # segundos sin actividad
+    app.config["CHAT_SESSION_MAX"] = 10000  # sesiones en memoria (LRU)
+
+    # Cada cuánto (s) se comprueba si otro proceso ha cambiado el catálogo
+    # para reconstruir el índice de autocompletado
+    app.config["SUGGEST_REFRESH_SECONDS"] = 1.0
+    # Reconstruir el índice en segundo plano (False: en la propia petición)
+    app.config["SUGGEST_BACKGROUND_REBUILD"] = True
+
+    # Registro de consultas lentas (ver slow_queries.py). Desactivado (None)
+    # por defecto; para activarlo, un umbral en ms (p. ej. 100)
+    app.config["SLOW_QUERY_THRESHOLD_MS"] = None
+    app.config["SLOW_QUERY_LOG_SIZE"] = DEFAULT_CAPACITY  # consultas recientes guardadas
+    app.config["SLOW_QUERY_EXPLAIN"] = True  # guardar EXPLAIN QUERY PLAN
+    app.config["SLOW_QUERY_KEEP_PARAMS"] = False  # False: parámetros ocultos ("?")
+
+    # Cada cuánto (s) se comprueba si otro proceso ha cambiado el catálogo
+    # para poner al día las facetas (ver facets.py)
+    app.config["FACETS_REFRESH_SECONDS"] = 1.0
+
+    # Filas por consulta en /api/books/export (ver export.py)
+    app.config["EXPORT_BATCH_SIZE"] = EXPORT_BATCH_SIZE
+
+    # Frontend HTML (ver fragment_cache.py)
+    app.config["HTML_PRERENDER"] = True  # pre-renderizar páginas al arrancar
+    app.config["HTML_FRAGMENT_CACHE_ENTRIES"] = DEFAULT_MAX_ENTRIES
+    app.config["HTML_FRAGMENT_CACHE_BYTES"] = DEFAULT_MAX_BYTES
+    # Cada cuánto (s) se comprueba si otro proceso ha cambiado el catálogo
+    app.config["HTML_CATALOG_REFRESH_SECONDS"] = 1.0
+
+    # Recuperación híbrida de candidatos (ver retrieval.py)
+    app.config["RETRIEVAL_FUSION"] = "rrf"  # "rrf" o "weighted"
+    app.config["RETRIEVAL_BUDGETS"] = {}  # candidatos por etapa, p. ej. {"vector": 0} la apaga
+    app.config["RETRIEVAL_WEIGHTS"] = {}  # peso de cada etapa en la fusión
+    app.config["RETRIEVAL_STAGE_CACHE_SIZE"] = DEFAULT_STAGE_CACHE_SIZE
+    # Cada cuánto (s) se comprueba si otro proceso ha cambiado el catálogo
+    app.config["RETRIEVAL_REFRESH_SECONDS"] = 1.0
+
+    # Token de las rutas de administración (ver admin_auth.py).
+    # Sin token (por defecto) esas rutas están desactivadas.
+    app.config["ADMIN_TOKEN"] = os.environ.get("ADMIN_TOKEN") or None
+
+    # Vecinos precalculados con `python neighbors.py build` (ver neighbors.py)
+    app.config["NEIGHBORS_PATH"] = os.path.join(app.instance_path, "neighbors.bin")
+
+    if config:
+        app.config.update(config)
+
+    app.extensions["chat_admission"] = AdmissionController(
+        max_concurrent=app.config["CHAT_MAX_CONCURRENT"],
+        max_queue=app.config["CHAT_MAX_QUEUE"],
+        queue_timeout=app.config["CHAT_QUEUE_TIMEOUT"],
+        deadline=app.config["CHAT_DEADLINE"],
+    )
+    app.extensions["chat_route_stats"] = RouteStats()
+    app.extensions["facets"] = FacetIndex()
+    app.extensions["suggest"] = SuggestIndexHolder()
+    app.extensions["retrieval"] = RetrievalEngine(
+        budgets=app.config["RETRIEVAL_BUDGETS"],
+        weights=app.config["RETRIEVAL_WEIGHTS"],
+        fusion=app.config["RETRIEVAL_FUSION"],
+        cache_size=app.config["RETRIEVAL_STAGE_CACHE_SIZE"],
+    )
+    app.extensions["neighbors"] = NeighborIndex(app.config["NEIGHBORS_PATH"])
+    app.extensions["html_fragments"] = FragmentCache(
+        max_entries=app.config["HTML_FRAGMENT_CACHE_ENTRIES"],
+        max_bytes=app.config["HTML_FRAGMENT_CACHE_BYTES"],
+    )
+    app.extensions["chat_sessions"] = SessionStore(
+        max_sessions=app.config["CHAT_SESSION_MAX"],
+        ttl=app.config["CHAT_SESSION_TTL"],
+        backend=(
+            SQLiteSessionBackend()
+            if app.config["CHAT_SESSION_BACKEND"] == "sqlite"
+            else None
+        ),
+    )
+
     # Inicializamos SQLAlchemy con esta app
     db.init_app(app)
 
+    if app.config["SLOW_QUERY_THRESHOLD_MS"] is not None:
+        slow_log = SlowQueryLog(
+            threshold_ms=app.config["SLOW_QUERY_THRESHOLD_MS"],
+            capacity=app.config["SLOW_QUERY_LOG_SIZE"],
+            explain=app.config["SLOW_QUERY_EXPLAIN"],
+            keep_params=app.config["SLOW_QUERY_KEEP_PARAMS"],
+        )
+        with app.app_context():
+            slow_log.install(db.engine)
+        app.extensions["slow_queries"] = slow_log
+
+    @app.after_request
+    def add_server_timing(response):
+        """
+        Latencia de cada etapa de la recuperación híbrida, si la petición
+        la ha usado (cabecera Server-Timing, visible en las DevTools).
+        """
+        timings = g.get("retrieval_timings")
+        if timings:
+            response.headers["Server-Timing"] = ", ".join(
+                f"retrieval-{name};dur={seconds * 1000:.2f}" for name, seconds in timings.items()
+            )
+        return response
+
     # ---------- RUTAS API (MODELO CLÁSICO) ----------
 
     @app.route("/health", methods=["GET"])
     def health():
         return jsonify({"status": "ok"})
 
-    @app.route("/api/recommend", methods=["POST"])
+    @app.route("/api/recommend", methods=["GET", "POST"])
     def api_recommend():
         """
         Endpoint principal de la API clásica (JSON in -> JSON out).
         Usa el recomendador basado en filtros SQL.
+
+        Por GET los parámetros van en la query string y la respuesta lleva
+        ETag/Cache-Control: si el cliente ya tiene la versión actual recibe
+        un 304 sin que se ejecute el recomendador.
         """
         try:
+            if request.method == "GET":
+                params = RecommendationRequest(**request.args.to_dict())
+                fingerprint = cached_catalog_fingerprint(
+                    max_age=app.config["RECOMMEND_CATALOG_REFRESH_SECONDS"]
+                )
+                etag = recommendation_etag("json", params, fingerprint)
+                return conditional_response(
+                    etag,
+                    lambda: jsonify(
+                        RecommendationResponse(
+                            recommendations=recommend_books(params)
+                        ).dict()
+                    ),
+                )
+
             data = request.get_json()
             if data is None:
                 return (
@@ -67,6 +316,29 @@ def create_app():
         response = RecommendationResponse(recommendations=recommendations)
         return jsonify(response.dict())
 
+    @app.route("/api/suggest", methods=["GET"])
+    def api_suggest():
+        """
+        Autocompletado de títulos, autores y géneros (índice de prefijos en memoria).
+        """
+        prefix = request.args.get("prefix", "")
+        limit = min(max(request.args.get("limit", MAX_SUGGESTIONS, type=int), 1), MAX_SUGGESTIONS)
+        kind = request.args.get("kind")
+        if kind not in (None, "title", "author", "genre"):
+            return jsonify({"error": "kind debe ser 'title', 'author' o 'genre'."}), 400
+
+        suggestions = get_suggest_index().suggest(prefix, limit, kind)
+        return jsonify(SuggestResponse(prefix=prefix, suggestions=suggestions).dict())
+
+    @app.route("/api/facets", methods=["GET"])
+    def api_facets():
+        """
+        Facetas para los filtros del frontend: libros por género, histograma
+        de notas y libros por encima de cada nota mínima. Se sirven desde
+        memoria (ver facets.py).
+        """
+        return jsonify(FacetsResponse(**get_facet_index().snapshot()).dict())
+
     # ---------- RUTAS API (CHATBOT CON GEMINI) ----------
 
     @app.route("/api/chat", methods=["POST"])
@@ -78,6 +350,17 @@ def create_app():
           - reply: texto del asistente
           - recommendations: lista de libros recomendados
         """
+        if app.config["RECOMMEND_ONLY"]:
+            return (
+                jsonify(
+                    {
+                        "error": "El chatbot está deshabilitado en este despliegue "
+                        "(modo solo recomendador).",
+                    }
+                ),
+                503,
+            )
+
         data = request.get_json()
         if data is None:
             return jsonify({"error": "Se esperaba un cuerpo JSON."}), 400
@@ -86,68 +369,291 @@ def create_app():
             chat_req = ChatRequest(**data)
         except ValidationError as e:
             return (
-                jsonify({"error": "Entrada inválida", "details": e.errors()}),
+                jsonify(
+                    {
+                        "error": "Entrada inválida",
+                        "details": e.errors(include_context=False),
+                    }
+                ),
                 400,
             )
 
-        chat_resp: ChatResponse = chat_recommend_books(chat_req)
+        # Modo sesión: el cliente solo envía el mensaje nuevo
+        sessions: SessionStore = app.extensions["chat_sessions"]
+        session = None
+        if chat_req.message is not None:
+            if chat_req.session_id:
+                session = sessions.get(chat_req.session_id)
+            if session is None:
+                session = sessions.create()
+
+        # Router local: las consultas simples no necesitan al LLM
+        route_stats: RouteStats = app.extensions["chat_route_stats"]
+        if app.config["CHAT_LOCAL_ROUTER"]:
+            start = time.perf_counter()
+            if session is not None:
+                latest, first_turn = chat_req.message, not session.messages
+            else:
+                user_msgs = [m for m in chat_req.messages if m.role == "user"]
+                latest = user_msgs[-1].content if user_msgs else ""
+                first_turn = len(user_msgs) <= 1
+            query = get_router().parse(latest, first_turn)
+            if query is not None:
+                chat_resp = get_router().answer(query)
+                _save_turn(sessions, session, chat_req, chat_resp)
+                route_stats.record("routed", time.perf_counter() - start)
+                response = jsonify(chat_resp.dict())
+                response.headers["X-Chat-Route"] = "local"
+                return response
+
+        # Import diferido: el stack del LLM se carga en la primera petición
+        from chat_llm import chat_recommend_books, popular_books_response
+
+        # Control de admisión: si no hay hueco, no esperamos al LLM
+        admission: AdmissionController = app.extensions["chat_admission"]
+        outcome = admission.acquire()
+        if outcome != ADMITTED:
+            if app.config["CHAT_OVERLOAD_MODE"] == "reject":
+                response = jsonify(
+                    {"error": "El chatbot está saturado. Inténtalo de nuevo en unos segundos."}
+                )
+                response.status_code = 503
+                response.headers["Retry-After"] = "1"
+            else:
+                degraded = popular_books_response(
+                    "Ahora mismo el asistente está atendiendo muchas peticiones. "
+                    "Mientras tanto, te recomiendo algunos de los libros más "
+                    "populares de la base de datos."
+                )
+                _save_turn(sessions, session, chat_req, degraded)
+                response = jsonify(degraded.dict())
+            response.headers["X-Chat-Degraded"] = outcome
+            return response
+
+        start = time.monotonic()
+        try:
+            chat_resp: ChatResponse = chat_recommend_books(chat_req, session)
+        finally:
+            admission.release(time.monotonic() - start)
+        route_stats.record("llm", time.monotonic() - start)
+
+        if session is not None:
+            sessions.put(session)
         return jsonify(chat_resp.dict())
 
-    # ---------- RUTAS HTML (FRONTEND) ----------
+    # ---------- RUTAS API (ADMINISTRACIÓN) ----------
 
-    @app.route("/", methods=["GET"])
-    def index():
+    @app.route("/api/admin/metrics", methods=["GET"])
+    @admin_required
+    def api_admin_metrics():
         """
-        Página principal con el formulario clásico.
+        Métricas internas del proceso (cola y descartes del chatbot, ...).
+        Requiere el token de administración (ver admin_auth.py).
         """
-        return render_template("index.html")
+        return jsonify(
+            {
+                "chat_admission": {
+                    **app.extensions["chat_admission"].snapshot(),
+                    "overload_mode": app.config["CHAT_OVERLOAD_MODE"],
+                },
+                "chat_sessions": app.extensions["chat_sessions"].snapshot(),
+                "chat_routing": app.extensions["chat_route_stats"].snapshot(),
+                "html_fragments": app.extensions["html_fragments"].snapshot(),
+                "retrieval": app.extensions["retrieval"].snapshot(),
+                "neighbors": app.extensions["neighbors"].snapshot(),
+            }
+        )
 
-    @app.route("/recommendations", methods=["POST"])
-    def recommendations_page():
+    @app.route("/api/admin/slow-queries", methods=["GET"])
+    @admin_required
+    def api_admin_slow_queries():
         """
-        Procesa el formulario clásico y muestra recomendaciones.
+        Consultas SQL lentas: las sentencias que más tiempo acumulan (o con
+        peor caso, con order=max), con su plan de ejecución, y las más recientes.
+        Requiere el token de administración (ver admin_auth.py).
         """
-        favorite_genre = request.form.get("favorite_genre") or None
-        min_rating_str = request.form.get("min_rating") or "4.0"
-        limit_str = request.form.get("limit") or "5"
+        slow_log: Optional[SlowQueryLog] = app.extensions.get("slow_queries")
+        if slow_log is None:
+            return jsonify({"error": "El registro de consultas lentas está desactivado."}), 404
 
-        try:
-            min_rating = float(min_rating_str)
-        except ValueError:
-            min_rating = 4.0
+        order = request.args.get("order", "total")
+        if order not in ("total", "max"):
+            return jsonify({"error": "order debe ser 'total' o 'max'."}), 400
+        limit = min(max(request.args.get("limit", 20, type=int), 1), 100)
+        return jsonify(slow_log.snapshot(limit=limit, order_by=order))
+
+    # ---------- RUTAS API (CATÁLOGO) ----------
+
+    @app.route("/api/books/bulk", methods=["POST"])
+    @admin_required
+    def api_books_bulk():
+        """
+        Aplica un lote de upserts y deletes de libros en una única transacción.
+        Cada lote genera una nueva versión del catálogo. Requiere el token de
+        administración (ver admin_auth.py).
+        """
+        data = request.get_json()
+        if data is None:
+            return jsonify({"error": "Se esperaba un cuerpo JSON."}), 400
 
         try:
-            limit = int(limit_str)
-        except ValueError:
-            limit = 5
-
-        params = RecommendationRequest(
-            favorite_genre=favorite_genre,
-            min_rating=min_rating,
-            limit=limit,
+            bulk_req = BulkBooksRequest(**data)
+        except ValidationError as e:
+            return (
+                jsonify(
+                    {
+                        "error": "Entrada inválida",
+                        # include_context=False: el contexto puede contener
+                        # excepciones que no se pueden serializar a JSON
+                        "details": e.errors(include_context=False),
+                    }
+                ),
+                400,
+            )
+
+        event = apply_bulk_changes(bulk_req)
+        response = BulkBooksResponse(
+            version=event.version,
+            upserted_ids=list(event.upserted_ids),
+            deleted_ids=list(event.deleted_ids),
         )
+        return jsonify(response.dict())
 
-        recs = recommend_books(params)
+    @app.route("/api/catalog/changes", methods=["GET"])
+    def api_catalog_changes():
+        """
+        Feed de cambios del catálogo posteriores a la versión `since`.
+        """
+        since = request.args.get("since", 0, type=int)
+        limit = min(max(request.args.get("limit", 1000, type=int), 1), 1000)
 
-        return render_template(
-            "recommendations.html",
-            recommendations=recs,
-            params=params,
+        changes = [
+            CatalogChangeOut(version=c.version, book_id=c.book_id, op=c.op)
+            for c in changes_since(since, limit)
+        ]
+        response = CatalogChangesResponse(
+            version=get_catalog_version(), changes=changes
         )
+        return jsonify(response.dict())
+
+    @app.route("/api/books/export", methods=["GET"])
+    def api_books_export():
+        """
+        Exporta el catálogo en streaming (format=ndjson|csv), con memoria
+        constante. Filtros opcionales: genre, min_rating y since_version
+        (libros creados o modificados después de esa versión del catálogo).
+        """
+        fmt = request.args.get("format", "ndjson")
+        if fmt not in EXPORT_FORMATS:
+            return jsonify({"error": "format debe ser 'ndjson' o 'csv'."}), 400
+        min_rating = request.args.get("min_rating", type=float)
+        since_version = request.args.get("since_version", type=int)
+        if ("min_rating" in request.args and min_rating is None) or (
+            "since_version" in request.args and since_version is None
+        ):
+            return jsonify({"error": "min_rating debe ser un número y since_version un entero."}), 400
+
+        filters = export_filters(request.args.get("genre"), min_rating, since_version)
+        batches = iter_book_batches(filters, app.config["EXPORT_BATCH_SIZE"])
+        chunks = ndjson_chunks(batches) if fmt == "ndjson" else csv_chunks(batches)
+
+        mimetype, extension = EXPORT_FORMATS[fmt]
+        return Response(
+            stream_with_context(chunks),
+            mimetype=mimetype,
+            headers={
+                "Content-Disposition": f'attachment; filename="books.{extension}"',
+                "X-Catalog-Version": str(get_catalog_version()),
+            },
+        )
+
+    @app.route("/api/books/<int:book_id>/similar", methods=["GET"])
+    def api_similar_books(book_id: int):
+        """
+        Libros parecidos a uno dado (similitud de coseno entre sus textos).
+        Salen del fichero de vecinos precalculado, como mucho su k; si el
+        libro es posterior al fichero, se calculan al momento con los
+        vectores del fichero. Sin fichero la lista está vacía.
+        """
+        limit = min(max(request.args.get("limit", 10, type=int), 1), MAX_SIMILAR)
+        if not books_by_ids([book_id]):
+            return jsonify({"error": f"No existe el libro {book_id}."}), 404
+
+        source, hits = similar_books(book_id, limit)
+        similarity = dict(hits)
+        # books_by_ids descarta los vecinos borrados después de calcular el fichero
+        books = books_by_ids([i for i, _ in hits])[:limit]
+        similar = [
+            SimilarBookOut(**b.to_out().dict(), similarity=round(similarity[b.id], 4)) for b in books
+        ]
+        return jsonify(SimilarBooksResponse(book_id=book_id, source=source, similar=similar).dict())
+
+    # ---------- RUTAS HTML (FRONTEND) ----------
+
+    def _page(template: str, fragment: str = "") -> str:
+        """
+        Página pre-renderizada (si la hay) con `fragment` en su hueco.
+        """
+        shell = app.extensions.get("html_pages", {}).get(template)
+        if shell is not None:
+            return shell.fill(fragment)
+        return render_template(template, fragment=Markup(fragment))
+
+    def _recommendations_html(params: RecommendationRequest, fingerprint: CatalogFingerprint) -> str:
+        """
+        Página de resultados. La lista se cachea por (huella del catálogo, parámetros).
+        """
+        fragment = app.extensions["html_fragments"].get_or_render(
+            (fingerprint, params.cache_key()),
+            lambda: render_template(
+                "_recommendation_list.html",
+                recommendations=recommend_books(params),
+            ),
+        )
+        return _page("recommendations.html", fragment)
+
+    @app.route("/", methods=["GET"])
+    def index():
+        """
+        Página principal con el formulario clásico.
+        """
+        return _page("index.html")
+
+    @app.route("/recommendations", methods=["GET", "POST"])
+    def recommendations_page():
+        """
+        Procesa el formulario clásico y muestra recomendaciones.
+        Por GET (formulario con method="get") admite ETag / 304.
+        """
+        fingerprint = cached_catalog_fingerprint(max_age=app.config["HTML_CATALOG_REFRESH_SECONDS"])
+        if request.method == "GET":
+            params = _form_params(request.args)
+            etag = recommendation_etag("html", params, fingerprint)
+            return conditional_response(
+                etag, lambda: _recommendations_html(params, fingerprint)
+            )
+
+        params = _form_params(request.form)
+        return _recommendations_html(params, fingerprint)
 
     @app.route("/chat", methods=["GET"])
     def chat_page():
         """
         Página con interfaz tipo chat para recomendaciones LLM.
         """
-        return render_template("chat.html")
+        return _page("chat.html")
 
     @app.route("/docs", methods=["GET"])
     def docs():
         """
         Página de documentación sencilla de la API.
         """
-        return render_template("docs.html")
+        return _page("docs.html")
+
+    if app.config["HTML_PRERENDER"]:
+        app.extensions["html_pages"] = prerender_pages(
+            app, ["index.html", "chat.html", "docs.html", "recommendations.html"]
+        )
 
     return app
 
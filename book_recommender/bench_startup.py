@@ -0,0 +1,103 @@
+# bench_startup.py
+"""
+Benchmark de arranque en frío de la aplicación.
+
+Lanza varios procesos Python nuevos y mide en cada uno:
+  - el tiempo de `import app`,
+  - el tiempo de `create_app()`,
+  - si se ha cargado el stack del LLM (chat_llm / google.generativeai).
+
+Uso:
+    python bench_startup.py --runs 10
+    python bench_startup.py --runs 10 --max-ms 500   # falla si se supera
+
+Con --max-ms el script termina con código 1 si la mediana del arranque
+total supera el umbral, para poder usarlo en CI y evitar regresiones.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Código que se ejecuta en cada proceso hijo (arranque en frío real)
+_CHILD_CODE = """
+import json, sys, time
+t0 = time.perf_counter()
+import app
+t1 = time.perf_counter()
+app.create_app()
+t2 = time.perf_counter()
+print(json.dumps({
+    "import_ms": (t1 - t0) * 1000,
+    "create_app_ms": (t2 - t1) * 1000,
+    "llm_loaded": "chat_llm" in sys.modules
+    or "google.generativeai" in sys.modules,
+}))
+"""
+
+
+def measure_once() -> dict:
+    """
+    Mide un arranque en frío en un proceso nuevo.
+    """
+    out = subprocess.run(
+        [sys.executable, "-c", _CHILD_CODE],
+        cwd=HERE,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def run(runs: int) -> dict:
+    """
+    Repite la medición `runs` veces y devuelve medianas y máximos.
+    """
+    samples = [measure_once() for _ in range(runs)]
+    import_ms = [s["import_ms"] for s in samples]
+    create_ms = [s["create_app_ms"] for s in samples]
+    total_ms = [i + c for i, c in zip(import_ms, create_ms)]
+    return {
+        "runs": runs,
+        "import_ms_median": statistics.median(import_ms),
+        "create_app_ms_median": statistics.median(create_ms),
+        "total_ms_median": statistics.median(total_ms),
+        "total_ms_max": max(total_ms),
+        "llm_loaded": any(s["llm_loaded"] for s in samples),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument(
+        "--max-ms",
+        type=float,
+        default=None,
+        help="Umbral de la mediana del arranque total (import + create_app).",
+    )
+    args = parser.parse_args()
+
+    result = run(args.runs)
+    print(json.dumps(result, indent=2))
+
+    if result["llm_loaded"]:
+        print("ERROR: el arranque ha cargado el stack del LLM.", file=sys.stderr)
+        return 1
+    if args.max_ms is not None and result["total_ms_median"] > args.max_ms:
+        print(
+            f"ERROR: arranque de {result['total_ms_median']:.1f} ms "
+            f"(umbral {args.max_ms:.1f} ms).",
+            file=sys.stderr,
+        )
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
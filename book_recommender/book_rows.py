@@ -0,0 +1,95 @@
+# book_rows.py
+"""
+Lecturas de solo lectura de la tabla books, sin el ORM.
+
+Los caminos de lectura (recomendador, candidatos del chat, búsquedas por
+ID) solo necesitan unas pocas columnas y nunca modifican los libros. Aquí
+se seleccionan esas columnas como filas planas y se guardan en BookRow, un
+objeto con __slots__: sin identity map, sin seguimiento de cambios y sin
+cargar created_at.
+
+BookRow tiene los mismos atributos de lectura que Book, así que sirve
+donde antes se pasaba un Book (diversify_books, el prompt del chat, ...).
+"""
+from typing import Iterable, List
+
+from sqlalchemy.sql import Select
+
+from database import db
+from models import Book
+from schemas import BookOut
+
+
+class BookRow:
+    """
+    Libro leído de la BD (solo las columnas que usan las recomendaciones).
+    """
+    __slots__ = ("id", "title", "author", "genre", "description", "rating", "n_ratings")
+
+    def __init__(self, id, title, author, genre, description, rating, n_ratings):
+        self.id = id
+        self.title = title
+        self.author = author
+        self.genre = genre
+        self.description = description
+        self.rating = rating
+        self.n_ratings = n_ratings
+
+    def to_out(self) -> BookOut:
+        return BookOut(
+            id=self.id,
+            title=self.title,
+            author=self.author,
+            genre=self.genre,
+            description=self.description,
+            rating=self.rating,
+        )
+
+
+# Columnas en el orden de los argumentos de BookRow
+BOOK_ROW_COLUMNS = (
+    Book.id, Book.title, Book.author, Book.genre, Book.description, Book.rating, Book.n_ratings,
+)
+
+# Orden por defecto de las recomendaciones: mejor nota, luego más valoraciones
+POPULARITY_ORDER = (Book.rating.desc(), Book.n_ratings.desc())
+
+
+def select_book_rows() -> Select:
+    """
+    SELECT de las columnas de BookRow, para añadirle filtros y orden.
+    """
+    return db.select(*BOOK_ROW_COLUMNS)
+
+
+def fetch_book_rows(stmt: Select) -> List[BookRow]:
+    """
+    Ejecuta `stmt` (construido con select_book_rows) y devuelve BookRow.
+    """
+    return [BookRow(*row) for row in db.session.execute(stmt)]
+
+
+def top_rated_books(limit: int) -> List[BookRow]:
+    """
+    Los `limit` libros mejor valorados.
+    """
+    return fetch_book_rows(select_book_rows().order_by(*POPULARITY_ORDER).limit(limit))
+
+
+def books_by_ids(ids: List[int], *filters) -> List[BookRow]:
+    """
+    Libros por ID manteniendo el orden de `ids` (los que no existen, o no
+    cumplen los `filters` SQL opcionales, se omiten).
+    """
+    if not ids:
+        return []
+    rows = fetch_book_rows(select_book_rows().where(Book.id.in_(ids), *filters))
+    by_id = {row.id: row for row in rows}
+    return [by_id[i] for i in ids if i in by_id]
+
+
+def to_book_outs(rows: Iterable[BookRow]) -> List[BookOut]:
+    """
+    Convierte filas en BookOut para las respuestas de la API.
+    """
+    return [row.to_out() for row in rows]
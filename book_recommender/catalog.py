@@ -0,0 +1,252 @@
+# catalog.py
+"""
+Escritura del catálogo por lotes y feed de cambios.
+
+Cada lote de upserts/deletes se aplica en una sola transacción y añade una
+fila a `catalog_versions` (versión monótona del catálogo) más un registro
+por libro afectado en `catalog_changes`.
+
+Los componentes que mantienen estado derivado del catálogo (cachés,
+rankings, índices de búsqueda o similitud) pueden:
+  - suscribirse con `subscribe()` para enterarse de los cambios aplicados
+    en este proceso nada más hacer commit, o
+  - leer `changes_since(version)` para ponerse al día de forma incremental
+    (por ejemplo, cambios hechos por otro proceso).
+
+La versión solo cambia con los lotes registrados. Lo que dependa de los
+datos en sí (un ETag, un índice en memoria) debe usar la huella del
+catálogo (`get_catalog_fingerprint()`): la versión más el nº de escrituras
+en `books` que no han pasado por aquí (un UPDATE a mano, un script de
+carga, una BD recreada, ...), que cuentan unos triggers de SQLite (ver
+models.CatalogWriteCounter). Un índice con la misma cuenta de escrituras
+externas que la huella puede ponerse al día con el feed; si la cuenta no
+coincide, tiene que reconstruirse.
+"""
+import time
+from typing import Callable, List, NamedTuple, Tuple
+
+from flask import current_app
+from sqlalchemy import func, insert
+
+from database import db
+from models import Book, CatalogChange, CatalogVersion, CatalogWriteCounter
+from schemas import BulkBooksRequest
+
+
+class CatalogEvent(NamedTuple):
+    """
+    Cambio ya confirmado en la BD.
+    """
+    version: int
+    upserted_ids: Tuple[int, ...]
+    deleted_ids: Tuple[int, ...]
+
+
+class CatalogFingerprint(NamedTuple):
+    """
+    Versión del catálogo más el nº de escrituras externas en `books`.
+    """
+    version: int
+    external_writes: int
+
+
+CatalogListener = Callable[[CatalogEvent], None]
+
+_listeners: List[CatalogListener] = []
+
+
+def subscribe(listener: CatalogListener) -> CatalogListener:
+    """
+    Registra una función que se llama (dentro del contexto de la app) tras
+    cada lote aplicado en este proceso. Se puede usar como decorador.
+    """
+    if listener not in _listeners:
+        _listeners.append(listener)
+    return listener
+
+
+def unsubscribe(listener: CatalogListener) -> None:
+    if listener in _listeners:
+        _listeners.remove(listener)
+
+
+def get_catalog_version() -> int:
+    """
+    Versión actual del catálogo (0 si nunca se ha aplicado ningún lote).
+    """
+    return db.session.query(func.max(CatalogVersion.version)).scalar() or 0
+
+
+def cached_catalog_version(max_age: float = 1.0) -> int:
+    """
+    Versión del catálogo cacheada en el proceso durante `max_age` segundos.
+
+    Pensada para índices en memoria que necesitan comprobar la versión en
+    cada petición sin ir a la BD: los lotes aplicados en este proceso la
+    actualizan al instante y los de otros procesos se ven como mucho
+    `max_age` segundos después.
+    """
+    state = current_app.extensions.setdefault(
+        "catalog_version_cache", {"version": None, "checked_at": 0.0}
+    )
+    now = time.monotonic()
+    if state["version"] is None or now - state["checked_at"] > max_age:
+        state["version"] = get_catalog_version()
+        state["checked_at"] = now
+    return state["version"]
+
+
+def get_external_writes() -> int:
+    """
+    Escrituras en `books` hechas sin pasar por apply_bulk_changes.
+    """
+    return db.session.scalar(db.select(CatalogWriteCounter.n).where(CatalogWriteCounter.id == 1)) or 0
+
+
+def forget_own_writes(external_writes: int) -> None:
+    """
+    Devuelve el contador de escrituras externas a `external_writes` (su
+    valor al empezar la transacción), descontando las que acaba de contar
+    el trigger por las escrituras de un lote que sí queda registrado.
+    """
+    db.session.execute(
+        db.update(CatalogWriteCounter).where(CatalogWriteCounter.id == 1).values(n=external_writes)
+    )
+
+
+def get_catalog_fingerprint() -> CatalogFingerprint:
+    """
+    Huella actual del catálogo (una consulta por clave primaria, sin leer
+    `books`).
+    """
+    version, external_writes = db.session.execute(
+        db.select(
+            db.select(func.max(CatalogVersion.version)).scalar_subquery(),
+            db.select(CatalogWriteCounter.n).where(CatalogWriteCounter.id == 1).scalar_subquery(),
+        )
+    ).one()
+    return CatalogFingerprint(version or 0, external_writes or 0)
+
+
+def cached_catalog_fingerprint(max_age: float = 1.0) -> CatalogFingerprint:
+    """
+    Como cached_catalog_version(), pero con la huella completa.
+    """
+    state = current_app.extensions.setdefault(
+        "catalog_fingerprint_cache", {"fingerprint": None, "checked_at": 0.0}
+    )
+    now = time.monotonic()
+    if state["fingerprint"] is None or now - state["checked_at"] > max_age:
+        state["fingerprint"] = get_catalog_fingerprint()
+        state["checked_at"] = now
+    return state["fingerprint"]
+
+
+def changes_since(version: int, limit: int = 1000) -> List[CatalogChange]:
+    """
+    Cambios con versión estrictamente mayor que `version`, en orden.
+    """
+    return (
+        CatalogChange.query
+        .filter(CatalogChange.version > version)
+        .order_by(CatalogChange.version, CatalogChange.id)
+        .limit(limit)
+        .all()
+    )
+
+
+def apply_bulk_changes(bulk_req: BulkBooksRequest) -> CatalogEvent:
+    """
+    Aplica un lote de upserts y deletes en una única transacción y registra
+    la nueva versión del catálogo. Si algo falla, no se aplica nada.
+    """
+    upsert_ids = [b.id for b in bulk_req.upserts if b.id is not None]
+    try:
+        external_writes = get_external_writes()
+
+        # 1. Upserts: actualizamos los que existen e insertamos el resto
+        existing = {}
+        if upsert_ids:
+            existing = {
+                b.id: b for b in Book.query.filter(Book.id.in_(upsert_ids)).all()
+            }
+
+        touched: List[Book] = []
+        for item in bulk_req.upserts:
+            fields = item.dict(exclude={"id"})
+            book = existing.get(item.id)
+            if book is None:
+                book = Book(id=item.id, **fields)
+                db.session.add(book)
+            else:
+                for name, value in fields.items():
+                    setattr(book, name, value)
+            touched.append(book)
+
+        # 2. Deletes: solo registramos los ids que existían de verdad
+        deleted_ids: List[int] = []
+        if bulk_req.deletes:
+            deleted_ids = [
+                row.id
+                for row in db.session.query(Book.id).filter(Book.id.in_(bulk_req.deletes))
+            ]
+            if deleted_ids:
+                Book.query.filter(Book.id.in_(deleted_ids)).delete(
+                    synchronize_session=False
+                )
+
+        # flush para que los libros nuevos tengan id
+        db.session.flush()
+        upserted_ids = [b.id for b in touched]
+
+        # 3. Nueva versión + feed de cambios
+        version_row = CatalogVersion(
+            n_upserts=len(upserted_ids), n_deletes=len(deleted_ids)
+        )
+        db.session.add(version_row)
+        db.session.flush()
+
+        rows = [
+            {"version": version_row.version, "book_id": book_id, "op": "upsert"}
+            for book_id in upserted_ids
+        ] + [
+            {"version": version_row.version, "book_id": book_id, "op": "delete"}
+            for book_id in deleted_ids
+        ]
+        if rows:
+            db.session.execute(insert(CatalogChange), rows)
+
+        # Estas escrituras quedan en el feed: no son externas
+        forget_own_writes(external_writes)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    event = CatalogEvent(
+        version=version_row.version,
+        upserted_ids=tuple(upserted_ids),
+        deleted_ids=tuple(deleted_ids),
+    )
+    current_app.extensions["catalog_version_cache"] = {
+        "version": event.version,
+        "checked_at": time.monotonic(),
+    }
+    current_app.extensions["catalog_fingerprint_cache"] = {
+        "fingerprint": CatalogFingerprint(event.version, external_writes),
+        "checked_at": time.monotonic(),
+    }
+    _notify(event)
+    return event
+
+
+def _notify(event: CatalogEvent) -> None:
+    """
+    Avisa a los suscriptores. Un suscriptor que falla no debe deshacer un
+    cambio ya confirmado, así que solo se registra el error.
+    """
+    for listener in list(_listeners):
+        try:
+            listener(event)
+        except Exception as e:
+            print("Error en un suscriptor del catálogo:", e, flush=True)
@@ -0,0 +1,112 @@
+# catalog_factory.py
+"""
+Catálogo sintético y determinista para pruebas de carga y tests.
+
+make_books(n, seed) genera siempre los mismos n libros para la misma
+semilla, con una distribución parecida a la de un catálogo real:
+  - géneros con pesos distintos (hay muchos más thrillers que poesía),
+  - autores con varios libros cada uno,
+  - notas concentradas entre 3 y 5 y un número de valoraciones con cola
+    larga (pocos libros muy populares, muchos con pocas valoraciones).
+"""
+import random
+from typing import List
+
+from sqlalchemy import insert
+
+from database import db
+from models import Book
+
+# (género, peso relativo en el catálogo)
+GENRES = [
+    ("Fantasía", 14),
+    ("Ciencia ficción", 12),
+    ("Thriller", 14),
+    ("Novela negra", 10),
+    ("Romance", 12),
+    ("Histórica", 9),
+    ("Distopía", 5),
+    ("Terror", 6),
+    ("Clásico", 6),
+    ("Ensayo", 5),
+    ("Poesía", 2),
+    ("Aventura", 5),
+]
+
+_FIRST_NAMES = [
+    "Ana", "Carlos", "Lucía", "Javier", "María", "Pablo", "Elena", "Diego",
+    "Carmen", "Andrés", "Isabel", "Tomás", "Laura", "Miguel", "Sofía", "Raúl",
+]
+_LAST_NAMES = [
+    "García", "Martínez", "López", "Sánchez", "Pérez", "Gómez", "Fernández",
+    "Ruiz", "Díaz", "Moreno", "Álvarez", "Romero", "Navarro", "Torres",
+    "Domínguez", "Vázquez", "Castillo", "Ortega", "Herrera", "Ibáñez",
+]
+_TITLE_NOUNS = [
+    "sombra", "ciudad", "reino", "viento", "memoria", "isla", "noche",
+    "estrella", "puerta", "río", "espejo", "bosque", "torre", "silencio",
+    "fuego", "mar", "jardín", "laberinto", "desierto", "invierno",
+]
+_TITLE_TAILS = [
+    "perdida", "del norte", "de cristal", "sin nombre", "olvidada", "de ceniza",
+    "eterna", "del sur", "de los sueños", "dormida", "de hierro", "infinita",
+]
+_DESCRIPTION_TOPICS = [
+    "una conspiración", "un viaje", "una familia", "una guerra", "un crimen",
+    "un amor imposible", "una expedición", "un secreto", "una profecía",
+    "una venganza", "una ciudad en ruinas", "un imperio",
+]
+
+
+def make_books(n: int, seed: int = 0) -> List[dict]:
+    """
+    Devuelve `n` libros como diccionarios con las columnas de Book
+    (sin id ni created_at). El resultado solo depende de `n` y `seed`.
+    """
+    rng = random.Random(seed)
+    genres = [g for g, _ in GENRES]
+    weights = [w for _, w in GENRES]
+
+    # Un autor por cada ~5 libros, cada uno con un género "habitual"
+    n_authors = max(1, n // 5)
+    authors = [
+        (
+            f"{rng.choice(_FIRST_NAMES)} {rng.choice(_LAST_NAMES)} {rng.choice(_LAST_NAMES)}",
+            rng.choices(genres, weights)[0],
+        )
+        for _ in range(n_authors)
+    ]
+
+    books = []
+    for i in range(n):
+        author, usual_genre = authors[rng.randrange(n_authors)]
+        genre = usual_genre if rng.random() < 0.8 else rng.choices(genres, weights)[0]
+        title = f"La {rng.choice(_TITLE_NOUNS)} {rng.choice(_TITLE_TAILS)} {i}"
+        description = (
+            f"{genre} sobre {rng.choice(_DESCRIPTION_TOPICS)} y "
+            f"{rng.choice(_DESCRIPTION_TOPICS)}."
+        )
+        rating = round(min(5.0, max(1.0, rng.gauss(3.9, 0.45))), 2)
+        n_ratings = int(rng.lognormvariate(7, 1.6))
+        books.append(
+            {
+                "title": title,
+                "author": author,
+                "genre": genre,
+                "description": description,
+                "rating": rating,
+                "n_ratings": n_ratings,
+            }
+        )
+    return books
+
+
+def populate(n: int, seed: int = 0, batch_size: int = 5000) -> None:
+    """
+    Inserta `n` libros sintéticos en la tabla books (dentro del contexto
+    de la app). Se insertan por lotes con un único INSERT multi-fila.
+    """
+    books = make_books(n, seed)
+    for start in range(0, len(books), batch_size):
+        db.session.execute(insert(Book), books[start : start + batch_size])
+    db.session.commit()
@@ -1,18 +1,39 @@
 # chat_llm.py
 import os
 import json
-from typing import List
+from typing import List, Optional
 
-import google.generativeai as genai
+from flask import current_app
 
-from models import Book
-from schemas import ChatRequest, ChatResponse, BookOut
+from book_rows import BookRow, books_by_ids, to_book_outs, top_rated_books
+from schemas import ChatRequest, ChatResponse
+from sessions import ChatSession
+
+# Diversidad del fallback de "libros populares": evita que los 5 libros
+# sugeridos sean todos del mismo autor o subgénero.
+FALLBACK_DIVERSITY = 0.3
+FALLBACK_LIMIT = 5
+
+GEMINI_MODEL_NAME = "models/gemini-2.0-flash"
+
+
+def _get_genai():
+    """
+    Importa google.generativeai la primera vez que se necesita.
+
+    La librería arrastra un árbol de dependencias grande (gRPC, protobuf, ...),
+    así que no la importamos a nivel de módulo.
+    """
+    import google.generativeai as genai
+
+    return genai
 
 
 def _configure_gemini() -> None:
     """
     Configura la librería de Gemini usando la variable de entorno GEMINI_API_KEY.
     """
+    genai = _get_genai()
     api_key = os.environ.get("GEMINI_API_KEY")
     if not api_key:
         raise RuntimeError(
@@ -22,31 +43,80 @@ def _configure_gemini() -> None:
     genai.configure(api_key=api_key)
 
 
-def _get_candidate_books(limit: int = 30) -> List[Book]:
+def _get_model():
+    """
+    Modelo al que se envían los prompts.
+
+    Si la app define CHAT_LLM_MODEL_FACTORY (una función sin argumentos que
+    devuelve un objeto con `generate_content(parts)`), se usa ese modelo en
+    lugar de Gemini. Lo usan las pruebas de carga (load_test.py) para
+    trabajar sin red ni API key.
+    """
+    factory = current_app.config.get("CHAT_LLM_MODEL_FACTORY")
+    if factory is not None:
+        return factory()
+    _configure_gemini()
+    return _get_genai().GenerativeModel(GEMINI_MODEL_NAME)
+
+
+def _get_candidate_books(limit: int = 30, query_text: Optional[str] = None) -> List[BookRow]:
     """
     Selecciona libros candidatos de la base de datos.
-    Aquí usamos un criterio sencillo: top N por rating y número de valoraciones.
+
+    Sin texto: top N por rating y número de valoraciones. Con el texto del
+    usuario, los candidatos salen de la recuperación híbrida (retrieval.py):
+    los libros que encajan con lo que pide, mezclados con los populares.
     """
-    return (
-        Book.query
-        .order_by(Book.rating.desc(), Book.n_ratings.desc())
-        .limit(limit)
-        .all()
-    )
+    if not query_text:
+        return top_rated_books(limit)
+    from retrieval import RetrievalQuery, get_engine
 
+    return books_by_ids(get_engine().retrieve(RetrievalQuery(text=query_text), limit))
 
-def chat_recommend_books(chat_req: ChatRequest) -> ChatResponse:
+
+def _user_text(chat_req: ChatRequest) -> str:
     """
-    Usa Gemini como chatbot de recomendación de libros.
+    Lo que ha escrito el usuario: el mensaje nuevo o, con el historial
+    completo, todos sus mensajes.
+    """
+    if chat_req.message is not None:
+        return chat_req.message
+    return "\n".join(msg.content for msg in chat_req.messages if msg.role == "user")
 
-    Entrada: historial de mensajes (ChatRequest).
-    Salida: texto del asistente + lista de libros recomendados (ChatResponse).
+
+def _fallback_ids(candidates: List[BookRow]) -> List[int]:
     """
-    _configure_gemini()
+    IDs de los libros populares que se recomiendan cuando falla el LLM,
+    re-ordenados por diversidad (MMR).
+    """
+    from diversity import diversify_books
+
+    chosen = diversify_books(candidates, FALLBACK_LIMIT, FALLBACK_DIVERSITY)
+    return [b.id for b in chosen]
+
+
+def popular_books_response(
+    answer: str, candidates: Optional[List[BookRow]] = None
+) -> ChatResponse:
+    """
+    Respuesta sin LLM: `answer` + algunos de los libros más populares.
 
-    # 1. Candidatos desde la BD
-    candidates = _get_candidate_books()
+    Solo hace consultas SQL, así que también sirve como respuesta degradada
+    cuando el chatbot está saturado (ver admission.py).
+    """
+    if candidates is None:
+        candidates = _get_candidate_books()
+    # Los candidatos ya están cargados: basta con re-ordenarlos
+    by_id = {b.id: b for b in candidates}
+    ordered = [by_id[i] for i in _fallback_ids(candidates)]
+
+    return ChatResponse(reply=answer, recommendations=to_book_outs(ordered))
 
+
+def _format_candidates(candidates: List[BookRow]) -> str:
+    """
+    Bloque del prompt con el catálogo de candidatos.
+    """
     books_description = []
     for b in candidates:
         books_description.append(
@@ -54,14 +124,56 @@ def chat_recommend_books(chat_req: ChatRequest) -> ChatResponse:
             f"({b.genre}, rating={b.rating}). "
             f"Descripción: {b.description}"
         )
+    return "\n".join(books_description)
 
-    # 2. Historial de conversación a texto
+
+def _format_history(messages) -> str:
+    """
+    Historial de conversación a texto. `messages` son pares (role, content).
+    """
     history_text = []
-    for msg in chat_req.messages:
-        prefix = "Usuario" if msg.role == "user" else "Asistente"
-        history_text.append(f"{prefix}: {msg.content}")
+    for role, content in messages:
+        prefix = "Usuario" if role == "user" else "Asistente"
+        history_text.append(f"{prefix}: {content}")
+    return "\n".join(history_text)
+
+
+def chat_recommend_books(
+    chat_req: ChatRequest, session: Optional[ChatSession] = None
+) -> ChatResponse:
+    """
+    Usa Gemini como chatbot de recomendación de libros.
+
+    Entrada: historial de mensajes (ChatRequest).
+    Salida: texto del asistente + lista de libros recomendados (ChatResponse).
+
+    Con `session`, chat_req solo trae el mensaje nuevo: el historial y los
+    candidatos elegidos en el primer turno se reutilizan de la sesión, y la
+    sesión se actualiza con el mensaje y la respuesta.
+    """
+    model = _get_model()
 
-    conversation_str = "\n".join(history_text)
+    # 1. Candidatos desde la BD (en una sesión, solo en el primer turno)
+    candidates: Optional[List[BookRow]] = None
+    if session is not None and session.catalog_text is not None:
+        candidate_ids = session.candidate_ids
+        catalog_text = session.catalog_text
+    else:
+        candidates = _get_candidate_books(query_text=_user_text(chat_req))
+        candidate_ids = [b.id for b in candidates]
+        catalog_text = _format_candidates(candidates)
+        if session is not None:
+            session.candidate_ids = candidate_ids
+            session.catalog_text = catalog_text
+
+    # 2. Historial de conversación a texto
+    if session is not None:
+        session.add_message("user", chat_req.message)
+        conversation_str = _format_history(session.messages)
+    else:
+        conversation_str = _format_history(
+            (msg.role, msg.content) for msg in chat_req.messages
+        )
 
     system_prompt = (
         "Eres un asistente que recomienda libros basándote en un catálogo "
@@ -82,12 +194,10 @@ def chat_recommend_books(chat_req: ChatRequest) -> ChatResponse:
         "Historial de la conversación:\n"
         f"{conversation_str}\n\n"
         "Catálogo de libros disponibles (con IDs):\n"
-        + "\n".join(books_description)
+        + catalog_text
     )
 
     # 3. Llamada a Gemini
-    model = genai.GenerativeModel("models/gemini-2.0-flash")
-
     try:
         response = model.generate_content(
             [system_prompt, user_prompt]
@@ -101,25 +211,9 @@ def chat_recommend_books(chat_req: ChatRequest) -> ChatResponse:
             "Aun así, te puedo recomendar algunos de los libros más populares "
             "de la base de datos."
         )
-        ids = [b.id for b in candidates[:5]]
-
-        selected_books = Book.query.filter(Book.id.in_(ids)).all()
-        id_to_book = {b.id: b for b in selected_books}
-        ordered = [id_to_book[i] for i in ids if i in id_to_book]
-
-        recommendations = [
-            BookOut(
-                id=b.id,
-                title=b.title,
-                author=b.author,
-                genre=b.genre,
-                description=b.description,
-                rating=b.rating,
-            )
-            for b in ordered
-        ]
-
-        return ChatResponse(reply=answer, recommendations=recommendations)
+        if candidates is None:
+            candidates = books_by_ids(candidate_ids)
+        return _with_session(popular_books_response(answer, candidates), session)
 
     # 4. Parsear el JSON devuelto por Gemini
     try:
@@ -138,26 +232,27 @@ def chat_recommend_books(chat_req: ChatRequest) -> ChatResponse:
             "Ha habido un problema interpretando la respuesta del modelo. "
             "Te puedo recomendar algunos de los libros más populares de la base de datos."
         )
-        ids = [b.id for b in candidates[:5]]
+        if candidates is None:
+            candidates = books_by_ids(candidate_ids)
+        ids = _fallback_ids(candidates)
 
     if not answer:
         answer = "Aquí tienes algunas recomendaciones de libros basadas en tus preferencias."
 
     # 5. Recuperar libros recomendados por ID y mantener orden
-    selected_books = Book.query.filter(Book.id.in_(ids)).all()
-    id_to_book = {b.id: b for b in selected_books}
-    ordered = [id_to_book[i] for i in ids if i in id_to_book]
-
-    recommendations = [
-        BookOut(
-            id=b.id,
-            title=b.title,
-            author=b.author,
-            genre=b.genre,
-            description=b.description,
-            rating=b.rating,
-        )
-        for b in ordered
-    ]
+    ordered = books_by_ids(ids)
+
+    return _with_session(
+        ChatResponse(reply=answer, recommendations=to_book_outs(ordered)), session
+    )
 
-    return ChatResponse(reply=answer, recommendations=recommendations)
+
+def _with_session(chat_resp: ChatResponse, session: Optional[ChatSession]) -> ChatResponse:
+    """
+    Guarda la respuesta en el historial de la sesión (si la hay) e indica
+    al cliente el session_id para el siguiente turno.
+    """
+    if session is not None:
+        session.add_message("assistant", chat_resp.reply)
+        chat_resp.session_id = session.session_id
+    return chat_resp
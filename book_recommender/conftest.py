@@ -0,0 +1,166 @@
+# conftest.py
+"""
+Fixtures de pytest con una BD SQLite en memoria.
+
+Cada proceso de pytest (cada worker, si se usa pytest-xdist) tiene una BD
+en memoria compartida (cache=shared) en la que el esquema se crea una sola
+vez. Cada test recibe una app nueva (create_app, con sus cachés e índices
+en memoria vacíos) conectada a esa BD dentro de una transacción que se
+deshace al terminar: lo que el test escriba, aunque haga commit, no lo ve
+el siguiente. Nunca se toca books.db.
+
+Fixtures:
+  - make_app(**config): app con la configuración indicada (una por test).
+  - app:                make_app(**app_config) con su contexto de aplicación
+                        activo. `app_config` ({} por defecto) se puede
+                        redefinir en un módulo o con parametrize.
+  - client:             app.test_client().
+  - catalog(n, seed):   inserta n libros sintéticos deterministas
+                        (catalog_factory.py) y devuelve sus IDs.
+  - admin_headers:      cabeceras con el token de administración de las
+                        apps de test (ver admin_auth.py).
+
+Los commits del código de la app se convierten en SAVEPOINTs
+(join_transaction_mode="create_savepoint"). Para que pysqlite los respete
+hay que desactivar su gestión automática de transacciones y emitir
+nosotros el BEGIN (receta de la documentación de SQLAlchemy).
+
+Como la conexión es única, es la del engine de la primera app del test: lo
+que se engancha a los eventos del engine (el registro de consultas lentas)
+solo funciona en esa app, que es la de `app` si el test la usa. Por lo
+mismo, nada debe usar la BD desde otro hilo (SUGGEST_BACKGROUND_REBUILD=False).
+"""
+import os
+from typing import List
+
+import pytest
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.pool import StaticPool
+
+from app import create_app
+from catalog_factory import populate
+from database import db
+from models import Book
+
+_WORKER = os.environ.get("PYTEST_XDIST_WORKER", "main")
+TEST_DATABASE_URI = (
+    f"sqlite:///file:books_test_{_WORKER}_{os.getpid()}?mode=memory&cache=shared&uri=true"
+)
+
+TEST_CONFIG = {
+    "SQLALCHEMY_DATABASE_URI": TEST_DATABASE_URI,
+    "SQLALCHEMY_ENGINE_OPTIONS": {
+        "poolclass": StaticPool,
+        "connect_args": {"check_same_thread": False, "isolation_level": None},
+    },
+    "HTML_PRERENDER": False,
+    "ADMIN_TOKEN": "test-admin-token",
+    "SUGGEST_BACKGROUND_REBUILD": False,
+}
+
+
+def _emit_begin(connection) -> None:
+    connection.exec_driver_sql("BEGIN")
+
+
+class _TestSession(Session):
+    """
+    Sesión que manda todas las consultas a la conexión del test (la de
+    Flask-SQLAlchemy elegiría el engine de la app e ignoraría `bind`).
+    """
+
+    def get_bind(self, *args, **kwargs):
+        return self.bind
+
+
+@pytest.fixture(scope="session")
+def _schema():
+    """
+    Crea el esquema una vez por proceso. La conexión abierta mantiene viva
+    la BD en memoria mientras dura la sesión de pytest.
+    """
+    app = create_app(TEST_CONFIG)
+    with app.app_context():
+        keep_alive = db.engine.connect()
+        db.create_all()
+    yield
+    keep_alive.close()
+    with app.app_context():
+        db.engine.dispose()
+
+
+@pytest.fixture
+def make_app(_schema, monkeypatch):
+    """
+    Factoría de apps de test: make_app(CLAVE=valor, ...). Todas las apps del
+    test comparten la misma conexión y transacción.
+    """
+    state = {}
+
+    def factory(**config):
+        app = create_app({**TEST_CONFIG, **config})
+        with app.app_context():
+            engine = db.engine
+            event.listen(engine, "begin", _emit_begin)
+            if "connection" not in state:
+                state["connection"] = engine.connect()
+                state["transaction"] = state["connection"].begin()
+                monkeypatch.setattr(
+                    db,
+                    "session",
+                    db._make_scoped_session(
+                        {
+                            "class_": _TestSession,
+                            "bind": state["connection"],
+                            "join_transaction_mode": "create_savepoint",
+                        }
+                    ),
+                )
+        state.setdefault("engines", []).append(engine)
+        return app
+
+    yield factory
+
+    if "connection" in state:
+        state["transaction"].rollback()
+        state["connection"].close()
+    for engine in state.get("engines", []):
+        engine.dispose()
+
+
+@pytest.fixture
+def app_config() -> dict:
+    return {}
+
+
+@pytest.fixture
+def app(make_app, app_config):
+    app = make_app(**app_config)
+    with app.app_context():
+        yield app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def admin_headers():
+    return {"Authorization": f"Bearer {TEST_CONFIG['ADMIN_TOKEN']}"}
+
+
+@pytest.fixture
+def catalog(app):
+    """
+    catalog(n, seed=0): inserta n libros de catalog_factory.make_books y
+    devuelve sus IDs (siempre los mismos libros para la misma semilla).
+    """
+
+    def factory(n: int, seed: int = 0) -> List[int]:
+        first = (db.session.scalar(db.select(db.func.max(Book.id))) or 0) + 1
+        populate(n, seed)
+        return list(range(first, first + n))
+
+    return factory
@@ -0,0 +1,115 @@
+# export.py
+"""
+Exportación del catálogo en streaming (NDJSON o CSV).
+
+Los libros se leen por lotes con paginación por clave (`id > último id
+ORDER BY id LIMIT n`), seleccionando solo columnas (sin objetos ORM), y
+cada lote se serializa y se envía antes de pedir el siguiente. La memoria
+usada depende del tamaño del lote, no del tamaño del catálogo.
+
+La exportación no es una foto fija: si el catálogo cambia mientras se
+descarga, los lotes posteriores ya ven los cambios. La cabecera
+X-Catalog-Version indica la versión al empezar, para que una exportación
+incremental posterior pida `since_version=<esa versión>`.
+"""
+import csv
+import io
+import json
+from typing import Iterator, List, Optional
+
+from database import db
+from models import Book, CatalogChange
+
+# Filas por consulta a la BD
+EXPORT_BATCH_SIZE = 1000
+
+# Formato -> (mimetype, extensión del fichero)
+EXPORT_FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "csv": ("text/csv", "csv"),
+}
+
+EXPORT_COLUMNS = (
+    "id", "title", "author", "genre", "description", "rating", "n_ratings", "created_at",
+)
+_SELECTED = [getattr(Book, name) for name in EXPORT_COLUMNS]
+
+
+def export_filters(
+    genre: Optional[str] = None,
+    min_rating: Optional[float] = None,
+    since_version: Optional[int] = None,
+) -> list:
+    """
+    Condiciones SQL de la exportación.
+
+    - genre: el género contiene el texto (sin distinguir mayúsculas), como
+      en el recomendador.
+    - since_version: solo libros creados o modificados en una versión del
+      catálogo posterior (ver catalog.py).
+    """
+    filters = []
+    if genre:
+        filters.append(Book.genre.ilike(f"%{genre}%"))
+    if min_rating is not None:
+        filters.append(Book.rating >= min_rating)
+    if since_version is not None:
+        changed = (
+            db.select(CatalogChange.book_id)
+            .where(CatalogChange.version > since_version, CatalogChange.op == "upsert")
+        )
+        filters.append(Book.id.in_(changed))
+    return filters
+
+
+def iter_book_batches(filters: list, batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[List[tuple]]:
+    """
+    Lotes de filas (tuplas en el orden de EXPORT_COLUMNS), ordenados por id.
+    """
+    last_id = 0
+    while True:
+        rows = db.session.execute(
+            db.select(*_SELECTED)
+            .where(Book.id > last_id, *filters)
+            .order_by(Book.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            return
+        yield rows
+        if len(rows) < batch_size:
+            return
+        last_id = rows[-1][0]
+
+
+def _plain(row: tuple) -> list:
+    values = list(row)
+    created_at = values[-1]
+    values[-1] = created_at.isoformat() if created_at is not None else None
+    return values
+
+
+def ndjson_chunks(batches: Iterator[List[tuple]]) -> Iterator[str]:
+    """
+    Un trozo de texto por lote, con un objeto JSON por línea.
+    """
+    for rows in batches:
+        yield "".join(
+            json.dumps(dict(zip(EXPORT_COLUMNS, _plain(row))), ensure_ascii=False) + "\n"
+            for row in rows
+        )
+
+
+def csv_chunks(batches: Iterator[List[tuple]]) -> Iterator[str]:
+    """
+    Cabecera CSV y después un trozo de texto por lote.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    yield buffer.getvalue()
+    for rows in batches:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(_plain(row) for row in rows)
+        yield buffer.getvalue()
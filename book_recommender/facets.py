@@ -0,0 +1,247 @@
+# facets.py
+"""
+Facetas del catálogo precalculadas: libros por género y distribución de
+notas.
+
+FacetIndex guarda en memoria, para cada género, un histograma de notas en
+tramos de 0.1. Se construye una vez con una consulta y después se mantiene
+de forma incremental:
+  - los lotes aplicados en este proceso le llegan por catalog.subscribe(),
+  - los de otros procesos se recuperan con changes_since() al detectar que
+    la versión del catálogo ha cambiado.
+
+Con él se sirve /api/facets sin GROUP BY y se sabe, sin ir a la BD, si una
+combinación (género, nota mínima) del recomendador no tiene ningún libro.
+
+La BD sigue siendo la fuente de verdad: el índice guarda la huella del
+catálogo con la que se construyó (catalog.get_catalog_fingerprint()). Si
+alguien ha escrito en `books` sin pasar por apply_bulk_changes (cambia la
+cuenta de escrituras externas) o la versión ha bajado, se reconstruye
+desde cero.
+"""
+import math
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from flask import current_app
+
+from catalog import (
+    CatalogEvent,
+    CatalogFingerprint,
+    cached_catalog_fingerprint,
+    changes_since,
+    subscribe,
+)
+from database import db
+from models import Book
+from text_utils import fold_text
+
+# Resolución interna del histograma (tramos de 0.1: 0.0, 0.1, ..., 5.0)
+_BUCKETS_PER_POINT = 10
+_N_BUCKETS = 5 * _BUCKETS_PER_POINT + 1
+
+# Anchura de los tramos que se publican en /api/facets
+FACET_RATING_STEP = 0.5
+
+# Cambios pendientes a partir de los que sale más a cuenta reconstruir
+MAX_CATCH_UP_CHANGES = 5000
+
+
+def _bucket(rating: Optional[float]) -> int:
+    """
+    Tramo de 0.1 de una nota (las notas fuera de 0-5 se recortan).
+    """
+    value = math.floor(round((rating or 0.0) * _BUCKETS_PER_POINT, 6))
+    return min(max(value, 0), _N_BUCKETS - 1)
+
+
+class FacetIndex:
+    """
+    Histogramas de notas por género, actualizables por lotes de cambios.
+    """
+
+    def __init__(self):
+        self.version = -1  # todavía sin construir
+        self.external_writes = -1
+        self._lock = threading.Lock()
+        # Serializa las puestas al día (las lecturas no lo necesitan)
+        self.refresh_lock = threading.Lock()
+        self._histograms: Dict[str, List[int]] = {}
+        self._folded: Dict[str, str] = {}  # género -> género sin tildes ni mayúsculas
+        # id -> (género, tramo), para poder restar un libro al modificarlo o borrarlo
+        self._books: Dict[int, Tuple[str, int]] = {}
+
+    def _add(self, book_id: int, genre: str, rating: Optional[float]) -> None:
+        bucket = _bucket(rating)
+        self._books[book_id] = (genre, bucket)
+        histogram = self._histograms.get(genre)
+        if histogram is None:
+            histogram = self._histograms[genre] = [0] * _N_BUCKETS
+            self._folded[genre] = fold_text(genre)
+        histogram[bucket] += 1
+
+    def _remove(self, book_id: int) -> None:
+        previous = self._books.pop(book_id, None)
+        if previous is None:
+            return
+        genre, bucket = previous
+        histogram = self._histograms[genre]
+        histogram[bucket] -= 1
+        if not any(histogram):
+            del self._histograms[genre]
+            del self._folded[genre]
+
+    def rebuild(self, fingerprint: CatalogFingerprint) -> None:
+        """
+        Recalcula todo desde la tabla books.
+        """
+        rows = db.session.execute(db.select(Book.id, Book.genre, Book.rating)).all()
+        with self._lock:
+            self._histograms = {}
+            self._folded = {}
+            self._books = {}
+            for book_id, genre, rating in rows:
+                self._add(book_id, genre, rating)
+            self.version, self.external_writes = fingerprint
+
+    def apply_changes(self, version: int, upserted_ids, deleted_ids) -> None:
+        """
+        Aplica un lote de cambios: resta los libros afectados y vuelve a
+        sumar los que siguen existiendo, con sus valores actuales.
+        """
+        upserted_ids = list(upserted_ids)
+        rows = []
+        if upserted_ids:
+            rows = db.session.execute(
+                db.select(Book.id, Book.genre, Book.rating).where(Book.id.in_(upserted_ids))
+            ).all()
+        with self._lock:
+            for book_id in list(upserted_ids) + list(deleted_ids):
+                self._remove(book_id)
+            for book_id, genre, rating in rows:
+                self._add(book_id, genre, rating)
+            self.version = version
+
+    def is_fresh(self, fingerprint: CatalogFingerprint) -> bool:
+        """
+        True si el índice corresponde a la huella `fingerprint` del catálogo.
+        """
+        return (self.version, self.external_writes) == tuple(fingerprint)
+
+    def refresh(self, fingerprint: CatalogFingerprint) -> None:
+        """
+        Pone el índice al día con `fingerprint`: con el feed de cambios si
+        solo ha subido la versión y reconstruyendo desde la tabla books en
+        cualquier otro caso.
+        """
+        if (
+            0 <= self.version < fingerprint.version
+            and self.external_writes == fingerprint.external_writes
+        ):
+            self.catch_up(fingerprint.version)
+        if not self.is_fresh(fingerprint):
+            self.rebuild(fingerprint)
+
+    def catch_up(self, version: int) -> None:
+        """
+        Se pone al día hasta `version` con el feed de cambios (si hay
+        demasiados cambios lo deja sin tocar y refresh() reconstruye).
+        """
+        changes = changes_since(self.version, limit=MAX_CATCH_UP_CHANGES)
+        if len(changes) >= MAX_CATCH_UP_CHANGES:
+            return
+        changes = [c for c in changes if c.version <= version]
+        upserted = {c.book_id for c in changes if c.op == "upsert"}
+        deleted = {c.book_id for c in changes if c.op == "delete"} - upserted
+        self.apply_changes(version, upserted, deleted)
+
+    def may_have_matches(self, genre: Optional[str], min_rating: Optional[float]) -> bool:
+        """
+        False solo si es seguro que ningún libro tiene un género que contenga
+        `genre` y nota >= `min_rating` (el filtro de recommend_books).
+        Se compara sin tildes ni mayúsculas, así que nunca da un falso "no".
+        """
+        first = _bucket(min_rating) if min_rating is not None else 0
+        needle = fold_text(genre) if genre else ""
+        with self._lock:
+            for catalog_genre, histogram in self._histograms.items():
+                if needle and needle not in self._folded[catalog_genre]:
+                    continue
+                if any(histogram[first:]):
+                    return True
+        return False
+
+    def snapshot(self) -> dict:
+        """
+        Facetas para /api/facets: total y, por género, número de libros,
+        histograma de notas en tramos de FACET_RATING_STEP y libros con nota
+        mayor o igual que cada umbral.
+        """
+        step = int(FACET_RATING_STEP * _BUCKETS_PER_POINT)
+        thresholds = [i / _BUCKETS_PER_POINT for i in range(0, _N_BUCKETS, step)]
+
+        def summarize(histogram: List[int]) -> dict:
+            coarse = [sum(histogram[i : i + step]) for i in range(0, _N_BUCKETS - 1, step)]
+            coarse[-1] += histogram[-1]  # 5.0 va en el último tramo
+            suffix, at_least = 0, []
+            for i in range(_N_BUCKETS - 1, -1, -1):
+                suffix += histogram[i]
+                if i % step == 0:
+                    at_least.append(suffix)
+            return {"count": sum(histogram), "rating_histogram": coarse, "at_least": at_least[::-1]}
+
+        with self._lock:
+            total = [0] * _N_BUCKETS
+            genres = []
+            for genre, histogram in self._histograms.items():
+                total = [a + b for a, b in zip(total, histogram)]
+                genres.append({"genre": genre, **summarize(histogram)})
+            version = self.version
+
+        genres.sort(key=lambda g: (-g["count"], g["genre"]))
+        overall = summarize(total)
+        return {
+            "version": version,
+            "total": overall["count"],
+            "rating_step": FACET_RATING_STEP,
+            "thresholds": thresholds,
+            "rating_histogram": overall["rating_histogram"],
+            "at_least": overall["at_least"],
+            "genres": genres,
+        }
+
+
+def get_facet_index(fingerprint: Optional[CatalogFingerprint] = None) -> Optional[FacetIndex]:
+    """
+    Índice de la app actual, al día con la huella del catálogo, o None si
+    la app no tiene índice de facetas registrado.
+
+    Por defecto se usa la huella cacheada FACETS_REFRESH_SECONDS segundos;
+    quien necesite la certeza de que el índice está al día (por ejemplo
+    para no consultar la BD) puede pasar la huella actual.
+    """
+    index: Optional[FacetIndex] = current_app.extensions.get("facets")
+    if index is None:
+        return None
+    if fingerprint is None:
+        fingerprint = cached_catalog_fingerprint(
+            max_age=current_app.config.get("FACETS_REFRESH_SECONDS", 1.0)
+        )
+    if not index.is_fresh(fingerprint):
+        with index.refresh_lock:
+            if not index.is_fresh(fingerprint):
+                index.refresh(fingerprint)
+    return index
+
+
+@subscribe
+def _on_catalog_change(event: CatalogEvent) -> None:
+    """
+    Aplica al momento los lotes confirmados en este proceso.
+    """
+    index: Optional[FacetIndex] = current_app.extensions.get("facets")
+    if index is None:
+        return
+    with index.refresh_lock:
+        if index.version == event.version - 1:
+            index.apply_changes(event.version, event.upserted_ids, event.deleted_ids)
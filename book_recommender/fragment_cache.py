@@ -0,0 +1,124 @@
+# fragment_cache.py
+"""
+Caché de HTML renderizado para el frontend.
+
+- FragmentCache guarda bloques de HTML ya renderizados (por ejemplo la
+  lista de resultados de /recommendations) con expulsión LRU, limitada
+  por número de entradas y por tamaño total. La clave la elige quien la
+  usa; para las recomendaciones es (versión del catálogo, parámetros
+  normalizados), así que un cambio en el catálogo deja de usar los
+  fragmentos antiguos sin invalidarlos a mano.
+- prerender_pages() renderiza al arrancar las páginas que no dependen de la
+  petición (/, /chat, /docs) y el "marco" de la página de resultados, con
+  un hueco donde va el fragmento. Servir una página pasa a ser buscar el
+  fragmento en un diccionario y concatenar tres cadenas.
+"""
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Iterable
+
+from flask import Flask, render_template
+from markupsafe import Markup
+
+# Límites por defecto de la caché de fragmentos
+DEFAULT_MAX_ENTRIES = 512
+DEFAULT_MAX_BYTES = 8 * 1024 * 1024
+
+# Marca que se sustituye por el fragmento en una página pre-renderizada
+FRAGMENT_PLACEHOLDER = Markup("<!--fragment-->")
+
+
+class FragmentCache:
+    """
+    LRU de fragmentos HTML con límite de entradas y de bytes.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._fragments: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evicted = 0
+
+    def get_or_render(self, key: Hashable, render: Callable[[], str]) -> str:
+        """
+        Devuelve el fragmento de `key`; si no está, lo genera con `render()`
+        (fuera del cerrojo) y lo guarda.
+        """
+        with self._lock:
+            entry = self._fragments.get(key)
+            if entry is not None:
+                self._fragments.move_to_end(key)
+                self._hits += 1
+                return entry[0]
+            self._misses += 1
+
+        html = str(render())
+        size = len(html.encode("utf-8"))
+        if size > self.max_bytes:
+            return html
+
+        with self._lock:
+            old = self._fragments.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._fragments[key] = (html, size)
+            self._bytes += size
+            while len(self._fragments) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._fragments.popitem(last=False)
+                self._bytes -= evicted_size
+                self._evicted += 1
+        return html
+
+    def clear(self) -> None:
+        with self._lock:
+            self._fragments.clear()
+            self._bytes = 0
+
+    def snapshot(self) -> dict:
+        """
+        Métricas actuales (para /api/admin/metrics).
+        """
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": len(self._fragments),
+                "max_entries": self.max_entries,
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0,
+                "evicted": self._evicted,
+            }
+
+
+class PageShell:
+    """
+    Página pre-renderizada, partida por el hueco del fragmento.
+    """
+    __slots__ = ("head", "tail")
+
+    def __init__(self, html: str):
+        self.head, _, self.tail = html.partition(FRAGMENT_PLACEHOLDER)
+
+    def fill(self, fragment: str = "") -> str:
+        return self.head + fragment + self.tail
+
+
+def prerender_pages(app: Flask, templates: Iterable[str]) -> Dict[str, PageShell]:
+    """
+    Renderiza `templates` una vez (con `fragment` = hueco) y devuelve
+    {plantilla: PageShell}.
+
+    Las URLs se generan relativas a la raíz, como en cualquier petición
+    sin prefijo de aplicación.
+    """
+    with app.test_request_context("/"):
+        return {
+            name: PageShell(render_template(name, fragment=FRAGMENT_PLACEHOLDER))
+            for name in templates
+        }
@@ -0,0 +1,53 @@
+# http_cache.py
+"""
+Caché HTTP condicional (ETag / 304) para las recomendaciones.
+
+Las recomendaciones solo dependen de los parámetros normalizados y del
+catálogo, así que el ETag se calcula a partir de los parámetros y de la
+huella del catálogo (versión y escrituras hechas por fuera del feed de
+cambios; ver catalog.py) SIN ejecutar el recomendador. Con solo la versión,
+un UPDATE a mano o una BD recreada por detrás darían 304 con datos viejos.
+Si el cliente (o la CDN) envía un `If-None-Match` que coincide, se
+responde 304 sin cuerpo.
+"""
+import hashlib
+from typing import Callable
+
+from flask import Response, current_app, request
+
+from catalog import CatalogFingerprint
+from schemas import RecommendationRequest
+
+# Cache-Control por defecto (segundos que el cliente puede reutilizar sin preguntar)
+DEFAULT_MAX_AGE = 60
+
+
+def recommendation_etag(
+    variant: str, params: RecommendationRequest, fingerprint: CatalogFingerprint
+) -> str:
+    """
+    ETag de una respuesta de recomendaciones.
+
+    variant distingue representaciones distintas de los mismos datos
+    (por ejemplo "json" y "html").
+    """
+    catalog_key = "-".join(str(part) for part in fingerprint)
+    raw = f"{variant}|{catalog_key}|{params.cache_key()}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def conditional_response(etag: str, build: Callable[[], Response]) -> Response:
+    """
+    Devuelve 304 si el If-None-Match de la petición coincide con `etag`;
+    si no, llama a `build()` para generar la respuesta completa.
+    En ambos casos añade ETag y Cache-Control.
+    """
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = current_app.make_response(build())
+
+    response.set_etag(etag)
+    max_age = current_app.config.get("RECOMMEND_CACHE_MAX_AGE", DEFAULT_MAX_AGE)
+    response.headers["Cache-Control"] = f"public, max-age={max_age}"
+    return response
@@ -0,0 +1,262 @@
+# intent_router.py
+"""
+Router local de intenciones para /api/chat.
+
+Muchos mensajes del chat son en realidad consultas estructuradas
+("fantasía con nota mayor de 4.5", "recomiéndame 3 thrillers") que el
+recomendador SQL resuelve en milisegundos. Este módulo analiza el último
+mensaje del usuario con:
+
+  - un vocabulario de géneros sacado del propio catálogo (sin tildes, con
+    plurales/femeninos: "fantasías", "histórico" ...),
+  - patrones sencillos de nota mínima ("nota mayor de 4,5", "al menos 4
+    estrellas", ">= 4") y de número de libros ("dame 3", "5 libros").
+
+Si todo lo que dice el mensaje se entiende (no queda ninguna palabra sin
+reconocer), se responde con recommend_books y una respuesta con plantilla.
+Los mensajes abiertos ("algo parecido a Dune pero más oscuro"), los que
+niegan o comparan ("no quiero fantasía", "sin terror", "menos de 3
+estrellas") y los que nombran más de un género siguen yendo a Gemini: el
+recomendador SQL solo sabe filtrar por un género y una nota mínima.
+"""
+import re
+import threading
+from typing import List, Optional, Tuple
+
+from flask import current_app
+
+from catalog import CatalogFingerprint, cached_catalog_fingerprint
+from database import db
+from models import Book
+from recommender import recommend_books
+from schemas import ChatResponse, RecommendationRequest
+from text_utils import fold_text
+
+# Palabras sin reconocer que se toleran para seguir considerando la consulta "simple"
+MAX_UNKNOWN_WORDS = 0
+
+# Número de libros si el usuario no dice cuántos
+DEFAULT_LIMIT = 5
+
+# Nota mínima si el usuario no dice ninguna
+DEFAULT_MIN_RATING = 0.0
+
+# Palabras que no aportan significado en una petición de recomendación
+_FILLER_WORDS = set(
+    """
+    a al algo alguno alguna algunos algunas con de del el en es esta este favor
+    la las lo los me mi muy o para pls por porfa porfavor que quiero quisiera
+    se sea sean su sus tenga tengan un una unos unas y ya busco buscando
+    recomienda recomiendame recomendarme recomendacion recomendaciones
+    recomiendas sugiere sugiereme dame dime ensename muestrame pasame
+    libro libros novela novelas titulo titulos lectura lecturas leer
+    nota notas rating puntuacion valoracion valoraciones estrellas estrella
+    mayor mayores superior superiores minimo minima mas encima
+    al menos igual top mejor mejores bueno buenos buena buenas genero generos
+    hola gracias
+    """.split()
+)
+
+# Negaciones y comparaciones que el router no sabe convertir en filtros
+# ("al menos 4" sí se entiende: lo consume el patrón de nota mínima)
+_NEGATION_WORDS = set(
+    """
+    no ni sin nada nunca ningun ninguno ninguna excepto salvo menos
+    menor menores peor peores inferior inferiores debajo
+    """.split()
+)
+
+_NUMBER_WORDS = {
+    "uno": 1, "un": 1, "una": 1, "dos": 2, "tres": 3, "cuatro": 4, "cinco": 5,
+    "seis": 6, "siete": 7, "ocho": 8, "nueve": 9, "diez": 10,
+}
+
+_NUM = r"(\d(?:[.,]\d+)?)"
+# Un número seguido de estas palabras es un nº de libros, nunca una nota
+_COUNT_NOUNS = r"(?:libros?|novelas?|titulos?|recomendaciones|lecturas)\b"
+_RATING_RE = re.compile(
+    r"(?:(?:mayor|superior|mas|encima)\s+(?:de|a|que)|al\s+menos|minimo|minima|"
+    r"por\s+encima\s+de|>=?)\s*(?:un[ao]?\s+)?(?:nota\s+|rating\s+)?(?:de\s+)?" + _NUM
+    + r"(?![.,]?\d|\s*" + _COUNT_NOUNS + r")"
+    + r"|" + _NUM + r"\s*(?:estrellas\s+)?o\s+mas"
+)
+_COUNT_RE = re.compile(
+    r"\b(\d{1,2}|" + "|".join(_NUMBER_WORDS) + r")\s+" + _COUNT_NOUNS
+    + r"|\b(?:dame|recomiendame|sugiereme|top|quiero)\s+(\d{1,2}|"
+    + "|".join(_NUMBER_WORDS) + r")\b"
+)
+# "más de 4 libros", "al menos 3 novelas": un nº de libros que no es exacto
+_COUNT_COMPARISON_RE = re.compile(
+    r"\b(?:mas|mayor|menos|minimo|maximo|hasta)\s+(?:de\s+|que\s+)?$"
+)
+_WORD_RE = re.compile(r"[a-z0-9ñ]+(?:[.,]\d+)?")
+
+
+def _stem(word: str) -> str:
+    """
+    Raíz aproximada para casar singular/plural y masculino/femenino.
+    """
+    if len(word) > 4 and word.endswith("s"):
+        word = word[:-1]
+    if len(word) > 4 and word[-1] in "aeo":
+        word = word[:-1]
+    return word
+
+
+class RoutedQuery:
+    """
+    Resultado del análisis de un mensaje que se puede resolver sin LLM.
+    """
+    __slots__ = ("genre", "min_rating", "limit")
+
+    def __init__(self, genre: Optional[str], min_rating: Optional[float], limit: int):
+        self.genre = genre
+        self.min_rating = min_rating
+        self.limit = limit
+
+
+class IntentRouter:
+    """
+    Analizador de mensajes con el vocabulario de géneros del catálogo.
+    Es inmutable: se reconstruye cuando cambia la huella del catálogo.
+    """
+
+    def __init__(self, genres: List[str], fingerprint: Optional[CatalogFingerprint] = None):
+        self.fingerprint = fingerprint
+        # (regex de la frase del género, género tal cual está en el catálogo)
+        self._genres: List[Tuple[re.Pattern, str]] = []
+        for genre in sorted(set(genres), key=len, reverse=True):
+            words = fold_text(genre).split()
+            if not words:
+                continue
+            pattern = r"\s+".join(re.escape(_stem(w)) + r"[a-z]{0,3}" for w in words)
+            self._genres.append((re.compile(r"\b" + pattern + r"\b"), genre))
+
+    def parse(self, message: str, first_turn: bool = True) -> Optional[RoutedQuery]:
+        """
+        Devuelve la consulta estructurada o None si el mensaje es abierto.
+
+        Fuera del primer turno solo se resuelven localmente los mensajes que
+        nombran un género: "¿y con nota mayor de 4?" depende de lo hablado
+        antes y se deja a Gemini.
+        """
+        text = fold_text(message)
+
+        genre = None
+        for pattern, catalog_genre in self._genres:
+            match = pattern.search(text)
+            if match:
+                genre = catalog_genre
+                text = text[: match.start()] + " " + text[match.end():]
+                break
+
+        # "ciencia ficción o fantasía": el recomendador solo filtra por uno
+        if genre is not None and any(pattern.search(text) for pattern, _ in self._genres):
+            return None
+
+        min_rating = None
+        match = _RATING_RE.search(text)
+        if match:
+            value = float((match.group(1) or match.group(2)).replace(",", "."))
+            if 0 <= value <= 5:
+                min_rating = value
+                text = text[: match.start()] + " " + text[match.end():]
+
+        limit = DEFAULT_LIMIT
+        match = _COUNT_RE.search(text)
+        if match:
+            if _COUNT_COMPARISON_RE.search(text[: match.start()]):
+                return None
+            raw = match.group(1) or match.group(2)
+            value = _NUMBER_WORDS.get(raw) or int(raw)
+            if 1 <= value <= 50:
+                limit = value
+                text = text[: match.start()] + " " + text[match.end():]
+
+        if genre is None and (min_rating is None or not first_turn):
+            return None
+
+        words = _WORD_RE.findall(text)
+        if any(w in _NEGATION_WORDS for w in words):
+            return None
+
+        unknown = [w for w in words if w not in _FILLER_WORDS and w not in _NUMBER_WORDS]
+        if len(unknown) > MAX_UNKNOWN_WORDS:
+            return None
+
+        return RoutedQuery(genre, min_rating, limit)
+
+    def answer(self, query: RoutedQuery) -> ChatResponse:
+        """
+        Resuelve la consulta con el recomendador SQL y una respuesta con plantilla.
+        """
+        params = RecommendationRequest(
+            favorite_genre=query.genre,
+            min_rating=query.min_rating if query.min_rating is not None else DEFAULT_MIN_RATING,
+            limit=query.limit,
+        )
+        recommendations = recommend_books(params)
+
+        what = "libro" if len(recommendations) == 1 else "libros"
+        if query.genre:
+            what += f" de {query.genre}"
+        if query.min_rating is not None:
+            what += f" con nota de al menos {query.min_rating:g}"
+
+        if recommendations:
+            reply = f"Aquí tienes {len(recommendations)} {what} de nuestro catálogo."
+        else:
+            reply = f"No he encontrado {what} en el catálogo. Prueba con otro género o una nota más baja."
+        return ChatResponse(reply=reply, recommendations=recommendations)
+
+
+class RouteStats:
+    """
+    Contadores del reparto entre respuestas locales ("routed") y de Gemini ("llm").
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._count = {"routed": 0, "llm": 0}
+        self._seconds = {"routed": 0.0, "llm": 0.0}
+
+    def record(self, route: str, seconds: float) -> None:
+        """
+        Registra una respuesta servida por `route` ("routed" o "llm").
+        """
+        with self._lock:
+            self._count[route] += 1
+            self._seconds[route] += seconds
+
+    def snapshot(self) -> dict:
+        """
+        Reparto routed/LLM y latencia media de cada camino (para /api/admin/metrics).
+        """
+        with self._lock:
+            routed, llm = self._count["routed"], self._count["llm"]
+            total = routed + llm
+
+            def avg_ms(route: str) -> Optional[float]:
+                n = self._count[route]
+                return round(1000 * self._seconds[route] / n, 3) if n else None
+
+            return {
+                "routed": routed,
+                "llm": llm,
+                "routed_share": round(routed / total, 4) if total else 0.0,
+                "routed_avg_ms": avg_ms("routed"),
+                "llm_avg_ms": avg_ms("llm"),
+            }
+
+
+def get_router() -> IntentRouter:
+    """
+    Router de la app actual, reconstruido si cambió la huella del catálogo.
+    """
+    fingerprint = cached_catalog_fingerprint()
+    router: Optional[IntentRouter] = current_app.extensions.get("chat_router")
+    if router is None or router.fingerprint != fingerprint:
+        genres = [g for (g,) in db.session.execute(db.select(Book.genre).distinct())]
+        router = IntentRouter(genres, fingerprint=fingerprint)
+        current_app.extensions["chat_router"] = router
+    return router
@@ -0,0 +1,431 @@
+# load_test.py
+"""
+Prueba de carga offline de la aplicación.
+
+Arranca create_app() en un proceso aparte, contra una BD SQLite temporal
+con un catálogo sintético (catalog_factory.py) y un Gemini falso con
+latencia y tasa de errores configurables, y la ataca por HTTP real desde
+varios hilos con una mezcla de peticiones parecida a la de producción:
+
+  - recommend:        GET /api/recommend?favorite_genre=...&min_rating=...
+  - recommendations:  GET /recommendations?... (página HTML)
+  - chat:             POST /api/chat (consultas simples que resuelve el
+                      router local y consultas abiertas que van al "LLM")
+
+Para cada nivel de concurrencia muestra, por ruta, peticiones por segundo,
+percentiles de latencia (p50/p95/p99), tasa de errores y respuestas
+degradadas. No necesita red ni GEMINI_API_KEY.
+
+Uso:
+    python load_test.py --books 5000 --concurrency 1,8,32 --duration 10
+    python load_test.py --llm-latency 2 --llm-error-rate 0.1 --mix chat=1
+    python load_test.py --config CHAT_MAX_CONCURRENT=8 --json
+
+Con --max-error-rate el script termina con código 1 si alguna ruta supera
+esa tasa de errores, para poder usarlo en CI.
+"""
+import argparse
+import json
+import logging
+import math
+import multiprocessing
+import os
+import random
+import secrets
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from typing import Dict, List, Optional, Tuple
+
+from catalog_factory import GENRES
+
+# Mezcla de peticiones por defecto (pesos relativos)
+DEFAULT_MIX = {"recommend": 50, "recommendations": 30, "chat": 20}
+
+# Proporción de mensajes de chat abiertos (los que llegan al LLM)
+DEFAULT_OPEN_CHAT_SHARE = 0.5
+
+_OPEN_MESSAGES = [
+    "Busco algo parecido a Dune pero más oscuro",
+    "Me encantan las historias con familias complicadas, ¿qué me recomiendas?",
+    "Quiero un libro para leer en la playa que no sea muy largo",
+    "Algo con giros inesperados y un narrador poco fiable",
+    "Acabo de terminar una saga larga y quiero algo más ligero",
+]
+_SIMPLE_MESSAGES = [
+    "Recomiéndame {genre}",
+    "{genre} con nota mayor de {rating}",
+    "Dame 3 libros de {genre}",
+    "Quiero {genre} con al menos {rating} estrellas",
+]
+
+
+class FakeGeminiModel:
+    """
+    Sustituto de GenerativeModel: tarda `latency` ± `jitter` segundos,
+    falla con probabilidad `error_rate` y, si no, recomienda hasta tres de
+    los IDs del catálogo que aparecen en el prompt.
+    """
+
+    def __init__(self, latency: float, jitter: float, error_rate: float, seed: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def generate_content(self, parts):
+        with self._lock:
+            delay = max(0.0, self.latency + self._rng.uniform(-self.jitter, self.jitter))
+            fail = self._rng.random() < self.error_rate
+            pick = self._rng.random()
+        time.sleep(delay)
+        if fail:
+            raise RuntimeError("error simulado del LLM")
+
+        ids = [
+            int(line[3 : line.index(":")])
+            for line in parts[-1].splitlines()
+            if line.startswith("ID ")
+        ]
+        start = int(pick * max(1, len(ids) - 3))
+        reply = {"answer": "Te recomiendo estos libros.", "book_ids": ids[start : start + 3]}
+        return _FakeResponse(json.dumps(reply, ensure_ascii=False))
+
+
+class _FakeResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+def _serve(db_path: str, options: dict, admin_token: str, port_queue) -> None:
+    """
+    Proceso servidor: crea la BD sintética y sirve la app hasta que lo maten.
+    `admin_token` es el token de las rutas de administración (ver admin_auth.py).
+    """
+    from werkzeug.serving import make_server
+
+    # Sin el log de cada petición ni los avisos de los errores simulados del LLM
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    sys.stdout = open(os.devnull, "w")
+
+    from app import create_app
+    from catalog_factory import populate
+    from database import db
+
+    model = FakeGeminiModel(
+        options["llm_latency"],
+        options["llm_jitter"],
+        options["llm_error_rate"],
+        seed=options["seed"],
+    )
+    config = {
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{db_path}",
+        "CHAT_LLM_MODEL_FACTORY": lambda: model,
+        "RECOMMEND_ONLY": False,
+    }
+    config.update(options["config"])
+    config["ADMIN_TOKEN"] = admin_token
+    app = create_app(config)
+    with app.app_context():
+        db.create_all()
+        populate(options["books"], seed=options["seed"])
+
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    port_queue.put(server.server_port)
+    server.serve_forever()
+
+
+def _build_request(route: str, rng: random.Random, open_share: float) -> Tuple[str, Optional[bytes]]:
+    """
+    Ruta (con query string) y cuerpo JSON de una petición aleatoria de `route`.
+    """
+    genre = rng.choice(GENRES)[0]
+    rating = rng.choice([0, 3.5, 4, 4.5])
+
+    if route == "chat":
+        if rng.random() < open_share:
+            message = rng.choice(_OPEN_MESSAGES)
+        else:
+            message = rng.choice(_SIMPLE_MESSAGES).format(genre=genre.lower(), rating=rating)
+        return "/api/chat", json.dumps({"message": message}).encode("utf-8")
+
+    params = {"min_rating": rating, "limit": rng.choice([5, 10, 20])}
+    if rng.random() < 0.9:
+        params["favorite_genre"] = genre
+    if rng.random() < 0.2:
+        params["diversity"] = 0.3
+    path = "/api/recommend" if route == "recommend" else "/recommendations"
+    return path + "?" + urllib.parse.urlencode(params), None
+
+
+def _send(base_url: str, path: str, body: Optional[bytes]) -> Tuple[int, bool]:
+    """
+    Envía una petición y devuelve (código HTTP, si la respuesta vino degradada).
+    Un error de conexión cuenta como código 0.
+    """
+    req = urllib.request.Request(base_url + path, data=body)
+    if body is not None:
+        req.add_header("Content-Type", "application/json")
+    try:
+        with urllib.request.urlopen(req, timeout=60) as resp:
+            resp.read()
+            return resp.status, "X-Chat-Degraded" in resp.headers
+    except urllib.error.HTTPError as e:
+        return e.code, False
+    except OSError:
+        return 0, False
+
+
+def _percentile(sorted_values: List[float], pct: float) -> float:
+    """
+    Percentil por rango más cercano de una lista ya ordenada.
+    """
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+def _summarize(samples: List[Tuple[str, float, int, bool]], elapsed: float) -> Dict[str, dict]:
+    """
+    Agrupa las muestras (ruta, segundos, código, degradada) por ruta.
+    """
+    by_route: Dict[str, List[Tuple[float, int, bool]]] = {}
+    for route, seconds, status, degraded in samples:
+        by_route.setdefault(route, []).append((seconds, status, degraded))
+
+    summary = {}
+    for route in sorted(by_route):
+        rows = by_route[route]
+        latencies = sorted(s * 1000 for s, _, _ in rows)
+        errors = sum(1 for _, status, _ in rows if status == 0 or status >= 400)
+        summary[route] = {
+            "requests": len(rows),
+            "rps": round(len(rows) / elapsed, 2),
+            "p50_ms": round(_percentile(latencies, 50), 2),
+            "p95_ms": round(_percentile(latencies, 95), 2),
+            "p99_ms": round(_percentile(latencies, 99), 2),
+            "max_ms": round(latencies[-1], 2),
+            "error_rate": round(errors / len(rows), 4),
+            "degraded_rate": round(sum(1 for _, _, d in rows if d) / len(rows), 4),
+        }
+    return summary
+
+
+def run_level(
+    base_url: str,
+    concurrency: int,
+    duration: float,
+    mix: Dict[str, float],
+    open_share: float,
+    seed: int = 0,
+) -> Dict[str, dict]:
+    """
+    Mantiene `concurrency` clientes enviando peticiones durante `duration`
+    segundos y devuelve el resumen por ruta.
+    """
+    routes = list(mix)
+    weights = [mix[r] for r in routes]
+    samples: List[Tuple[str, float, int, bool]] = []
+    samples_lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def client(client_id: int) -> None:
+        rng = random.Random(seed * 1000 + client_id)
+        local = []
+        while time.monotonic() < deadline:
+            route = rng.choices(routes, weights)[0]
+            path, body = _build_request(route, rng, open_share)
+            start = time.perf_counter()
+            status, degraded = _send(base_url, path, body)
+            local.append((route, time.perf_counter() - start, status, degraded))
+        with samples_lock:
+            samples.extend(local)
+
+    start = time.monotonic()
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return _summarize(samples, time.monotonic() - start)
+
+
+def run(
+    books: int = 5000,
+    levels: Tuple[int, ...] = (1, 8, 32),
+    duration: float = 10.0,
+    mix: Optional[Dict[str, float]] = None,
+    open_share: float = DEFAULT_OPEN_CHAT_SHARE,
+    llm_latency: float = 1.0,
+    llm_jitter: float = 0.3,
+    llm_error_rate: float = 0.05,
+    config: Optional[dict] = None,
+    seed: int = 0,
+) -> dict:
+    """
+    Arranca el servidor, ejecuta cada nivel de concurrencia y devuelve los
+    resultados (más las métricas de /api/admin/metrics al terminar).
+    """
+    mix = mix or DEFAULT_MIX
+    options = {
+        "books": books,
+        "llm_latency": llm_latency,
+        "llm_jitter": llm_jitter,
+        "llm_error_rate": llm_error_rate,
+        "config": config or {},
+        "seed": seed,
+    }
+
+    # Token de administración para leer las métricas (uno al azar si no se pasa en config)
+    admin_token = options["config"].get("ADMIN_TOKEN") or secrets.token_urlsafe(16)
+
+    ctx = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as tmp:
+        port_queue = ctx.Queue()
+        server = ctx.Process(
+            target=_serve,
+            args=(os.path.join(tmp, "load_test.db"), options, admin_token, port_queue),
+            daemon=True,
+        )
+        server.start()
+        try:
+            base_url = f"http://127.0.0.1:{port_queue.get(timeout=120)}"
+
+            # Calentamiento: una petición de cada ruta (plantillas, índices, ...)
+            rng = random.Random(seed)
+            for route in mix:
+                _send(base_url, *_build_request(route, rng, 0.0))
+
+            results = []
+            for concurrency in levels:
+                routes = run_level(base_url, concurrency, duration, mix, open_share, seed)
+                results.append({"concurrency": concurrency, "routes": routes})
+
+            metrics_request = urllib.request.Request(
+                base_url + "/api/admin/metrics", headers={"Authorization": f"Bearer {admin_token}"}
+            )
+            with urllib.request.urlopen(metrics_request, timeout=10) as resp:
+                metrics = json.loads(resp.read())
+        finally:
+            server.terminate()
+            server.join()
+
+    return {"options": options, "levels": results, "server_metrics": metrics}
+
+
+def _parse_mix(raw: str) -> Dict[str, float]:
+    mix = {}
+    for item in raw.split(","):
+        route, _, weight = item.partition("=")
+        route = route.strip()
+        if route not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(f"ruta desconocida en --mix: {route!r}")
+        mix[route] = float(weight or 1)
+    return mix
+
+
+def _parse_config(items: List[str]) -> dict:
+    config = {}
+    for item in items:
+        key, _, raw = item.partition("=")
+        try:
+            config[key] = json.loads(raw)
+        except ValueError:
+            config[key] = raw
+    return config
+
+
+def _print_table(result: dict) -> None:
+    header = f"{'conc':>5} {'ruta':<16} {'reqs':>7} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errores':>8} {'degrad.':>8}"
+    print(header)
+    print("-" * len(header))
+    for level in result["levels"]:
+        for route, s in level["routes"].items():
+            print(
+                f"{level['concurrency']:>5} {route:<16} {s['requests']:>7} {s['rps']:>8.1f} "
+                f"{s['p50_ms']:>9.1f} {s['p95_ms']:>9.1f} {s['p99_ms']:>9.1f} "
+                f"{s['error_rate']:>8.2%} {s['degraded_rate']:>8.2%}"
+            )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--books", type=int, default=5000, help="Libros del catálogo sintético.")
+    parser.add_argument(
+        "--concurrency",
+        default="1,8,32",
+        help="Niveles de concurrencia separados por comas.",
+    )
+    parser.add_argument("--duration", type=float, default=10.0, help="Segundos por nivel.")
+    parser.add_argument(
+        "--mix",
+        type=_parse_mix,
+        default=DEFAULT_MIX,
+        help="Pesos por ruta, p. ej. recommend=50,recommendations=30,chat=20.",
+    )
+    parser.add_argument(
+        "--open-chat-share",
+        type=float,
+        default=DEFAULT_OPEN_CHAT_SHARE,
+        help="Proporción de mensajes de chat abiertos (los que van al LLM).",
+    )
+    parser.add_argument("--llm-latency", type=float, default=1.0, help="Latencia media del LLM falso (s).")
+    parser.add_argument("--llm-jitter", type=float, default=0.3, help="Variación de la latencia (± s).")
+    parser.add_argument("--llm-error-rate", type=float, default=0.05, help="Probabilidad de error del LLM falso.")
+    parser.add_argument(
+        "--config",
+        action="append",
+        default=[],
+        metavar="CLAVE=VALOR",
+        help="Sobrescribe una opción de la app (valor en JSON), p. ej. CHAT_MAX_CONCURRENT=8.",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="Salida en JSON.")
+    parser.add_argument(
+        "--max-error-rate",
+        type=float,
+        default=None,
+        help="Falla (código 1) si alguna ruta supera esta tasa de errores.",
+    )
+    args = parser.parse_args()
+
+    result = run(
+        books=args.books,
+        levels=tuple(int(c) for c in args.concurrency.split(",")),
+        duration=args.duration,
+        mix=args.mix,
+        open_share=args.open_chat_share,
+        llm_latency=args.llm_latency,
+        llm_jitter=args.llm_jitter,
+        llm_error_rate=args.llm_error_rate,
+        config=_parse_config(args.config),
+        seed=args.seed,
+    )
+
+    if args.json:
+        print(json.dumps(result, indent=2, ensure_ascii=False))
+    else:
+        _print_table(result)
+
+    if args.max_error_rate is not None:
+        worst = max(
+            (s["error_rate"] for level in result["levels"] for s in level["routes"].values()),
+            default=0.0,
+        )
+        if worst > args.max_error_rate:
+            print(
+                f"ERROR: tasa de errores {worst:.2%} (umbral {args.max_error_rate:.2%}).",
+                file=sys.stderr,
+            )
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,4 +1,7 @@
 from datetime import datetime
+
+from sqlalchemy import DDL, event
+
 from database import db
 
 class Book(db.Model):
@@ -15,3 +18,79 @@ class Book(db.Model):
     
 def __repr__(self):
     return f"<Book {self.title} ({self.author})>"
+
+
+class CatalogVersion(db.Model):
+    """
+    Una fila por cada lote de cambios aplicado al catálogo.
+    `version` crece de forma monótona y sirve como versión del catálogo.
+    """
+    __tablename__ = "catalog_versions"
+    __table_args__ = {"sqlite_autoincrement": True}  # nunca reutilizar versiones
+
+    version = db.Column(db.Integer, primary_key=True)
+    n_upserts = db.Column(db.Integer, nullable=False, default=0)
+    n_deletes = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class CatalogChange(db.Model):
+    """
+    Feed de cambios: un registro por libro afectado en cada versión.
+    Permite a cachés e índices actualizarse de forma incremental.
+    """
+    __tablename__ = "catalog_changes"
+
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(
+        db.Integer, db.ForeignKey("catalog_versions.version"), nullable=False, index=True
+    )
+    book_id = db.Column(db.Integer, nullable=False, index=True)
+    op = db.Column(db.String(10), nullable=False)  # "upsert" o "delete"
+
+
+class CatalogWriteCounter(db.Model):
+    """
+    Nº de filas de `books` escritas sin pasar por apply_bulk_changes (un
+    UPDATE a mano, un script de carga, una BD recreada, ...). Una sola
+    fila (id=1) que mantienen los triggers de abajo; apply_bulk_changes
+    descuenta sus propias escrituras. Forma parte de la huella del
+    catálogo (catalog.get_catalog_fingerprint()).
+    """
+    __tablename__ = "catalog_write_counter"
+
+    id = db.Column(db.Integer, primary_key=True)
+    n = db.Column(db.Integer, nullable=False, default=0)
+
+
+# Sin conflictos posibles, así el ON CONFLICT de la sentencia que dispara
+# el trigger (INSERT OR IGNORE, OR REPLACE, ...) no cambia lo que se cuenta
+_COUNT_BOOK_WRITE = """
+    INSERT INTO catalog_write_counter (id, n)
+    SELECT 1, 0 WHERE NOT EXISTS (SELECT 1 FROM catalog_write_counter WHERE id = 1);
+    UPDATE catalog_write_counter SET n = n + 1 WHERE id = 1;
+"""
+
+# after_create de la metadata se lanza en cada create_all (aunque las tablas
+# ya existan), así que una BD anterior a los triggers los recibe al arrancar
+for _op in ("INSERT", "UPDATE", "DELETE"):
+    event.listen(
+        db.metadata,
+        "after_create",
+        DDL(
+            f"CREATE TRIGGER IF NOT EXISTS books_count_{_op.lower()} "
+            f"AFTER {_op} ON books BEGIN {_COUNT_BOOK_WRITE} END"
+        ).execute_if(dialect="sqlite"),
+    )
+
+
+class ChatSessionRecord(db.Model):
+    """
+    Copia persistente de una sesión de chat (ver sessions.py).
+    `data` guarda en JSON el historial y los candidatos de la sesión.
+    """
+    __tablename__ = "chat_sessions"
+
+    session_id = db.Column(db.String(64), primary_key=True)
+    data = db.Column(db.Text, nullable=False)
+    updated_at = db.Column(db.Float, nullable=False, index=True)  # epoch (s)
@@ -0,0 +1,556 @@
+# neighbors.py
+"""
+Vecinos precalculados: los k libros más parecidos a cada libro del catálogo.
+
+Comparar todos los libros con todos es cuadrático, así que se hace fuera de
+las peticiones, con un comando:
+
+    python neighbors.py build                  # incremental si ya hay fichero
+    python neighbors.py build --full --workers 8 --k 20
+    python neighbors.py info
+
+El cálculo divide el catálogo en bloques de libros. Cada bloque se compara
+con el resto con un producto de matrices (vectores de retrieval.py,
+similitud de coseno) por tramos de columnas, y en cada tramo solo se
+conservan los k mejores con argpartition. Los bloques se reparten entre
+procesos (ProcessPoolExecutor); los vectores se les pasan en un .npy que
+cada proceso abre con mmap, sin copiarlos.
+
+El resultado va a un fichero binario compacto (little-endian):
+
+    cabecera   MAGIC, FORMAT_VERSION (u32), n (u32), k (u32), dim (u32),
+               versión del catálogo (i64)
+    ids        int64[n]         IDs de los libros, ordenados
+    vectors    float32[n, dim]  vector de texto de cada libro
+    neighbors  int32[n, k]      posición en `ids` de cada vecino (-1 si no hay)
+    scores     float16[n, k]    similitud de coseno
+
+que la app abre con mmap (NeighborFile) y vuelve a abrir cuando cambia.
+Con un fichero anterior, el comando solo recalcula lo que ha cambiado desde
+su versión del catálogo (changes_since): las listas completas de los libros
+modificados o nuevos, y para el resto, los modificados como candidatos que
+se mezclan con su lista anterior.
+
+Un libro modificado después de construir el fichero (su último cambio en
+el feed es posterior a la versión del fichero) no usa su lista
+precalculada, que sería la de su texto anterior: se calcula al momento,
+pero solo su vector, que se compara con los vectores del fichero (y con
+los de los pocos libros cambiados después). La petición nunca calcula los
+vectores de todo el catálogo; sin fichero no hay libros similares.
+"""
+import argparse
+import json
+import mmap
+import multiprocessing
+import os
+import struct
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
+
+from flask import current_app
+
+from catalog import changes_since, get_catalog_version
+from database import db
+from models import Book, CatalogChange
+from retrieval import book_text, text_vectors
+
+MAGIC = b"BKNB"
+FORMAT_VERSION = 2
+_HEADER = struct.Struct("<4sIIIIq")
+
+DEFAULT_K = 20
+
+# Libros por bloque (filas del producto de matrices de cada tarea)
+DEFAULT_BLOCK_SIZE = 1024
+
+# Columnas por tramo: limita la matriz de similitudes a bloque x tramo
+COLUMN_BLOCK = 65536
+
+# Con más cambios que esto (o más de esta fracción del catálogo) sale más
+# a cuenta recalcular todo
+MAX_INCREMENTAL_CHANGES = 50000
+MAX_INCREMENTAL_FRACTION = 0.2
+
+# Vecinos que puede pedir /api/books/<id>/similar (nunca más que el k del fichero)
+MAX_SIMILAR = 50
+
+# Libros cambiados después del fichero que el cálculo al momento compara
+# con su vector actual (el resto de cambios espera al siguiente build)
+MAX_LIVE_CHANGES = 1000
+
+
+# ---------- CÁLCULO ----------
+
+
+def load_vectors():
+    """
+    IDs (ordenados) y vectores de texto de todos los libros.
+    """
+    import numpy as np
+
+    rows = db.session.execute(
+        db.select(Book.id, Book.title, Book.genre, Book.description).order_by(Book.id)
+    ).all()
+    ids = np.array([r[0] for r in rows], dtype=np.int64)
+    return ids, text_vectors([book_text(r[1], r[2], r[3]) for r in rows])
+
+
+def _merge_topk(pos_a, scores_a, pos_b, scores_b, k: int):
+    """
+    Los k mejores de dos listas de candidatos por fila (de mayor a menor).
+    """
+    import numpy as np
+
+    pos = np.concatenate([pos_a, pos_b], axis=1)
+    scores = np.concatenate([scores_a, scores_b], axis=1)
+    if scores.shape[1] > k:
+        part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        pos = np.take_along_axis(pos, part, axis=1)
+        scores = np.take_along_axis(scores, part, axis=1)
+    order = np.argsort(-scores, axis=1, kind="stable")
+    return np.take_along_axis(pos, order, axis=1), np.take_along_axis(scores, order, axis=1)
+
+
+def block_topk(vectors, query_pos, k: int, cand_pos=None, col_block: int = COLUMN_BLOCK):
+    """
+    Los k vecinos de los libros `query_pos` entre los candidatos `cand_pos`
+    (posiciones en orden creciente; todos si es None), excluyendo el propio
+    libro y las similitudes <= 0.
+
+    Devuelve (posiciones int32 [b, k], similitudes float32 [b, k]), con -1
+    y -inf donde no hay vecino.
+    """
+    import numpy as np
+
+    query_pos = np.asarray(query_pos, dtype=np.int64)
+    if cand_pos is None:
+        cand_pos = np.arange(len(vectors), dtype=np.int64)
+    queries = np.asarray(vectors[query_pos], dtype=np.float32)
+    rows = np.arange(len(query_pos))
+
+    best_pos = np.full((len(query_pos), k), -1, dtype=np.int64)
+    best_scores = np.full((len(query_pos), k), -np.inf, dtype=np.float32)
+    for start in range(0, len(cand_pos), col_block):
+        cols = cand_pos[start : start + col_block]
+        scores = queries @ np.asarray(vectors[cols], dtype=np.float32).T
+
+        # El propio libro, si está entre las columnas del tramo
+        idx = np.minimum(cols.searchsorted(query_pos), len(cols) - 1)
+        self_hit = cols[idx] == query_pos
+        scores[rows[self_hit], idx[self_hit]] = -np.inf
+
+        # Los k mejores del tramo, y luego se mezclan con los anteriores
+        if scores.shape[1] > k:
+            part = np.argpartition(scores, scores.shape[1] - k, axis=1)[:, -k:]
+            scores = np.take_along_axis(scores, part, axis=1)
+            pos = cols[part]
+        else:
+            pos = np.broadcast_to(cols, scores.shape)
+        best_pos, best_scores = _merge_topk(best_pos, best_scores, pos, scores, k)
+
+    best_scores[best_scores <= 0] = -np.inf
+    best_pos[np.isinf(best_scores)] = -1
+    return best_pos.astype(np.int32), best_scores
+
+
+_worker_vectors = None
+
+
+def _init_worker(vectors_path: str) -> None:
+    global _worker_vectors
+    import numpy as np
+
+    _worker_vectors = np.load(vectors_path, mmap_mode="r")
+
+
+def _worker_topk(args):
+    query_pos, k, cand_pos, col_block = args
+    return block_topk(_worker_vectors, query_pos, k, cand_pos, col_block)
+
+
+def compute_neighbors(
+    vectors,
+    query_pos,
+    k: int,
+    cand_pos=None,
+    block_size: int = DEFAULT_BLOCK_SIZE,
+    workers: int = 1,
+    col_block: int = COLUMN_BLOCK,
+):
+    """
+    block_topk() para muchos libros: reparte `query_pos` en bloques de
+    `block_size` y, con workers > 1, los calcula en varios procesos.
+    """
+    import numpy as np
+
+    query_pos = np.asarray(query_pos, dtype=np.int64)
+    blocks = [query_pos[i : i + block_size] for i in range(0, len(query_pos), block_size)]
+    if not blocks:
+        return np.empty((0, k), dtype=np.int32), np.empty((0, k), dtype=np.float32)
+
+    if workers <= 1 or len(blocks) == 1:
+        results = [block_topk(vectors, block, k, cand_pos, col_block) for block in blocks]
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            vectors_path = os.path.join(tmp, "vectors.npy")
+            np.save(vectors_path, vectors)
+            with ProcessPoolExecutor(
+                max_workers=min(workers, len(blocks)),
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(vectors_path,),
+            ) as pool:
+                tasks = [(block, k, cand_pos, col_block) for block in blocks]
+                results = list(pool.map(_worker_topk, tasks))
+
+    return (
+        np.concatenate([pos for pos, _ in results]),
+        np.concatenate([scores for _, scores in results]),
+    )
+
+
+# ---------- FICHERO ----------
+
+
+def write_neighbors(path: str, ids, positions, scores, vectors, catalog_version: int) -> None:
+    """
+    Escribe el fichero de vecinos. Se escribe aparte y se renombra, así que
+    quien tenga abierto el anterior sigue leyéndolo sin problemas.
+    """
+    n, k = positions.shape
+    dim = vectors.shape[1]
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, FORMAT_VERSION, n, k, dim, catalog_version))
+        f.write(ids.astype("<i8").tobytes())
+        f.write(vectors.astype("<f4").tobytes())
+        f.write(positions.astype("<i4").tobytes())
+        f.write(scores.astype("<f2").tobytes())
+    os.replace(tmp, path)
+
+
+class NeighborFile:
+    """
+    Fichero de vecinos abierto con mmap (solo se lee lo que se consulta).
+    """
+
+    def __init__(self, path: str):
+        import numpy as np
+
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._mmap) < _HEADER.size:
+            raise ValueError(f"{path}: fichero de vecinos truncado")
+        magic, fmt, n, k, dim, version = _HEADER.unpack_from(self._mmap)
+        if magic != MAGIC or fmt != FORMAT_VERSION:
+            raise ValueError(f"{path}: no es un fichero de vecinos (versión {FORMAT_VERSION})")
+        if len(self._mmap) != _HEADER.size + n * (8 + 4 * dim + 4 * k + 2 * k):
+            raise ValueError(f"{path}: fichero de vecinos truncado")
+
+        self.path = path
+        self.k = k
+        self.catalog_version = version
+        offset = _HEADER.size
+        self.ids = np.frombuffer(self._mmap, dtype="<i8", count=n, offset=offset)
+        offset += 8 * n
+        self.vectors = np.frombuffer(self._mmap, dtype="<f4", count=n * dim, offset=offset).reshape(n, dim)
+        offset += 4 * n * dim
+        self.positions = np.frombuffer(self._mmap, dtype="<i4", count=n * k, offset=offset).reshape(n, k)
+        offset += 4 * n * k
+        self.scores = np.frombuffer(self._mmap, dtype="<f2", count=n * k, offset=offset).reshape(n, k)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def position(self, book_id: int) -> Optional[int]:
+        i = int(self.ids.searchsorted(book_id))
+        return i if i < len(self.ids) and self.ids[i] == book_id else None
+
+    def neighbors(self, book_id: int) -> Optional[List[Tuple[int, float]]]:
+        """
+        (id, similitud) de los vecinos de `book_id`, o None si el libro no
+        está en el fichero.
+        """
+        i = self.position(book_id)
+        if i is None:
+            return None
+        return [
+            (int(self.ids[p]), float(s))
+            for p, s in zip(self.positions[i], self.scores[i])
+            if p >= 0
+        ]
+
+    def nearest(self, vector, limit: int, exclude=()) -> List[Tuple[int, float]]:
+        """
+        (id, similitud) de los `limit` libros del fichero más parecidos a
+        `vector` (un producto matriz-vector sobre el mmap), sin los IDs de
+        `exclude`.
+        """
+        import numpy as np
+
+        if not len(self.ids):
+            return []
+        scores = self.vectors @ np.asarray(vector, dtype=np.float32)
+        for i in map(self.position, exclude):
+            if i is not None:
+                scores[i] = -np.inf
+
+        k = min(limit, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(int(self.ids[i]), float(scores[i])) for i in top if scores[i] > 0]
+
+
+# ---------- CONSTRUCCIÓN (COMPLETA O INCREMENTAL) ----------
+
+
+def _read_existing(path: str, k: int) -> Optional[NeighborFile]:
+    if not os.path.exists(path):
+        return None
+    try:
+        old = NeighborFile(path)
+    except ValueError as e:
+        print("Fichero de vecinos no válido, se recalcula entero:", e, flush=True)
+        return None
+    return old if old.k == k else None
+
+
+def _incremental(old: NeighborFile, ids, vectors, changed_ids, k, block_size, workers):
+    """
+    Actualiza las listas de `old` para el catálogo actual (`ids`, `vectors`)
+    sabiendo que solo han cambiado los libros `changed_ids`.
+
+    Las similitudes entre dos libros sin cambios no varían, así que si la
+    lista anterior de un libro no contiene ningún libro cambiado, sus k
+    vecinos actuales salen de mezclar esa lista con los libros cambiados.
+    Si contenía alguno (modificado o borrado), se recalcula entera.
+    """
+    import numpy as np
+
+    changed = np.isin(ids, np.fromiter(changed_ids, dtype=np.int64, count=len(changed_ids)))
+    changed |= ~np.isin(ids, old.ids)  # libros nuevos
+    changed_pos = np.flatnonzero(changed)
+
+    # Lista anterior de cada libro sin cambios, traducida a posiciones actuales
+    keep_pos = np.flatnonzero(~changed)
+    old_rows = old.ids.searchsorted(ids[keep_pos])
+    old_neighbors = np.asarray(old.positions[old_rows], dtype=np.int64)
+    neighbor_ids = np.where(old_neighbors >= 0, old.ids[old_neighbors], -1)
+    new_pos = np.minimum(ids.searchsorted(neighbor_ids), len(ids) - 1)
+    valid = (old_neighbors >= 0) & (ids[new_pos] == neighbor_ids)
+    valid[valid] = ~changed[new_pos[valid]]
+    intact = ((old_neighbors >= 0) == valid).all(axis=1)
+
+    positions = np.full((len(ids), k), -1, dtype=np.int32)
+    scores = np.full((len(ids), k), -np.inf, dtype=np.float32)
+
+    recompute = np.concatenate([changed_pos, keep_pos[~intact]])
+    positions[recompute], scores[recompute] = compute_neighbors(
+        vectors, recompute, k, block_size=block_size, workers=workers
+    )
+
+    merge = keep_pos[intact]
+    if len(merge):
+        kept_pos = np.where(valid[intact], new_pos[intact], -1)
+        kept_scores = np.where(
+            valid[intact], np.asarray(old.scores[old_rows[intact]], dtype=np.float32), -np.inf
+        )
+        if len(changed_pos):
+            cand_pos, cand_scores = compute_neighbors(
+                vectors, merge, k, cand_pos=changed_pos, block_size=block_size, workers=workers
+            )
+            kept_pos, kept_scores = _merge_topk(kept_pos, kept_scores, cand_pos, cand_scores, k)
+        positions[merge], scores[merge] = kept_pos, kept_scores
+
+    positions[np.isinf(scores)] = -1
+    return positions, scores, len(recompute)
+
+
+def build_neighbors(
+    path: str,
+    k: int = DEFAULT_K,
+    block_size: int = DEFAULT_BLOCK_SIZE,
+    workers: Optional[int] = None,
+    full: bool = False,
+) -> dict:
+    """
+    Calcula (o pone al día) el fichero de vecinos `path` para el catálogo
+    actual. Devuelve un resumen: modo, libros, libros recalculados y tiempo.
+    """
+    started = time.perf_counter()
+    workers = workers or os.cpu_count() or 1
+    # La versión se lee antes que los libros: si entra un lote entre medias,
+    # la próxima actualización lo verá como cambio pendiente
+    version = get_catalog_version()
+
+    old = None if full else _read_existing(path, k)
+    if old is not None and old.catalog_version == version:
+        return {"mode": "unchanged", "books": len(old), "recomputed": 0, "version": version, "seconds": 0.0}
+
+    ids, vectors = load_vectors()
+    changed_ids = None
+    if old is not None and old.catalog_version < version:
+        changes = changes_since(old.catalog_version, limit=MAX_INCREMENTAL_CHANGES)
+        changed_ids = {c.book_id for c in changes}
+        if len(changes) >= MAX_INCREMENTAL_CHANGES or len(changed_ids) > MAX_INCREMENTAL_FRACTION * len(ids):
+            changed_ids = None
+
+    if changed_ids is None or not len(ids):
+        mode = "full"
+        positions, scores = compute_neighbors(
+            vectors, range(len(ids)), k, block_size=block_size, workers=workers
+        )
+        recomputed = len(ids)
+    else:
+        mode = "incremental"
+        positions, scores, recomputed = _incremental(
+            old, ids, vectors, changed_ids, k, block_size, workers
+        )
+
+    write_neighbors(path, ids, positions, scores, vectors, version)
+    return {
+        "mode": mode,
+        "books": len(ids),
+        "recomputed": recomputed,
+        "version": version,
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+
+
+# ---------- USO DESDE LA APP ----------
+
+
+class NeighborIndex:
+    """
+    Fichero de vecinos de la app: se abre la primera vez que se usa y se
+    vuelve a abrir si el comando build lo reemplaza.
+    """
+
+    def __init__(self, path: str, check_interval: float = 1.0):
+        self.path = path
+        self.check_interval = check_interval
+        self._file: Optional[NeighborFile] = None
+        self._stat = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self) -> Optional[NeighborFile]:
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return self._file
+        with self._lock:
+            self._checked_at = now
+            try:
+                st = os.stat(self.path)
+                stat = (st.st_mtime_ns, st.st_size, st.st_ino)
+            except OSError:
+                stat = None
+            if stat != self._stat:
+                self._stat = stat
+                self._file = None
+                if stat is not None:
+                    try:
+                        self._file = NeighborFile(self.path)
+                    except (OSError, ValueError) as e:
+                        print("No se pudo abrir el fichero de vecinos:", e, flush=True)
+            return self._file
+
+    def snapshot(self) -> dict:
+        nf = self.get()
+        return {
+            "path": self.path,
+            "loaded": nf is not None,
+            "books": len(nf) if nf is not None else 0,
+            "k": nf.k if nf is not None else None,
+            "catalog_version": nf.catalog_version if nf is not None else None,
+        }
+
+
+def _live_neighbors(nf: NeighborFile, book_id: int, limit: int) -> List[Tuple[int, float]]:
+    """
+    Vecinos de `book_id` calculados al momento con los vectores del fichero:
+    solo se calculan el vector del libro y los de los libros cambiados
+    después del fichero (hasta MAX_LIVE_CHANGES), que sustituyen a los suyos.
+    """
+    changed = {c.book_id for c in changes_since(nf.catalog_version, limit=MAX_LIVE_CHANGES)}
+    changed.add(book_id)
+    rows = db.session.execute(
+        db.select(Book.id, Book.title, Book.genre, Book.description).where(Book.id.in_(changed))
+    ).all()
+    vectors = dict(zip([r[0] for r in rows], text_vectors([book_text(r[1], r[2], r[3]) for r in rows])))
+    if book_id not in vectors:
+        return []
+
+    vector = vectors.pop(book_id)
+    hits = nf.nearest(vector, limit, exclude=changed)
+    for other_id, other in vectors.items():
+        score = float(other @ vector)
+        if score > 0:
+            hits.append((other_id, score))
+    return sorted(hits, key=lambda hit: (-hit[1], hit[0]))[:limit]
+
+
+def similar_books(book_id: int, limit: int) -> Tuple[str, List[Tuple[int, float]]]:
+    """
+    Hasta `limit` libros parecidos a `book_id` (como mucho el k del
+    fichero): de la lista precalculada si está al día ("precomputed"), o
+    calculados al momento con los vectores del fichero ("live"). Sin
+    fichero no hay vecinos ("unavailable").
+    """
+    index: Optional[NeighborIndex] = current_app.extensions.get("neighbors")
+    nf = index.get() if index is not None else None
+    if nf is None:
+        return "unavailable", []
+    limit = min(limit, nf.k)
+    hits = nf.neighbors(book_id)
+    if hits is not None and not _changed_since(book_id, nf.catalog_version):
+        return "precomputed", hits[:limit]
+    return "live", _live_neighbors(nf, book_id, limit)
+
+
+def _changed_since(book_id: int, version: int) -> bool:
+    """
+    True si el libro tiene algún cambio en el feed posterior a `version`.
+    """
+    last = db.session.scalar(
+        db.select(db.func.max(CatalogChange.version)).where(CatalogChange.book_id == book_id)
+    )
+    return last is not None and last > version
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("command", choices=["build", "info"])
+    parser.add_argument("--output", default=None, help="Fichero de vecinos (por defecto NEIGHBORS_PATH).")
+    parser.add_argument("--database", default=None, help="URI de la BD (por defecto la de la app).")
+    parser.add_argument("--k", type=int, default=DEFAULT_K, help="Vecinos por libro.")
+    parser.add_argument("--block-size", type=int, default=DEFAULT_BLOCK_SIZE, help="Libros por tarea.")
+    parser.add_argument("--workers", type=int, default=None, help="Procesos (por defecto, uno por CPU).")
+    parser.add_argument("--full", action="store_true", help="Recalcular todo aunque haya fichero.")
+    args = parser.parse_args()
+
+    from app import create_app
+
+    config = {"HTML_PRERENDER": False, "SLOW_QUERY_THRESHOLD_MS": None}
+    if args.database:
+        config["SQLALCHEMY_DATABASE_URI"] = args.database
+    app = create_app(config)
+    path = args.output or app.config["NEIGHBORS_PATH"]
+
+    if args.command == "info":
+        nf = NeighborFile(path)
+        print(json.dumps({"path": path, "books": len(nf), "k": nf.k, "catalog_version": nf.catalog_version}))
+        return 0
+
+    with app.app_context():
+        result = build_neighbors(path, args.k, args.block_size, args.workers, args.full)
+    print(json.dumps({"path": path, **result}))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,6 +3,38 @@ from typing import List
 from database import db  # no lo usamos directamente ahora, pero puede ser útil
 from models import Book
 from schemas import RecommendationRequest, BookOut
+from book_rows import (
+    POPULARITY_ORDER, books_by_ids, fetch_book_rows, select_book_rows, to_book_outs,
+)
+from catalog import get_catalog_fingerprint
+from facets import get_facet_index
+from retrieval import RetrievalQuery, get_engine, sql_filters
+
+# Con diversity > 0 pedimos a la BD un pool mayor que el límite y luego
+# re-ordenamos con MMR (diversity.py) para quedarnos con `limit` libros.
+DIVERSITY_POOL_FACTOR = 10
+DIVERSITY_MAX_POOL = 1000
+
+
+def _may_have_matches(params: RecommendationRequest) -> bool:
+    """
+    Consulta las facetas precalculadas (facets.py) para saber si el filtro
+    puede devolver algo. Ante la duda (sin índice, o un género con los
+    comodines % o _ de LIKE) se responde que sí.
+
+    Un "no" solo se da por bueno con el índice al día con la huella actual
+    del catálogo (dos lecturas por clave primaria, mucho más baratas que la
+    búsqueda): si alguien ha escrito en `books` por detrás, aunque sea un
+    UPDATE de una fila, el índice se reconstruye antes.
+    """
+    genre = params.favorite_genre
+    if genre and ("%" in genre or "_" in genre):
+        return True
+    index = get_facet_index()
+    if index is None or index.may_have_matches(genre, params.min_rating):
+        return True
+    index = get_facet_index(get_catalog_fingerprint())
+    return index.may_have_matches(genre, params.min_rating)
 
 
 def recommend_books(params: RecommendationRequest) -> List[BookOut]:
@@ -13,35 +45,67 @@ def recommend_books(params: RecommendationRequest) -> List[BookOut]:
     y devuelve una lista de BookOut (libros recomendados).
     """
 
-    # 1. Empezamos por todos los libros
-    query = Book.query
+    # 0. Si las facetas dicen que ningún libro cumple el filtro, ni consultamos
+    if not _may_have_matches(params):
+        return []
+
+    # 0b. Con texto libre, los candidatos salen de la recuperación híbrida
+    if params.query:
+        return _recommend_from_query(params)
+
+    # 1. Empezamos por todos los libros (solo las columnas necesarias, sin ORM)
+    query = select_book_rows()
 
     # 2. Filtramos por género si el usuario lo ha enviado
     if params.favorite_genre:
         # ilike -> case-insensitive; usamos % para permitir "contiene"
-        query = query.filter(Book.genre.ilike(f"%{params.favorite_genre}%"))
+        query = query.where(Book.genre.ilike(f"%{params.favorite_genre}%"))
 
     # 3. Filtramos por rating mínimo
     if params.min_rating is not None:
-        query = query.filter(Book.rating >= params.min_rating)
+        query = query.where(Book.rating >= params.min_rating)
 
     # 4. Ordenamos: primero mayor rating, luego más valoraciones
-    query = query.order_by(Book.rating.desc(), Book.n_ratings.desc())
+    query = query.order_by(*POPULARITY_ORDER)
 
     # 5. Limitamos el número de resultados
-    books = query.limit(params.limit).all()
-
-    # 6. Convertimos los objetos Book (ORM) a BookOut (Pydantic)
-    result: List[BookOut] = [
-        BookOut(
-            id=b.id,
-            title=b.title,
-            author=b.author,
-            genre=b.genre,
-            description=b.description,
-            rating=b.rating,
-        )
-        for b in books
-    ]
+    if params.diversity > 0:
+        # 5b. Re-ranking por diversidad sobre un pool mayor de candidatos.
+        # Import diferido: NumPy solo se carga si se pide diversidad.
+        from diversity import diversify_books
+
+        pool_size = min(params.limit * DIVERSITY_POOL_FACTOR, DIVERSITY_MAX_POOL)
+        pool = fetch_book_rows(query.limit(pool_size))
+        books = diversify_books(pool, params.limit, params.diversity)
+    else:
+        books = fetch_book_rows(query.limit(params.limit))
+
+    # 6. Convertimos las filas (BookRow) a BookOut (Pydantic)
+    result: List[BookOut] = to_book_outs(books)
 
     return result
+
+
+def _recommend_from_query(params: RecommendationRequest) -> List[BookOut]:
+    """
+    Recomendaciones para una petición con texto libre: las etapas de
+    retrieval.py proponen candidatos (ya filtrados por género y nota) y se
+    leen en el orden de la fusión.
+    """
+    pool_size = params.limit
+    if params.diversity > 0:
+        pool_size = min(params.limit * DIVERSITY_POOL_FACTOR, DIVERSITY_MAX_POOL)
+
+    query = RetrievalQuery(params.query, params.favorite_genre, params.min_rating)
+    ids = get_engine().retrieve(query, pool_size)
+    # Los filtros se vuelven a aplicar en SQL por si el índice en memoria va por detrás
+    books = books_by_ids(ids, *sql_filters(query))
+
+    if params.diversity > 0:
+        from diversity import diversify_books
+
+        books = diversify_books(books, params.limit, params.diversity)
+    else:
+        books = books[: params.limit]
+
+    return to_book_outs(books)
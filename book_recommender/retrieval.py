@@ -0,0 +1,772 @@
+# retrieval.py
+"""
+Recuperación híbrida de candidatos para el recomendador y el chat.
+
+Varias etapas ("generadores") proponen cada una su lista de libros
+ordenada, respetando los filtros de la petición (género que contiene el
+texto, nota mínima):
+
+  - popularity: los mejor valorados (consulta SQL, el orden clásico),
+  - genre:      libros de los géneros que se mencionan en el texto,
+  - keyword:    coincidencia de palabras (BM25 sobre título, autor, género
+                y descripción, con un índice invertido en memoria),
+  - vector:     vecinos por similitud de coseno entre vectores de texto
+                (bag-of-words con hashing, NumPy).
+
+Las listas se combinan con reciprocal rank fusion ("rrf") o con una suma
+ponderada de puntuaciones normalizadas ("weighted"). Cada etapa tiene un
+presupuesto de candidatos y una caché LRU propia (por huella del
+catálogo), y se mide su latencia: el total por etapa aparece en
+/api/admin/metrics y el de cada petición en la cabecera Server-Timing.
+
+Sin texto libre solo se ejecuta la etapa de popularidad (el recomendador,
+en ese caso, ni siquiera pasa por aquí y mantiene su consulta SQL).
+Para añadir una etapa basta con una subclase de CandidateGenerator que
+implemente `generate()` (y, si hace falta, `applies()` y `cache_key()`).
+
+El índice en memoria de las etapas genre/keyword/vector se construye una
+vez y, cuando cambia la versión del catálogo, se actualiza con el feed de
+cambios (catalog.changes_since): solo se procesan los libros afectados. Si
+alguien ha escrito en `books` por fuera del feed (cambia la cuenta de
+escrituras externas de la huella; ver catalog.py), se reconstruye.
+"""
+import heapq
+import math
+import re
+import string
+import threading
+import time
+import zlib
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, List, NamedTuple, Optional, Sequence, Tuple
+
+from flask import current_app, g, has_request_context
+
+from book_rows import POPULARITY_ORDER
+from catalog import CatalogFingerprint, cached_catalog_fingerprint, changes_since
+from database import db
+from models import Book
+from text_utils import fold_text
+
+# Candidatos que puede aportar cada etapa
+DEFAULT_BUDGETS = {"genre": 200, "keyword": 200, "vector": 200, "popularity": 200}
+
+# Peso de cada etapa en la fusión
+DEFAULT_WEIGHTS = {"genre": 1.0, "keyword": 1.0, "vector": 0.7, "popularity": 0.5}
+
+# Listas de candidatos guardadas por etapa
+DEFAULT_STAGE_CACHE_SIZE = 256
+
+# Constante k de reciprocal rank fusion: 1 / (k + posición)
+RRF_K = 60
+
+# Dimensión de los vectores de texto de la etapa "vector"
+VECTOR_DIM = 256
+
+FUSIONS = ("rrf", "weighted")
+
+# Cambios pendientes a partir de los que sale más a cuenta reconstruir el índice
+MAX_INDEX_CHANGES = 5000
+
+# Fracción de posiciones de libros borrados o sustituidos a partir de la
+# que el índice se reconstruye (compacta) en lugar de actualizarse
+MAX_DEAD_FRACTION = 0.25
+
+# Lista de (id, puntuación) de mayor a menor puntuación
+ScoredIds = List[Tuple[int, float]]
+
+_TOKEN_RE = re.compile(r"\w+")
+_STOPWORDS = set(
+    """
+    algo alguna alguno como con del desde donde entre esta este esto estos hay las
+    los mas muy nos otra otro para pero por que quiero quisiera sea sin sobre son
+    su sus tambien tan tiene una uno unos unas libro libros novela novelas
+    recomienda recomiendame busco dame leer lectura parecido parecida
+    """.split()
+)
+_ASCII_LOWER = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+
+
+class RetrievalQuery(NamedTuple):
+    """
+    Petición al pipeline: texto libre (opcional) y filtros del recomendador.
+    """
+    text: Optional[str] = None
+    genre: Optional[str] = None
+    min_rating: Optional[float] = None
+
+
+def terms(text: Optional[str]) -> List[str]:
+    """
+    Palabras con significado del texto, sin tildes y recortadas a 6 letras
+    ("dragones" y "dragón" -> "dragon"; "espacial" y "espacio" -> "espaci").
+    """
+    return [
+        token[:6]
+        for token in _TOKEN_RE.findall(fold_text(text or ""))
+        if len(token) > 2 and token not in _STOPWORDS and not token.isdigit()
+    ]
+
+
+def book_text(title: str, genre: str, description: Optional[str]) -> str:
+    """
+    Texto de un libro del que salen sus vectores (etapa "vector" y vecinos
+    precalculados de neighbors.py).
+    """
+    return f"{title} {genre} {description or ''}"
+
+
+def sql_filters(query: RetrievalQuery) -> list:
+    """
+    Filtros SQL del recomendador: el género contiene el texto (ilike) y
+    nota >= min_rating.
+    """
+    filters = []
+    if query.genre:
+        filters.append(Book.genre.ilike(f"%{query.genre}%"))
+    if query.min_rating is not None:
+        filters.append(Book.rating >= query.min_rating)
+    return filters
+
+
+def genre_matcher(genre: Optional[str]) -> Callable[[str], bool]:
+    """
+    Equivalente en Python de `Book.genre.ilike('%<genre>%')` en SQLite: solo
+    ignora mayúsculas en ASCII y trata % y _ como comodines. Lo usan las
+    etapas en memoria para aplicar el mismo filtro que la consulta SQL.
+    """
+    if not genre:
+        return lambda value: True
+    pattern = "".join(
+        ".*" if c == "%" else "." if c == "_" else re.escape(c)
+        for c in genre.translate(_ASCII_LOWER)
+    )
+    regex = re.compile(pattern, re.DOTALL)
+    return lambda value: regex.search(value.translate(_ASCII_LOWER)) is not None
+
+
+# ---------- ÍNDICE EN MEMORIA (etapas genre, keyword y vector) ----------
+
+
+class CatalogIndex:
+    """
+    Datos del catálogo para las etapas en memoria. Cada libro ocupa una
+    posición en las listas `ids`, `ratings`, `genres`, ...
+
+    Un índice no se modifica nunca (las etapas lo leen desde varios hilos
+    sin bloqueos): updated() devuelve uno nuevo con un lote de cambios
+    aplicado, copiando solo lo que cambia. Los libros borrados o
+    modificados dejan su posición "muerta" (fuera de `positions`, de
+    `by_genre` y del índice invertido, y con vector nulo) y las versiones
+    nuevas se añaden al final.
+
+    Los vectores se calculan la primera vez que se usan (NumPy solo se
+    importa entonces); tras updated() solo se calculan los de las
+    posiciones nuevas.
+    """
+
+    def __init__(self, rows: Sequence[tuple], fingerprint: Optional[CatalogFingerprint] = None):
+        # rows: (id, title, author, genre, description, rating, n_ratings)
+        self.fingerprint = fingerprint
+        self.ids: List[int] = []
+        self.ratings: List[float] = []
+        self.genres: List[str] = []
+        self.positions: Dict[int, int] = {}  # id -> posición viva
+        self.postings: Dict[str, List[Tuple[int, int]]] = {}
+        self.doc_len: List[int] = []
+        self._n_ratings: List[int] = []
+        self._texts: List[str] = []
+        self._doc_terms: List[Tuple[str, ...]] = []
+        self._total_len = 0
+        self._dead: frozenset = frozenset()
+        self._append(rows, set())
+
+        # Posiciones de cada género, de más a menos popular
+        self.by_genre: Dict[str, List[int]] = {}
+        for i in sorted(range(len(self.ids)), key=self._popularity_key):
+            self.by_genre.setdefault(self.genres[i], []).append(i)
+        self.genre_terms = {genre: terms(genre) for genre in self.by_genre}
+
+        self._base_vectors = None
+        self._init_lazy()
+
+    def _init_lazy(self) -> None:
+        self._vectors = None
+        self._vectors_lock = threading.Lock()
+        self._genre_codes = None
+
+    def _popularity_key(self, i: int) -> tuple:
+        return (-self.ratings[i], -self._n_ratings[i], self.ids[i])
+
+    def _append(self, rows: Sequence[tuple], copied: set) -> List[int]:
+        """
+        Añade libros al final. Las listas del índice invertido que no estén
+        en `copied` se copian antes de tocarlas (pueden ser de otro índice).
+        Devuelve las posiciones nuevas.
+        """
+        added = []
+        for book_id, title, author, genre, description, rating, n_ratings in rows:
+            i = len(self.ids)
+            added.append(i)
+            self.ids.append(book_id)
+            self.ratings.append(rating or 0.0)
+            self.genres.append(genre)
+            self._n_ratings.append(n_ratings or 0)
+            self._texts.append(book_text(title, genre, description))
+            self.positions[book_id] = i
+
+            # Índice invertido para BM25 (el título cuenta doble)
+            counts: Dict[str, int] = {}
+            for term in terms(f"{title} {title} {author} {genre} {description or ''}"):
+                counts[term] = counts.get(term, 0) + 1
+            for term, tf in counts.items():
+                if term not in copied:
+                    self.postings[term] = list(self.postings.get(term, ()))
+                    copied.add(term)
+                self.postings[term].append((i, tf))
+            self._doc_terms.append(tuple(counts))
+            self.doc_len.append(sum(counts.values()))
+            self._total_len += self.doc_len[-1]
+        return added
+
+    def updated(
+        self, rows: Sequence[tuple], removed_ids, fingerprint: CatalogFingerprint
+    ) -> "CatalogIndex":
+        """
+        Índice nuevo con los libros `removed_ids` quitados y los de `rows`
+        (mismo formato que en el constructor) añadidos o sustituidos.
+        """
+        new = CatalogIndex.__new__(CatalogIndex)
+        new.fingerprint = fingerprint
+        new.ids = list(self.ids)
+        new.ratings = list(self.ratings)
+        new.genres = list(self.genres)
+        new.positions = dict(self.positions)
+        new.postings = dict(self.postings)
+        new.doc_len = list(self.doc_len)
+        new._n_ratings = list(self._n_ratings)
+        new._texts = list(self._texts)
+        new._doc_terms = list(self._doc_terms)
+        new._total_len = self._total_len
+
+        # 1. Las posiciones de los libros borrados o modificados mueren
+        gone = set()
+        for book_id in set(removed_ids) | {row[0] for row in rows}:
+            i = new.positions.pop(book_id, None)
+            if i is not None:
+                gone.add(i)
+        new._dead = self._dead | gone
+
+        copied: set = set()
+        for i in gone:
+            new._total_len -= new.doc_len[i]
+            for term in new._doc_terms[i]:
+                if term not in copied:
+                    new.postings[term] = [p for p in new.postings[term] if p[0] not in gone]
+                    copied.add(term)
+        for term in copied:
+            if not new.postings[term]:
+                del new.postings[term]
+
+        # 2. Los libros nuevos o modificados van al final
+        added = new._append(rows, copied)
+
+        # 3. Solo se reordenan los géneros afectados
+        new.by_genre = dict(self.by_genre)
+        new.genre_terms = dict(self.genre_terms)
+        fresh: Dict[str, List[int]] = {}
+        for i in added:
+            fresh.setdefault(new.genres[i], []).append(i)
+        for genre in {new.genres[i] for i in gone} | set(fresh):
+            kept = [i for i in new.by_genre.get(genre, ()) if i not in gone]
+            extra = sorted(fresh.get(genre, ()), key=new._popularity_key)
+            merged = list(heapq.merge(kept, extra, key=new._popularity_key))
+            if merged:
+                new.by_genre[genre] = merged
+                new.genre_terms.setdefault(genre, terms(genre))
+            else:
+                new.by_genre.pop(genre, None)
+                new.genre_terms.pop(genre, None)
+
+        new._base_vectors = self._vectors if self._vectors is not None else self._base_vectors
+        new._init_lazy()
+        return new
+
+    @property
+    def n_docs(self) -> int:
+        """
+        Libros vivos en el índice.
+        """
+        return len(self.positions)
+
+    @property
+    def avg_len(self) -> float:
+        return self._total_len / self.n_docs if self.n_docs else 0.0
+
+    @property
+    def dead_fraction(self) -> float:
+        return len(self._dead) / len(self.ids) if self.ids else 0.0
+
+    def position(self, book_id: int) -> Optional[int]:
+        """
+        Posición viva de `book_id` (None si no está en el catálogo).
+        """
+        return self.positions.get(book_id)
+
+    def allowed(self, query: RetrievalQuery) -> Callable[[int], bool]:
+        """
+        Función posición -> si el libro existe y cumple los filtros de `query`.
+        """
+        matches = genre_matcher(query.genre)
+        genre_ok = {genre: matches(genre) for genre in self.by_genre}
+        min_rating = query.min_rating
+        dead = self._dead
+        return lambda i: (
+            i not in dead
+            and genre_ok[self.genres[i]]
+            and (min_rating is None or self.ratings[i] >= min_rating)
+        )
+
+    @property
+    def vectors(self):
+        """
+        Matriz (n x VECTOR_DIM) de vectores de texto normalizados (nulos en
+        las posiciones muertas).
+        """
+        if self._vectors is None:
+            with self._vectors_lock:
+                if self._vectors is None:
+                    import numpy as np
+
+                    base = self._base_vectors
+                    if base is not None:
+                        matrix = np.vstack([base, text_vectors(self._texts[len(base):])])
+                    else:
+                        matrix = text_vectors(self._texts)
+                    if self._dead:
+                        matrix[sorted(self._dead)] = 0.0
+                    self._vectors = matrix
+                    self._base_vectors = None
+        return self._vectors
+
+    def allowed_mask(self, query: RetrievalQuery):
+        """
+        Versión vectorizada de allowed(): array booleano con una posición por libro.
+        """
+        import numpy as np
+
+        if self._genre_codes is None:
+            code: Dict[str, int] = {}
+            codes = np.array([code.setdefault(x, len(code)) for x in self.genres], dtype=np.int32)
+            alive = np.ones(len(self.ids), dtype=bool)
+            alive[sorted(self._dead)] = False
+            self._genre_codes = (codes, list(code), alive)
+        codes, names, alive = self._genre_codes
+        matches = genre_matcher(query.genre)
+        mask = np.array([matches(genre) for genre in names], dtype=bool)[codes] & alive
+        if query.min_rating is not None:
+            # Misma comparación que en SQL, en float64
+            mask &= np.array(self.ratings, dtype=np.float64) >= query.min_rating
+        return mask
+
+
+def _stable_hash(term: str) -> int:
+    return zlib.crc32(term.encode("utf-8"))
+
+
+def text_vectors(texts: Sequence[str], dim: int = VECTOR_DIM):
+    """
+    Vectores bag-of-words con hashing (con signo), normalizados.
+    """
+    import numpy as np
+
+    matrix = np.zeros((len(texts), dim), dtype=np.float32)
+    for row, text in enumerate(texts):
+        for term in terms(text):
+            h = _stable_hash(term)
+            matrix[row, h % dim] += 1.0 if (h >> 16) & 1 else -1.0
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    np.divide(matrix, norms, out=matrix, where=norms > 0)
+    return matrix
+
+
+# ---------- ETAPAS ----------
+
+
+class CandidateGenerator(ABC):
+    """
+    Interfaz de una etapa del pipeline.
+    """
+    name = ""
+
+    def applies(self, query: RetrievalQuery) -> bool:
+        """
+        Si la etapa tiene algo que aportar a `query`.
+        """
+        return True
+
+    def cache_key(self, query: RetrievalQuery) -> Hashable:
+        """
+        Clave de la caché de la etapa (junto con la versión y el presupuesto).
+        """
+        return query
+
+    @abstractmethod
+    def generate(
+        self,
+        engine: "RetrievalEngine",
+        query: RetrievalQuery,
+        budget: int,
+        fingerprint: CatalogFingerprint,
+    ) -> ScoredIds:
+        """
+        Hasta `budget` candidatos que cumplen los filtros, de mejor a peor.
+        `engine.catalog_index(fingerprint)` da el índice en memoria.
+        """
+
+
+class PopularityGenerator(CandidateGenerator):
+    """
+    Los mejor valorados que cumplen los filtros, en SQL.
+    """
+    name = "popularity"
+
+    def cache_key(self, query: RetrievalQuery) -> Hashable:
+        return (query.genre, query.min_rating)
+
+    def generate(self, engine, query, budget, fingerprint):
+        rows = db.session.execute(
+            db.select(Book.id, Book.rating)
+            .where(*sql_filters(query))
+            .order_by(*POPULARITY_ORDER, Book.id)
+            .limit(budget)
+        )
+        return [(book_id, rating or 0.0) for book_id, rating in rows]
+
+
+class GenreGenerator(CandidateGenerator):
+    """
+    Libros de los géneros mencionados en el texto, por popularidad.
+    """
+    name = "genre"
+
+    def applies(self, query):
+        return bool(query.text)
+
+    def generate(self, engine, query, budget, fingerprint):
+        index = engine.catalog_index(fingerprint)
+        words = terms(query.text)
+        mentioned = [
+            genre
+            for genre, genre_words in index.genre_terms.items()
+            if genre_words and all(any(w.startswith(gw[:5]) for w in words) for gw in genre_words)
+        ]
+        allowed = index.allowed(query)
+        lists = [(i for i in index.by_genre[genre] if allowed(i)) for genre in mentioned]
+        merged = heapq.merge(*lists, key=lambda i: -index.ratings[i])
+        return [(index.ids[i], index.ratings[i]) for i in _take(merged, budget)]
+
+
+class KeywordGenerator(CandidateGenerator):
+    """
+    BM25 sobre el índice invertido.
+    """
+    name = "keyword"
+    k1 = 1.2
+    b = 0.75
+
+    def applies(self, query):
+        return bool(terms(query.text))
+
+    def cache_key(self, query):
+        return (tuple(sorted(set(terms(query.text)))), query.genre, query.min_rating)
+
+    def generate(self, engine, query, budget, fingerprint):
+        index = engine.catalog_index(fingerprint)
+        n_docs, avg_len = index.n_docs, index.avg_len
+        scores: Dict[int, float] = {}
+        for term in set(terms(query.text)):
+            postings = index.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            for i, tf in postings:
+                norm = self.k1 * (1 - self.b + self.b * index.doc_len[i] / avg_len)
+                scores[i] = scores.get(i, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+
+        allowed = index.allowed(query)
+        best = heapq.nlargest(
+            budget,
+            (i for i in scores if allowed(i)),
+            key=lambda i: (scores[i], index.ratings[i]),
+        )
+        return [(index.ids[i], scores[i]) for i in best]
+
+
+class VectorGenerator(CandidateGenerator):
+    """
+    Vecinos más cercanos (coseno) del vector del texto.
+    """
+    name = "vector"
+
+    def applies(self, query):
+        return bool(terms(query.text))
+
+    def cache_key(self, query):
+        return (tuple(sorted(terms(query.text))), query.genre, query.min_rating)
+
+    def generate(self, engine, query, budget, fingerprint):
+        import numpy as np
+
+        index = engine.catalog_index(fingerprint)
+        if not index.n_docs:
+            return []
+        scores = index.vectors @ text_vectors([query.text])[0]
+
+        if query.genre or query.min_rating is not None:
+            scores = np.where(index.allowed_mask(query), scores, -np.inf)
+
+        k = min(budget, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(index.ids[i], float(scores[i])) for i in top if scores[i] > 0]
+
+
+def _take(items, n: int) -> list:
+    out = []
+    for item in items:
+        if len(out) >= n:
+            break
+        out.append(item)
+    return out
+
+
+def default_generators() -> List[CandidateGenerator]:
+    return [GenreGenerator(), KeywordGenerator(), VectorGenerator(), PopularityGenerator()]
+
+
+# ---------- FUSIÓN ----------
+
+
+def rrf_fuse(lists: Dict[str, ScoredIds], weights: Dict[str, float], k: int = RRF_K) -> List[int]:
+    """
+    Reciprocal rank fusion: cada etapa suma peso / (k + posición).
+    Con una sola lista se conserva su orden.
+    """
+    scores: Dict[int, float] = {}
+    for name, items in lists.items():
+        weight = weights.get(name, 1.0)
+        for rank, (book_id, _) in enumerate(items):
+            scores[book_id] = scores.get(book_id, 0.0) + weight / (k + rank + 1)
+    return sorted(scores, key=lambda i: -scores[i])
+
+
+def weighted_fuse(lists: Dict[str, ScoredIds], weights: Dict[str, float]) -> List[int]:
+    """
+    Suma ponderada de las puntuaciones de cada etapa, normalizadas a [0, 1].
+    """
+    scores: Dict[int, float] = {}
+    for name, items in lists.items():
+        if not items:
+            continue
+        weight = weights.get(name, 1.0)
+        values = [score for _, score in items]
+        low, high = min(values), max(values)
+        for book_id, score in items:
+            norm = (score - low) / (high - low) if high > low else 1.0
+            scores[book_id] = scores.get(book_id, 0.0) + weight * norm
+    return sorted(scores, key=lambda i: -scores[i])
+
+
+# ---------- MOTOR ----------
+
+
+class _StageCache:
+    """
+    LRU de listas de candidatos de una etapa.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._items: "OrderedDict[Hashable, ScoredIds]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[ScoredIds]:
+        with self._lock:
+            items = self._items.get(key)
+            if items is not None:
+                self._items.move_to_end(key)
+            return items
+
+    def put(self, key: Hashable, items: ScoredIds) -> None:
+        with self._lock:
+            self._items[key] = items
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+
+
+class RetrievalEngine:
+    """
+    Pipeline de recuperación: etapas + presupuestos + cachés + fusión.
+    """
+
+    def __init__(
+        self,
+        generators: Optional[List[CandidateGenerator]] = None,
+        budgets: Optional[Dict[str, int]] = None,
+        weights: Optional[Dict[str, float]] = None,
+        fusion: str = "rrf",
+        cache_size: int = DEFAULT_STAGE_CACHE_SIZE,
+    ):
+        if fusion not in FUSIONS:
+            raise ValueError(f"fusion debe ser uno de {FUSIONS}")
+        self.generators = generators or default_generators()
+        self.budgets = {**DEFAULT_BUDGETS, **(budgets or {})}
+        self.weights = {**DEFAULT_WEIGHTS, **(weights or {})}
+        self.fusion = fusion
+        self._caches = {gen.name: _StageCache(cache_size) for gen in self.generators}
+
+        self._lock = threading.Lock()
+        self._stats = {
+            gen.name: {"calls": 0, "cache_hits": 0, "seconds": 0.0, "candidates": 0}
+            for gen in self.generators
+        }
+        self._index: Optional[CatalogIndex] = None
+        self._index_lock = threading.Lock()
+
+    def catalog_index(self, fingerprint: CatalogFingerprint) -> CatalogIndex:
+        """
+        Índice en memoria para la huella `fingerprint` del catálogo. Mientras
+        un hilo lo actualiza, el resto sigue usando el anterior.
+        """
+        index = self._index
+        if index is None or index.fingerprint != fingerprint:
+            if self._index_lock.acquire(blocking=index is None):
+                try:
+                    index = self._index
+                    if index is None or index.fingerprint != fingerprint:
+                        index = self._next_index(index, fingerprint)
+                        self._index = index
+                finally:
+                    self._index_lock.release()
+        return index
+
+    def _next_index(
+        self, index: Optional[CatalogIndex], fingerprint: CatalogFingerprint
+    ) -> CatalogIndex:
+        """
+        Índice de la huella `fingerprint`: el actual con los cambios del feed
+        aplicados o, si no se puede (no hay índice, la versión ha bajado, ha
+        habido escrituras por fuera del feed, hay demasiados cambios o
+        demasiadas posiciones muertas), uno desde cero.
+        """
+        if (
+            index is not None
+            and index.fingerprint.version < fingerprint.version
+            and index.fingerprint.external_writes == fingerprint.external_writes
+        ):
+            changes = changes_since(index.fingerprint.version, limit=MAX_INDEX_CHANGES)
+            if len(changes) < MAX_INDEX_CHANGES:
+                changes = [c for c in changes if c.version <= fingerprint.version]
+                upserted = {c.book_id for c in changes if c.op == "upsert"}
+                deleted = {c.book_id for c in changes if c.op == "delete"} - upserted
+                rows = _index_rows(Book.id.in_(upserted)) if upserted else []
+                updated = index.updated(rows, upserted | deleted, fingerprint)
+                if updated.dead_fraction <= MAX_DEAD_FRACTION:
+                    return updated
+        return CatalogIndex(_index_rows(), fingerprint=fingerprint)
+
+    def retrieve(self, query: RetrievalQuery, k: int) -> List[int]:
+        """
+        IDs de los `k` mejores candidatos para `query`, ya fusionados.
+        """
+        refresh = current_app.config.get("RETRIEVAL_REFRESH_SECONDS", 1.0)
+        fingerprint = cached_catalog_fingerprint(max_age=refresh)
+
+        lists: Dict[str, ScoredIds] = {}
+        timings: Dict[str, float] = {}
+        for gen in self.generators:
+            budget = self.budgets.get(gen.name, 0)
+            if budget <= 0 or not gen.applies(query):
+                continue
+            start = time.perf_counter()
+            key = (fingerprint, budget, gen.cache_key(query))
+            items = self._caches[gen.name].get(key)
+            hit = items is not None
+            if not hit:
+                items = gen.generate(self, query, budget, fingerprint)
+                # Si se ha usado un índice antiguo (otro hilo lo está
+                # reconstruyendo), el resultado no se guarda con esta huella
+                index = self._index
+                if index is None or index.fingerprint == fingerprint:
+                    self._caches[gen.name].put(key, items)
+            elapsed = time.perf_counter() - start
+
+            lists[gen.name] = items
+            timings[gen.name] = elapsed
+            with self._lock:
+                stats = self._stats[gen.name]
+                stats["calls"] += 1
+                stats["cache_hits"] += hit
+                stats["seconds"] += elapsed
+                stats["candidates"] += len(items)
+
+        start = time.perf_counter()
+        if self.fusion == "weighted":
+            fused = weighted_fuse(lists, self.weights)
+        else:
+            fused = rrf_fuse(lists, self.weights)
+        timings["fusion"] = time.perf_counter() - start
+
+        if has_request_context():
+            g.retrieval_timings = timings
+        return fused[:k]
+
+    def snapshot(self) -> dict:
+        """
+        Métricas por etapa (para /api/admin/metrics).
+        """
+        with self._lock:
+            stages = {
+                name: {
+                    "calls": s["calls"],
+                    "cache_hits": s["cache_hits"],
+                    "avg_ms": round(1000 * s["seconds"] / s["calls"], 3) if s["calls"] else None,
+                    "avg_candidates": round(s["candidates"] / s["calls"], 1) if s["calls"] else None,
+                    "budget": self.budgets.get(name, 0),
+                    "weight": self.weights.get(name, 1.0),
+                }
+                for name, s in self._stats.items()
+            }
+        index = self._index
+        return {
+            "fusion": self.fusion,
+            "stages": stages,
+            "index_version": index.fingerprint.version if index is not None else None,
+            "index_books": index.n_docs if index is not None else 0,
+        }
+
+
+def _index_rows(*where) -> list:
+    """
+    Filas (id, title, author, genre, description, rating, n_ratings) para CatalogIndex.
+    """
+    return db.session.execute(
+        db.select(
+            Book.id, Book.title, Book.author, Book.genre,
+            Book.description, Book.rating, Book.n_ratings,
+        ).where(*where)
+    ).all()
+
+
+def get_engine() -> RetrievalEngine:
+    """
+    Motor de la app actual (se crea con la configuración por defecto si la
+    app no registró uno).
+    """
+    engine = current_app.extensions.get("retrieval")
+    if engine is None:
+        engine = current_app.extensions.setdefault("retrieval", RetrievalEngine())
+    return engine
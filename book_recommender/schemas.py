@@ -1,5 +1,7 @@
 # schemas.py
-from pydantic import BaseModel, Field
+import json
+
+from pydantic import BaseModel, Field, field_validator, model_validator
 from typing import List, Optional
 
 
@@ -23,6 +25,38 @@ class RecommendationRequest(BaseModel):
         le=50,
         description="Número máximo de libros a devolver."
     )
+    diversity: float = Field(
+        0.0,
+        ge=0,
+        le=1,
+        description=(
+            "Peso de la diversidad en el re-ranking MMR (0 = solo rating, "
+            "1 = máxima variedad de autores/géneros)."
+        ),
+    )
+    query: Optional[str] = Field(
+        None,
+        max_length=200,
+        description=(
+            "Texto libre opcional ('dragones y magia', 'misterio en Venecia'): "
+            "activa la recuperación por palabras clave, género y similitud."
+        ),
+    )
+
+    @field_validator("favorite_genre", "query")
+    @classmethod
+    def normalize_genre(cls, value: Optional[str]) -> Optional[str]:
+        # " Fantasia " y "Fantasia" dan los mismos resultados; "" equivale a sin filtro
+        if value is None:
+            return None
+        return value.strip() or None
+
+    def cache_key(self) -> str:
+        """
+        Clave normalizada de la petición: dos peticiones con la misma clave
+        devuelven las mismas recomendaciones (para una misma versión del catálogo).
+        """
+        return json.dumps(self.dict(), sort_keys=True, ensure_ascii=False)
 
 
 class BookOut(BaseModel):
@@ -59,10 +93,22 @@ class ChatMessage(BaseModel):
 
 class ChatRequest(BaseModel):
     """
-    Petición al chatbot.
-    messages: historial completo de la conversación hasta ahora.
+    Petición al chatbot. Dos formas de uso:
+    - messages: historial completo de la conversación hasta ahora, o
+    - message (+ session_id): solo el mensaje nuevo; el historial se guarda
+      en el servidor. Sin session_id se abre una sesión nueva.
     """
-    messages: List[ChatMessage]
+    messages: List[ChatMessage] = Field(default_factory=list)
+    message: Optional[str] = Field(None, min_length=1)
+    session_id: Optional[str] = Field(None, max_length=64)
+
+    @model_validator(mode="after")
+    def check_mode(self):
+        if self.message is None and not self.messages:
+            raise ValueError("Hay que enviar 'messages' o 'message'.")
+        if self.message is not None and self.messages:
+            raise ValueError("Usa 'messages' o 'message', no ambos.")
+        return self
 
 
 class ChatResponse(BaseModel):
@@ -70,6 +116,144 @@ class ChatResponse(BaseModel):
     Respuesta del chatbot.
     reply: texto de Gemini.
     recommendations: mismos campos que BookOut, si el modelo devolvió libros.
+    session_id: sesión a usar en el siguiente turno (si se usan sesiones).
     """
     reply: str
     recommendations: List[BookOut] = []
+    session_id: Optional[str] = None
+
+
+# ---------- CATÁLOGO: CARGA MASIVA Y FEED DE CAMBIOS ----------
+
+# Tamaño máximo de un lote en /api/books/bulk
+MAX_BULK_ITEMS = 1000
+
+
+class BookIn(BaseModel):
+    """
+    Libro a insertar o actualizar.
+    Si `id` existe en la BD se actualiza; si no, se inserta (con ese id o uno nuevo).
+    """
+    id: Optional[int] = Field(None, ge=1)
+    title: str = Field(..., min_length=1, max_length=255)
+    author: str = Field(..., min_length=1, max_length=255)
+    genre: str = Field(..., min_length=1, max_length=100)
+    description: Optional[str] = None
+    rating: float = Field(..., ge=0, le=5)
+    n_ratings: Optional[int] = Field(None, ge=0)
+
+
+class BulkBooksRequest(BaseModel):
+    """
+    Lote de cambios del catálogo que se aplica en una única transacción.
+    """
+    upserts: List[BookIn] = Field(default_factory=list, max_length=MAX_BULK_ITEMS)
+    deletes: List[int] = Field(default_factory=list, max_length=MAX_BULK_ITEMS)
+
+    @model_validator(mode="after")
+    def check_ids(self):
+        upsert_ids = [b.id for b in self.upserts if b.id is not None]
+        if len(upsert_ids) != len(set(upsert_ids)):
+            raise ValueError("Hay ids repetidos en 'upserts'.")
+        if set(upsert_ids) & set(self.deletes):
+            raise ValueError("Un mismo id no puede estar en 'upserts' y en 'deletes'.")
+        if not self.upserts and not self.deletes:
+            raise ValueError("El lote está vacío.")
+        return self
+
+
+class BulkBooksResponse(BaseModel):
+    """
+    Resultado de aplicar un lote: nueva versión del catálogo y libros afectados.
+    """
+    version: int
+    upserted_ids: List[int]
+    deleted_ids: List[int]
+
+
+class CatalogChangeOut(BaseModel):
+    """
+    Entrada del feed de cambios del catálogo.
+    """
+    version: int
+    book_id: int
+    op: Literal["upsert", "delete"]
+
+
+class CatalogChangesResponse(BaseModel):
+    """
+    Página del feed de cambios (versión actual + cambios posteriores a `since`).
+    """
+    version: int
+    changes: List[CatalogChangeOut]
+
+
+# ---------- AUTOCOMPLETADO ----------
+
+
+class SuggestionOut(BaseModel):
+    """
+    Sugerencia de autocompletado.
+    kind: 'title', 'author' o 'genre'.
+    """
+    text: str
+    kind: Literal["title", "author", "genre"]
+
+
+class SuggestResponse(BaseModel):
+    """
+    Respuesta de /api/suggest.
+    """
+    prefix: str
+    suggestions: List[SuggestionOut]
+
+
+
+# ---------- FACETAS ----------
+
+
+class GenreFacetOut(BaseModel):
+    """
+    Facetas de un género: número de libros, histograma de notas y libros con
+    nota mayor o igual que cada umbral de FacetsResponse.thresholds.
+    """
+    genre: str
+    count: int
+    rating_histogram: List[int]
+    at_least: List[int]
+
+
+class FacetsResponse(BaseModel):
+    """
+    Respuesta de /api/facets.
+    rating_histogram[i] cuenta las notas en [thresholds[i], thresholds[i] + rating_step)
+    (el último tramo incluye el 5).
+    """
+    version: int
+    total: int
+    rating_step: float
+    thresholds: List[float]
+    rating_histogram: List[int]
+    at_least: List[int]
+    genres: List[GenreFacetOut]
+
+
+# ---------- LIBROS SIMILARES ----------
+
+
+class SimilarBookOut(BookOut):
+    """
+    Libro parecido a otro, con su similitud de coseno (0-1).
+    """
+    similarity: float
+
+
+class SimilarBooksResponse(BaseModel):
+    """
+    Respuesta de /api/books/<id>/similar.
+    source: "precomputed" (fichero de neighbors.py), "live" (calculado al momento
+    con los vectores del fichero) o "unavailable" (no hay fichero).
+    """
+    book_id: int
+    source: str
+    similar: List[SimilarBookOut]
@@ -1,7 +1,10 @@
 # seed_data.py
 from flask import Flask
+from sqlalchemy import inspect, insert
+
+from catalog import forget_own_writes, get_external_writes
 from database import db
-from models import Book
+from models import Book, CatalogChange, CatalogVersion, CatalogWriteCounter
 
 
 def create_app():
@@ -25,11 +28,26 @@ def seed():
     app = create_app()
 
     with app.app_context():
-        # (Opcional, pero útil en desarrollo) Borrar todas las tablas existentes
-        db.drop_all()
+        # IDs de los libros actuales, para registrarlos como borrados
+        old_ids = []
+        if inspect(db.engine).has_table(Book.__tablename__):
+            old_ids = list(db.session.scalars(db.select(Book.id)))
+        db.session.rollback()
+
+        # (Opcional, pero útil en desarrollo) Borrar las tablas existentes.
+        # El feed de cambios del catálogo se conserva: la nueva carga es una
+        # versión más, así los procesos que estén sirviendo la app ven que
+        # el catálogo ha cambiado y no reutilizan cachés ni índices viejos.
+        # También el contador de escrituras externas, que forma parte de la
+        # huella del catálogo.
+        keep = {CatalogVersion.__table__, CatalogChange.__table__, CatalogWriteCounter.__table__}
+        db.metadata.drop_all(
+            db.engine, tables=[t for t in db.metadata.sorted_tables if t not in keep]
+        )
 
-        # Crear todas las tablas definidas en models.py
+        # Crear todas las tablas definidas en models.py (y los triggers de books)
         db.create_all()
+        external_writes = get_external_writes()
 
         # Lista de libros de ejemplo
         books = [
@@ -118,7 +136,21 @@ def seed():
         # Puedes añadir más libros siguiendo el mismo patrón si quieres llegar a 20+.
         # Por ejemplo, duplicar con ligeras variaciones o añadir más títulos reales.
 
-        db.session.bulk_save_objects(books)
+        db.session.add_all(books)
+        db.session.flush()
+
+        # Nueva versión del catálogo con sus cambios (ver catalog.py)
+        new_ids = [b.id for b in books]
+        deleted_ids = sorted(set(old_ids) - set(new_ids))
+        version_row = CatalogVersion(n_upserts=len(new_ids), n_deletes=len(deleted_ids))
+        db.session.add(version_row)
+        db.session.flush()
+        db.session.execute(
+            insert(CatalogChange),
+            [{"version": version_row.version, "book_id": i, "op": "upsert"} for i in new_ids]
+            + [{"version": version_row.version, "book_id": i, "op": "delete"} for i in deleted_ids],
+        )
+        forget_own_writes(external_writes)
         db.session.commit()
 
         print("Base de datos creada y sembrada con libros de ejemplo.")
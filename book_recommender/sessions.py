@@ -0,0 +1,226 @@
+# sessions.py
+"""
+Sesiones de chat en el servidor.
+
+Con sesiones, el cliente envía solo el mensaje nuevo y un `session_id`; el
+servidor guarda el historial y el estado calculado en el primer turno (los
+libros candidatos y el bloque de catálogo del prompt), así que el tamaño de
+la petición y el trabajo por turno no crecen con la conversación.
+
+SessionStore guarda las sesiones en memoria con expulsión LRU y caducidad
+(TTL). Opcionalmente se respaldan en SQLite (tabla chat_sessions) para que
+sobrevivan a un reinicio o se compartan entre procesos; las filas caducadas
+se borran periódicamente al guardar (purge_expired()).
+"""
+import json
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from database import db
+from models import ChatSessionRecord
+
+# Mensajes que se conservan por sesión (los más antiguos se descartan)
+MAX_MESSAGES = 40
+
+# Cada cuánto (s) se borran del respaldo las sesiones caducadas
+PURGE_INTERVAL = 60.0
+
+
+class ChatSession:
+    """
+    Estado de una conversación.
+    """
+    __slots__ = ("session_id", "messages", "candidate_ids", "catalog_text", "updated_at")
+
+    def __init__(
+        self,
+        session_id: str,
+        messages: Optional[List[Tuple[str, str]]] = None,
+        candidate_ids: Optional[List[int]] = None,
+        catalog_text: Optional[str] = None,
+        updated_at: Optional[float] = None,
+    ):
+        self.session_id = session_id
+        self.messages = messages or []
+        self.candidate_ids = candidate_ids or []
+        self.catalog_text = catalog_text
+        self.updated_at = updated_at or time.time()
+
+    def add_message(self, role: str, content: str) -> None:
+        self.messages.append((role, content))
+        if len(self.messages) > MAX_MESSAGES:
+            del self.messages[: len(self.messages) - MAX_MESSAGES]
+
+    def to_json(self) -> str:
+        return json.dumps(
+            {
+                "messages": self.messages,
+                "candidate_ids": self.candidate_ids,
+                "catalog_text": self.catalog_text,
+            },
+            ensure_ascii=False,
+        )
+
+    @classmethod
+    def from_json(cls, session_id: str, raw: str, updated_at: float) -> "ChatSession":
+        data = json.loads(raw)
+        return cls(
+            session_id,
+            messages=[tuple(m) for m in data.get("messages", [])],
+            candidate_ids=data.get("candidate_ids", []),
+            catalog_text=data.get("catalog_text"),
+            updated_at=updated_at,
+        )
+
+
+class SQLiteSessionBackend:
+    """
+    Respaldo de sesiones en la BD de la app (tabla chat_sessions).
+    Debe usarse dentro del contexto de la app.
+    """
+
+    def load(self, session_id: str) -> Optional[ChatSession]:
+        record = db.session.get(ChatSessionRecord, session_id)
+        if record is None:
+            return None
+        return ChatSession.from_json(record.session_id, record.data, record.updated_at)
+
+    def save(self, session: ChatSession) -> None:
+        db.session.merge(
+            ChatSessionRecord(
+                session_id=session.session_id,
+                data=session.to_json(),
+                updated_at=session.updated_at,
+            )
+        )
+        db.session.commit()
+
+    def purge_expired(self, older_than: float) -> int:
+        """
+        Borra las sesiones sin actividad desde antes de `older_than` (epoch).
+        Devuelve cuántas se han borrado.
+        """
+        result = db.session.execute(
+            db.delete(ChatSessionRecord).where(ChatSessionRecord.updated_at < older_than)
+        )
+        db.session.commit()
+        return result.rowcount
+
+
+class SessionStore:
+    """
+    Almacén de sesiones en memoria con LRU + TTL y respaldo opcional.
+    """
+
+    def __init__(
+        self,
+        max_sessions: int = 10000,
+        ttl: float = 1800.0,
+        backend: Optional[SQLiteSessionBackend] = None,
+        purge_interval: float = PURGE_INTERVAL,
+    ):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.backend = backend
+        self.purge_interval = purge_interval
+        self._last_purge = time.monotonic()
+        self._sessions: "OrderedDict[str, ChatSession]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evicted = 0
+        self._expired = 0
+        self._purged = 0
+
+    def create(self) -> ChatSession:
+        return ChatSession(secrets.token_urlsafe(16))
+
+    def get(self, session_id: str) -> Optional[ChatSession]:
+        """
+        Devuelve la sesión (o None si no existe o ha caducado).
+        """
+        now = time.time()
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None:
+                if now - session.updated_at > self.ttl:
+                    del self._sessions[session_id]
+                    self._expired += 1
+                    session = None
+                else:
+                    self._sessions.move_to_end(session_id)
+                    self._hits += 1
+                    return session
+
+        if self.backend is not None:
+            session = self.backend.load(session_id)
+            if session is not None and now - session.updated_at <= self.ttl:
+                self._remember(session)
+                with self._lock:
+                    self._hits += 1
+                return session
+
+        with self._lock:
+            self._misses += 1
+        return None
+
+    def put(self, session: ChatSession) -> None:
+        """
+        Guarda (o actualiza) la sesión tras un turno.
+        """
+        session.updated_at = time.time()
+        self._remember(session)
+        if self.backend is not None:
+            self.backend.save(session)
+            if time.monotonic() - self._last_purge >= self.purge_interval:
+                self.purge_expired()
+
+    def purge_expired(self) -> int:
+        """
+        Olvida las sesiones caducadas en memoria y las borra del respaldo.
+        Devuelve cuántas se han borrado del respaldo.
+        """
+        now = time.time()
+        with self._lock:
+            self._last_purge = time.monotonic()
+            expired = [
+                sid for sid, s in self._sessions.items() if now - s.updated_at > self.ttl
+            ]
+            for sid in expired:
+                del self._sessions[sid]
+            self._expired += len(expired)
+
+        purged = 0
+        if self.backend is not None:
+            purged = self.backend.purge_expired(now - self.ttl)
+            with self._lock:
+                self._purged += purged
+        return purged
+
+    def _remember(self, session: ChatSession) -> None:
+        with self._lock:
+            self._sessions[session.session_id] = session
+            self._sessions.move_to_end(session.session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                self._evicted += 1
+
+    def snapshot(self) -> dict:
+        """
+        Métricas actuales (para /api/admin/metrics).
+        """
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "max_sessions": self.max_sessions,
+                "ttl_seconds": self.ttl,
+                "backend": "sqlite" if self.backend is not None else "memory",
+                "hits": self._hits,
+                "misses": self._misses,
+                "evicted": self._evicted,
+                "expired": self._expired,
+                "purged": self._purged,
+            }
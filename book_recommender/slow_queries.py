@@ -0,0 +1,202 @@
+# slow_queries.py
+"""
+Registro de consultas SQL lentas.
+
+SlowQueryLog se engancha a los eventos before/after_cursor_execute del
+engine de SQLAlchemy y mide cada sentencia. Las que superan el umbral se:
+  - imprimen en el log con su duración,
+  - guardan en un buffer circular acotado (las N más recientes),
+  - acumulan por sentencia (número de veces, tiempo total y máximo) para
+    poder ver qué consultas hacen más daño. Con más de MAX_STATEMENTS
+    sentencias distintas se descarta la que menos tiempo acumula, así que
+    las costosas se conservan aunque lleven tiempo sin repetirse.
+
+En SQLite, la primera vez que una sentencia es lenta se ejecuta también
+`EXPLAIN QUERY PLAN` sobre la misma conexión, y se marca si el plan
+recorre una tabla entera ("SCAN books" sin índice).
+
+Los parámetros de las sentencias pueden llevar datos de usuarios (por
+ejemplo el texto de las sesiones de chat), así que por defecto se guardan
+y se imprimen ocultos ("?"); solo con keep_params=True se conserva su valor.
+"""
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Umbral por defecto (ms) a partir del cual una consulta se considera lenta
+DEFAULT_THRESHOLD_MS = 100.0
+
+# Consultas lentas recientes que se conservan
+DEFAULT_CAPACITY = 200
+
+# Sentencias distintas de las que se guardan estadísticas agregadas
+MAX_STATEMENTS = 500
+
+# Longitud máxima de cada parámetro al guardarlo
+_MAX_PARAM_LEN = 200
+
+_EXPLAINABLE = ("SELECT", "UPDATE", "DELETE", "INSERT", "WITH")
+
+
+def _is_full_scan(plan: List[str]) -> bool:
+    """
+    True si algún paso del plan recorre una tabla entera sin índice.
+    """
+    return any(step.startswith("SCAN ") and " USING " not in step for step in plan)
+
+
+# Valor que sustituye a cada parámetro oculto
+REDACTED = "?"
+
+
+def _format_parameters(parameters, keep: bool) -> list:
+    if parameters is None:
+        return []
+    if isinstance(parameters, dict):
+        parameters = list(parameters.values())
+    if not keep:
+        return [REDACTED] * len(parameters)
+    return [repr(p)[:_MAX_PARAM_LEN] for p in parameters]
+
+
+class SlowQueryLog:
+    """
+    Medición de sentencias SQL con buffer de consultas lentas.
+    """
+
+    def __init__(
+        self,
+        threshold_ms: float = DEFAULT_THRESHOLD_MS,
+        capacity: int = DEFAULT_CAPACITY,
+        explain: bool = True,
+        keep_params: bool = False,
+    ):
+        self.threshold_ms = threshold_ms
+        self.explain = explain
+        self.keep_params = keep_params
+        self._recent: deque = deque(maxlen=capacity)
+        self._by_statement: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self._executed = 0
+        self._slow = 0
+
+    def install(self, engine: Engine) -> None:
+        """
+        Registra los eventos en `engine`.
+        """
+        event.listen(engine, "before_cursor_execute", self._before_execute)
+        event.listen(engine, "after_cursor_execute", self._after_execute)
+
+    def _before_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("slow_query_start", []).append(time.perf_counter())
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed_ms = (time.perf_counter() - conn.info["slow_query_start"].pop()) * 1000
+        with self._lock:
+            self._executed += 1
+        if elapsed_ms < self.threshold_ms:
+            return
+
+        with self._lock:
+            self._slow += 1
+            stats = self._by_statement.get(statement)
+            plan = stats["plan"] if stats is not None else None
+
+        if plan is None and self.explain and not executemany:
+            plan = self._explain(conn, cursor, statement, parameters)
+
+        params = [] if executemany else _format_parameters(parameters, self.keep_params)
+        record = {
+            "statement": statement,
+            "parameters": params,
+            "duration_ms": round(elapsed_ms, 3),
+            "plan": plan,
+            "full_scan": _is_full_scan(plan) if plan else None,
+            "at": time.time(),
+        }
+        print(
+            f"Consulta lenta ({elapsed_ms:.1f} ms): {' '.join(statement.split())} "
+            f"params={params}" + (f" plan={plan}" if plan else ""),
+            flush=True,
+        )
+
+        with self._lock:
+            self._recent.append(record)
+            self._accumulate(statement, elapsed_ms, params, plan)
+
+    def _accumulate(self, statement: str, elapsed_ms: float, params: list, plan) -> None:
+        """
+        Suma una ejecución lenta a las estadísticas de su sentencia (con el
+        lock tomado). Si no hay hueco para una sentencia nueva, se descarta
+        la que menos tiempo total acumula.
+        """
+        stats = self._by_statement.get(statement)
+        if stats is None:
+            if len(self._by_statement) >= MAX_STATEMENTS:
+                cheapest = min(self._by_statement.values(), key=lambda s: s["total_ms"])
+                del self._by_statement[cheapest["statement"]]
+            stats = {"statement": statement, "count": 0, "total_ms": 0.0, "max_ms": 0.0, "plan": plan}
+            self._by_statement[statement] = stats
+        stats["count"] += 1
+        stats["total_ms"] += elapsed_ms
+        if elapsed_ms >= stats["max_ms"]:
+            stats["max_ms"] = elapsed_ms
+            stats["parameters"] = params
+        if stats["plan"] is None:
+            stats["plan"] = plan
+
+    def _explain(self, conn, cursor, statement, parameters) -> Optional[List[str]]:
+        """
+        Plan de ejecución de la sentencia (solo SQLite), o None.
+        """
+        if conn.dialect.name != "sqlite":
+            return None
+        if not statement.lstrip().upper().startswith(_EXPLAINABLE):
+            return None
+        try:
+            # Cursor aparte sobre la misma conexión DBAPI: no toca los
+            # resultados pendientes de la sentencia original
+            explain_cursor = cursor.connection.cursor()
+            try:
+                explain_cursor.execute("EXPLAIN QUERY PLAN " + statement, parameters or ())
+                return [row[-1] for row in explain_cursor.fetchall()]
+            finally:
+                explain_cursor.close()
+        except Exception as e:
+            print("No se ha podido obtener el plan de la consulta:", e, flush=True)
+            return None
+
+    def snapshot(self, limit: int = 20, order_by: str = "total") -> dict:
+        """
+        Resumen para /api/admin/slow-queries: las `limit` sentencias que más
+        tiempo acumulan (o con peor caso si order_by="max") y las consultas
+        lentas más recientes.
+        """
+        key = "max_ms" if order_by == "max" else "total_ms"
+        with self._lock:
+            worst = sorted(self._by_statement.values(), key=lambda s: s[key], reverse=True)[:limit]
+            statements = [
+                {
+                    "statement": s["statement"],
+                    "count": s["count"],
+                    "total_ms": round(s["total_ms"], 3),
+                    "avg_ms": round(s["total_ms"] / s["count"], 3),
+                    "max_ms": round(s["max_ms"], 3),
+                    "parameters": s.get("parameters", []),
+                    "plan": s["plan"],
+                    "full_scan": _is_full_scan(s["plan"]) if s["plan"] else None,
+                }
+                for s in worst
+            ]
+            recent = list(self._recent)[-limit:][::-1]
+            return {
+                "threshold_ms": self.threshold_ms,
+                "executed": self._executed,
+                "slow": self._slow,
+                "statements": statements,
+                "recent": recent,
+            }
@@ -0,0 +1,248 @@
+# suggest.py
+"""
+Autocompletado (typeahead) de títulos, autores y géneros.
+
+En lugar de hacer un `LIKE 'x%'` contra la BD en cada pulsación, se
+mantiene en memoria un índice de prefijos:
+
+  - Cada título/autor/género genera una clave por cada palabra en la que
+    empieza ("señor de los anillos", "de los anillos", "anillos", ...),
+    normalizada sin tildes y en minúsculas.
+  - Las claves están en una lista ordenada, así que las que empiezan por un
+    prefijo forman un rango contiguo que se localiza con búsqueda binaria.
+  - Para todo prefijo que abarque más de SCAN_LIMIT claves, sea cual sea
+    su longitud ("s", "sombra", "la sombra del"), el top-k por popularidad
+    se precalcula al construir el índice, así que responder es una búsqueda
+    en un diccionario. El resto de prefijos recorre como mucho SCAN_LIMIT
+    claves: unos microsegundos en cualquier caso.
+
+El índice se reconstruye cuando cambia la huella del catálogo (la versión
+o las escrituras hechas por fuera del feed; ver catalog.py). Con 100k
+títulos eso lleva unos segundos, así que se hace en un hilo en segundo
+plano mientras las peticiones siguen usando el índice anterior; solo la
+primera construcción (cuando aún no hay índice) es síncrona. Con
+SUGGEST_BACKGROUND_REBUILD=False todas lo son (por ejemplo en los tests,
+donde todas las apps comparten una única conexión a la BD).
+"""
+import heapq
+import threading
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from flask import Flask, current_app
+
+from catalog import CatalogFingerprint, cached_catalog_fingerprint
+from database import db
+from models import Book
+from text_utils import fold_text
+
+# Número máximo de sugerencias por prefijo
+MAX_SUGGESTIONS = 10
+
+# Los prefijos que abarcan más claves que esto tienen su top-k precalculado
+SCAN_LIMIT = 64
+
+# Entrada del índice: (texto a mostrar, tipo, peso por popularidad)
+Entry = Tuple[str, str, int]
+
+
+class SuggestIndex:
+    """
+    Índice de prefijos inmutable: se construye una vez y se consulta desde
+    varios hilos sin bloqueos.
+    """
+
+    def __init__(self, entries: Iterable[Entry], fingerprint: Optional[CatalogFingerprint] = None):
+        self.fingerprint = fingerprint
+        self.entries: List[Entry] = list(entries)
+
+        pairs = []
+        for entry_id, (text, _, _) in enumerate(self.entries):
+            words = fold_text(text).split()
+            for start in range(len(words)):
+                pairs.append((" ".join(words[start:]), entry_id))
+        pairs.sort()
+        self._keys = [key for key, _ in pairs]
+        self._entry_ids = [entry_id for _, entry_id in pairs]
+
+        # Top-k precalculado, en total y por tipo, de los prefijos con más
+        # de SCAN_LIMIT claves
+        self._top: Dict[Tuple[Optional[str], str], List[int]] = {}
+        self._precompute()
+
+    def _precompute(self) -> None:
+        """
+        Recorre el árbol de prefijos solo por las ramas grandes. El top de
+        cada rama sale de los tops de sus hijos grandes más las entradas de
+        los pequeños, así que cada clave se mira una sola vez.
+        """
+        kinds = sorted({kind for _, kind, _ in self.entries})
+        self._top_of_range("", 0, len(self._keys), kinds)
+
+    def _top_of_range(self, prefix: str, lo: int, hi: int, kinds: List[str]) -> set:
+        """
+        Candidatos del rango de claves [lo, hi) (las que empiezan por
+        `prefix`): todas sus entradas si es pequeño o, si no, la unión de
+        sus tops (total y por tipo), que quedan guardados en _top.
+        """
+        if hi - lo <= SCAN_LIMIT:
+            return set(self._entry_ids[lo:hi])
+
+        keys = self._keys
+        length = len(prefix) + 1
+        candidates = set()
+        i = lo
+        while i < hi:
+            if len(keys[i]) < length:  # la propia clave `prefix`
+                candidates.add(self._entry_ids[i])
+                i += 1
+                continue
+            child = keys[i][:length]
+            j = bisect_left(keys, child + "\uffff", i, hi)
+            candidates |= self._top_of_range(child, i, j, kinds)
+            i = j
+
+        top = self._rank(candidates)
+        self._top[(None, prefix)] = top
+        best = set(top)
+        for kind in kinds:
+            kind_top = self._rank(e for e in candidates if self.entries[e][1] == kind)
+            self._top[(kind, prefix)] = kind_top
+            best.update(kind_top)
+        return best
+
+    def _rank(self, entry_ids: Iterable[int]) -> List[int]:
+        return heapq.nlargest(
+            MAX_SUGGESTIONS,
+            entry_ids,
+            key=lambda i: (self.entries[i][2], -i),
+        )
+
+    def suggest(
+        self, prefix: str, limit: int = MAX_SUGGESTIONS, kind: Optional[str] = None
+    ) -> List[dict]:
+        """
+        Sugerencias cuyo texto (o alguna de sus palabras) empieza por `prefix`,
+        de más a menos popular. `kind` limita a 'title', 'author' o 'genre'.
+        """
+        key = " ".join(fold_text(prefix).split())
+        if not key:
+            return []
+
+        ids = self._top.get((kind, key))
+        if ids is None:
+            lo = bisect_left(self._keys, key)
+            hi = bisect_left(self._keys, key + "\uffff", lo)
+            if hi - lo > SCAN_LIMIT:  # solo con un `kind` que no existe
+                return []
+            matches = set(self._entry_ids[lo:hi])
+            if kind is not None:
+                matches = {i for i in matches if self.entries[i][1] == kind}
+            ids = self._rank(matches)
+
+        return [
+            {"text": self.entries[i][0], "kind": self.entries[i][1]}
+            for i in ids[:limit]
+        ]
+
+
+def build_suggest_index(fingerprint: Optional[CatalogFingerprint] = None) -> SuggestIndex:
+    """
+    Construye el índice a partir de la tabla books.
+
+    Solo se leen las columnas necesarias (sin instanciar objetos Book). Los
+    autores y géneros pesan la suma de valoraciones de sus libros; si un
+    mismo autor aparece escrito de varias formas ("García" / "Garcia") se
+    muestra la variante más popular.
+    """
+    titles: Dict[str, Entry] = {}
+    grouped: Dict[Tuple[str, str], Dict[str, int]] = {}
+
+    rows = db.session.execute(
+        db.select(Book.title, Book.author, Book.genre, Book.n_ratings)
+    )
+    for title, author, genre, n_ratings in rows:
+        weight = n_ratings or 0
+        folded = fold_text(title)
+        if folded not in titles or titles[folded][2] < weight:
+            titles[folded] = (title, "title", weight)
+        for kind, text in (("author", author), ("genre", genre)):
+            variants = grouped.setdefault((kind, fold_text(text)), {})
+            variants[text] = variants.get(text, 0) + weight
+
+    entries = list(titles.values())
+    for (kind, _), variants in grouped.items():
+        display = max(variants, key=variants.get)
+        entries.append((display, kind, sum(variants.values())))
+
+    return SuggestIndex(entries, fingerprint=fingerprint)
+
+
+class SuggestIndexHolder:
+    """
+    Índice de autocompletado de una app (en app.extensions["suggest"]) y
+    su reconstrucción en segundo plano.
+    """
+
+    def __init__(self):
+        self.index: Optional[SuggestIndex] = None
+        self._lock = threading.Lock()
+        self._rebuild: Optional[threading.Thread] = None
+
+    def get(self, fingerprint: CatalogFingerprint) -> SuggestIndex:
+        """
+        Índice para la huella `fingerprint` del catálogo. Si el actual es de
+        otra huella se devuelve igualmente y se lanza la reconstrucción.
+        """
+        index = self.index
+        if index is None:
+            with self._lock:
+                if self.index is None:
+                    self.index = build_suggest_index(fingerprint)
+                return self.index
+
+        if index.fingerprint != fingerprint:
+            if current_app.config.get("SUGGEST_BACKGROUND_REBUILD", True):
+                self._start_rebuild(current_app._get_current_object(), fingerprint)
+            else:
+                with self._lock:
+                    if self.index.fingerprint != fingerprint:
+                        self.index = build_suggest_index(fingerprint)
+                    return self.index
+        return index
+
+    def _start_rebuild(self, app: Flask, fingerprint: CatalogFingerprint) -> None:
+        with self._lock:
+            if self._rebuild is not None and self._rebuild.is_alive():
+                return
+            self._rebuild = threading.Thread(
+                target=self._run_rebuild, args=(app, fingerprint), name="suggest-rebuild", daemon=True
+            )
+            self._rebuild.start()
+
+    def _run_rebuild(self, app: Flask, fingerprint: CatalogFingerprint) -> None:
+        try:
+            with app.app_context():
+                index = build_suggest_index(fingerprint)
+            self.index = index
+        except Exception as e:
+            print("Error reconstruyendo el índice de autocompletado:", e, flush=True)
+
+    def wait(self, timeout: Optional[float] = None) -> None:
+        """
+        Espera a que termine la reconstrucción en curso (si la hay).
+        """
+        rebuild = self._rebuild
+        if rebuild is not None:
+            rebuild.join(timeout)
+
+
+def get_suggest_index() -> SuggestIndex:
+    """
+    Índice de la app actual. Si la huella del catálogo cambió, se sirve el
+    anterior hasta que termine de reconstruirse en segundo plano.
+    """
+    refresh = current_app.config.get("SUGGEST_REFRESH_SECONDS", 1.0)
+    fingerprint = cached_catalog_fingerprint(max_age=refresh)
+    holder: SuggestIndexHolder = current_app.extensions.setdefault("suggest", SuggestIndexHolder())
+    return holder.get(fingerprint)
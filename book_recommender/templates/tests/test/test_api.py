@@ -1,27 +1,11 @@
 # tests/test_api.py
 import json
 
-from app import create_app
-from database import db
-from models import Book
 
-
-def setup_app():
-    """
-    Crea la app usando create_app() y se asegura de que la BD está lista.
-    """
-    app = create_app()
-    with app.app_context():
-        db.create_all()
-    return app
-
-
-def test_health_endpoint():
+def test_health_endpoint(client):
     """
     El endpoint /health debe devolver status=ok.
     """
-    app = setup_app()
-    client = app.test_client()
 
     response = client.get("/health")
     assert response.status_code == 200
@@ -30,13 +14,11 @@ def test_health_endpoint():
     assert data["status"] == "ok"
 
 
-def test_api_recommend_returns_json():
+def test_api_recommend_returns_json(client):
     """
     Llamada correcta a /api/recommend debe devolver 200 y un JSON
     con la clave 'recommendations'.
     """
-    app = setup_app()
-    client = app.test_client()
 
     payload = {
         "favorite_genre": "Fantasia",
@@ -57,13 +39,11 @@ def test_api_recommend_returns_json():
     assert isinstance(data["recommendations"], list)
 
 
-def test_api_recommend_invalid_input():
+def test_api_recommend_invalid_input(client):
     """
     Si enviamos un tipo de dato incorrecto (por ejemplo limit como string),
     la API debe responder con 400 y un mensaje de error.
     """
-    app = setup_app()
-    client = app.test_client()
 
     payload = {
         "favorite_genre": "Fantasia",
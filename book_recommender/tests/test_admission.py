@@ -0,0 +1,62 @@
+# tests/test_admission.py
+import json
+
+import pytest
+
+from admission import ADMITTED, DEADLINE, QUEUE_FULL, AdmissionController
+from database import db
+from models import Book
+
+
+def test_queue_full_is_shed_immediately():
+    """
+    Sin huecos ni sitio en la cola, la petición se descarta sin esperar.
+    """
+    controller = AdmissionController(max_concurrent=1, max_queue=0, queue_timeout=5)
+    assert controller.acquire() == ADMITTED
+    assert controller.acquire() == QUEUE_FULL
+
+    controller.release(latency=0.1)
+    assert controller.acquire() == ADMITTED
+
+    stats = controller.snapshot()
+    assert stats["admitted"] == 2
+    assert stats["shed_queue_full"] == 1
+
+
+def test_waiting_past_budget_is_shed_as_deadline():
+    """
+    Si no se libera un hueco dentro del tiempo de espera, se descarta por plazo.
+    """
+    controller = AdmissionController(max_concurrent=1, max_queue=4, queue_timeout=0.05)
+    assert controller.acquire() == ADMITTED
+    assert controller.acquire() == DEADLINE
+    assert controller.snapshot()["waiting"] == 0
+
+
+@pytest.mark.parametrize("app_config", [{"CHAT_MAX_CONCURRENT": 1, "CHAT_MAX_QUEUE": 0}])
+def test_overloaded_chat_degrades_to_popular_books(app, client, admin_headers):
+    """
+    Con el chatbot saturado, /api/chat responde al momento con libros
+    populares (sin llamar al LLM) y lo indica en X-Chat-Degraded.
+    """
+    db.session.add(Book(title="Dune", author="Frank Herbert", genre="Ciencia ficcion", rating=4.6))
+    db.session.commit()
+
+    # Ocupamos el único hueco disponible
+    assert app.extensions["chat_admission"].acquire() == ADMITTED
+
+    response = client.post(
+        "/api/chat",
+        data=json.dumps({"messages": [{"role": "user", "content": "Hola"}]}),
+        content_type="application/json",
+    )
+
+    assert response.status_code == 200
+    assert response.headers["X-Chat-Degraded"] == QUEUE_FULL
+    assert [b["title"] for b in response.get_json()["recommendations"]] == ["Dune"]
+
+    # Las métricas solo se sirven con el token de administración
+    assert client.get("/api/admin/metrics").status_code == 401
+    metrics = client.get("/api/admin/metrics", headers=admin_headers).get_json()
+    assert metrics["chat_admission"]["shed_queue_full"] == 1
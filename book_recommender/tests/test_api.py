@@ -1,27 +1,16 @@
 # tests/test_api.py
 import json
 
-from app import create_app
+import pytest
+
 from database import db
 from models import Book
 
 
-def setup_app():
-    """
-    Crea la app usando create_app() y se asegura de que la BD está lista.
-    """
-    app = create_app()
-    with app.app_context():
-        db.create_all()
-    return app
-
-
-def test_health_endpoint():
+def test_health_endpoint(client):
     """
     El endpoint /health debe devolver status=ok.
     """
-    app = setup_app()
-    client = app.test_client()
 
     response = client.get("/health")
     assert response.status_code == 200
@@ -30,13 +19,12 @@ def test_health_endpoint():
     assert data["status"] == "ok"
 
 
-def test_api_recommend_returns_json():
+def test_api_recommend_returns_json(client, catalog):
     """
     Llamada correcta a /api/recommend debe devolver 200 y un JSON
     con la clave 'recommendations'.
     """
-    app = setup_app()
-    client = app.test_client()
+    catalog(50)
 
     payload = {
         "favorite_genre": "Fantasia",
@@ -57,13 +45,11 @@ def test_api_recommend_returns_json():
     assert isinstance(data["recommendations"], list)
 
 
-def test_api_recommend_invalid_input():
+def test_api_recommend_invalid_input(client):
     """
     Si enviamos un tipo de dato incorrecto (por ejemplo limit como string),
     la API debe responder con 400 y un mensaje de error.
     """
-    app = setup_app()
-    client = app.test_client()
 
     payload = {
         "favorite_genre": "Fantasia",
@@ -81,3 +67,80 @@ def test_api_recommend_invalid_input():
 
     data = response.get_json()
     assert "error" in data
+
+
+def test_api_chat_disabled_in_recommend_only_mode(make_app):
+    """
+    En modo "solo recomendador" /api/chat responde 503 sin cargar el LLM.
+    """
+    client = make_app(RECOMMEND_ONLY=True).test_client()
+
+    response = client.post(
+        "/api/chat",
+        data=json.dumps({"messages": [{"role": "user", "content": "Hola"}]}),
+        content_type="application/json",
+    )
+
+    assert response.status_code == 503
+    assert "error" in response.get_json()
+
+
+def test_get_recommend_supports_etag_and_304(client, monkeypatch):
+    """
+    GET /api/recommend devuelve ETag; repetir la petición con If-None-Match
+    da 304 sin volver a ejecutar el recomendador.
+    """
+
+    response = client.get("/api/recommend?favorite_genre=Fantasia&limit=3")
+    assert response.status_code == 200
+    assert "recommendations" in response.get_json()
+    etag = response.headers["ETag"]
+    assert "max-age" in response.headers["Cache-Control"]
+
+    def fail(params):
+        raise AssertionError("recommend_books no debería ejecutarse en un 304")
+
+    monkeypatch.setattr("app.recommend_books", fail)
+    cached = client.get(
+        "/api/recommend?limit=3&favorite_genre=Fantasia%20",
+        headers={"If-None-Match": etag},
+    )
+    assert cached.status_code == 304
+    assert cached.data == b""
+
+
+@pytest.mark.parametrize("app_config", [{"RECOMMEND_CATALOG_REFRESH_SECONDS": 0}])
+def test_get_recommend_etag_changes_when_books_are_written_behind_the_app(client):
+    """
+    Escribir en books sin pasar por /api/books/bulk (la versión del catálogo
+    no cambia), aunque sea un UPDATE de una fila, también invalida el ETag:
+    no hay 304 con datos viejos.
+    """
+    db.session.add(Book(title="Sendas de otoño", author="A", genre="Poesía", rating=3.0))
+    db.session.commit()
+    url = "/api/recommend?favorite_genre=Poes&min_rating=4.5"
+    first = client.get(url)
+    assert first.get_json()["recommendations"] == []
+
+    db.session.execute(db.update(Book).values(rating=4.8))
+    db.session.commit()
+    fresh = client.get(url, headers={"If-None-Match": first.headers["ETag"]})
+    assert fresh.status_code == 200
+    assert [b["title"] for b in fresh.get_json()["recommendations"]] == ["Sendas de otoño"]
+
+
+def test_get_recommend_invalid_query_string(client):
+    """
+    Parámetros inválidos en la query string devuelven 400.
+    """
+
+    response = client.get("/api/recommend?limit=no_es_un_numero")
+    assert response.status_code == 400
+
+
+def test_recommendations_page_clamps_out_of_range_values(client):
+    """
+    El formulario HTML recorta los valores fuera de rango en vez de dar 500.
+    """
+    for query in ("limit=100", "limit=0", "min_rating=9", "min_rating=-1", "min_rating=nan"):
+        assert client.get(f"/recommendations?{query}").status_code == 200
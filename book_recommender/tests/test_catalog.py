@@ -0,0 +1,93 @@
+# tests/test_catalog.py
+import json
+
+import pytest
+
+from database import db
+from models import Book
+
+
+@pytest.fixture(autouse=True)
+def dune(app):
+    db.session.add(
+        Book(id=1, title="Dune", author="Frank Herbert", genre="Ciencia ficcion", rating=4.6)
+    )
+    db.session.commit()
+
+
+def post_bulk(client, payload, headers):
+    return client.post(
+        "/api/books/bulk",
+        data=json.dumps(payload),
+        content_type="application/json",
+        headers=headers,
+    )
+
+
+def test_bulk_upsert_and_delete_bump_version(client, admin_headers):
+    """
+    Un lote actualiza, inserta y borra en una transacción y crea una versión nueva.
+    """
+    response = post_bulk(
+        client,
+        {
+            "upserts": [
+                {"id": 1, "title": "Dune", "author": "Frank Herbert",
+                 "genre": "Ciencia ficcion", "rating": 4.8},
+                {"title": "1984", "author": "George Orwell",
+                 "genre": "Distopia", "rating": 4.5},
+            ],
+        },
+        admin_headers,
+    )
+    assert response.status_code == 200
+    first = response.get_json()
+    assert first["version"] == 1
+    assert len(first["upserted_ids"]) == 2
+
+    response = post_bulk(client, {"deletes": [1, 999]}, admin_headers)
+    second = response.get_json()
+    assert second["version"] == 2
+    assert second["deleted_ids"] == [1]  # 999 no existía
+
+    assert db.session.get(Book, 1) is None
+    assert Book.query.count() == 1
+
+    feed = client.get("/api/catalog/changes?since=1").get_json()
+    assert feed["version"] == 2
+    assert feed["changes"] == [{"version": 2, "book_id": 1, "op": "delete"}]
+
+
+def test_bulk_invalid_batch_changes_nothing(client, admin_headers):
+    """
+    Un lote inválido devuelve 400 y no modifica el catálogo.
+    """
+    response = post_bulk(
+        client,
+        {
+            "upserts": [{"id": 1, "title": "Dune", "author": "Frank Herbert",
+                         "genre": "Ciencia ficcion", "rating": 4.8}],
+            "deletes": [1],
+        },
+        admin_headers,
+    )
+    assert response.status_code == 400
+
+    feed = client.get("/api/catalog/changes").get_json()
+    assert feed == {"version": 0, "changes": []}
+
+
+def test_bulk_requires_admin_token(make_app, client, admin_headers):
+    """
+    Sin token configurado la ruta no existe; con token, hay que enviarlo.
+    """
+    payload = {"deletes": [1]}
+
+    disabled = make_app(ADMIN_TOKEN=None).test_client()
+    assert post_bulk(disabled, payload, admin_headers).status_code == 404
+
+    assert post_bulk(client, payload, headers={}).status_code == 401
+    assert post_bulk(client, payload, headers={"X-Admin-Token": "otro"}).status_code == 401
+    assert client.get("/api/catalog/changes").get_json()["version"] == 0
+
+    assert post_bulk(client, payload, admin_headers).status_code == 200
@@ -0,0 +1,58 @@
+# tests/test_diversity.py
+from types import SimpleNamespace
+
+import numpy as np
+
+from diversity import description_vectors, diversify_books
+
+
+def make_book(book_id, author, genre, rating, description=""):
+    return SimpleNamespace(
+        id=book_id,
+        author=author,
+        genre=genre,
+        rating=rating,
+        description=description,
+    )
+
+
+def test_zero_diversity_keeps_order():
+    """
+    Con diversity=0 el re-ranking no cambia el orden original.
+    """
+    books = [make_book(i, "A", "Fantasia", 5 - i * 0.1) for i in range(10)]
+    result = diversify_books(books, 5, 0.0)
+    assert [b.id for b in result] == [0, 1, 2, 3, 4]
+
+
+def test_diversity_breaks_author_dominance():
+    """
+    Si los mejores libros son todos del mismo autor, con diversidad alta
+    deben aparecer otros autores en la lista.
+    """
+    books = [make_book(i, "Tolkien", "Fantasia", 4.9 - i * 0.01) for i in range(8)]
+    books += [
+        make_book(100, "Herbert", "Ciencia ficcion", 4.5),
+        make_book(101, "Orwell", "Distopia", 4.4),
+    ]
+
+    result = diversify_books(books, 3, 0.7)
+
+    assert len(result) == 3
+    assert result[0].id == 0  # el más relevante sigue primero
+    assert len({b.author for b in result}) == 3
+
+
+def test_description_vectors_are_cached_by_text():
+    """
+    Los vectores se calculan una vez por descripción y un libro editado
+    (otra descripción) recibe su propio vector.
+    """
+    first = description_vectors(["Una guerra entre dragones", "Un misterio en Venecia"])
+    again = description_vectors(["Un misterio en Venecia", "Una guerra entre dragones"])
+    np.testing.assert_array_equal(first[::-1], again)
+    np.testing.assert_allclose(np.linalg.norm(first, axis=1), 1.0, rtol=1e-6)
+
+    edited = description_vectors(["Una guerra entre elfos"])
+    assert not np.allclose(edited[0], first[0])
+    assert not np.any(description_vectors([""]))
@@ -0,0 +1,81 @@
+# tests/test_export.py
+import csv
+import io
+import json
+
+import pytest
+
+import export
+from catalog import apply_bulk_changes
+from database import db
+from schemas import BulkBooksRequest
+
+
+@pytest.fixture
+def app_config():
+    return {"EXPORT_BATCH_SIZE": 10}
+
+
+@pytest.fixture(autouse=True)
+def books(catalog):
+    return catalog(25, seed=9)
+
+
+def test_export_ndjson_streams_all_books_in_batches(client, books, monkeypatch):
+    batch_sizes = []
+    real_iter = export.iter_book_batches
+
+    def recording_iter(filters, batch_size):
+        for rows in real_iter(filters, batch_size):
+            batch_sizes.append(len(rows))
+            yield rows
+
+    monkeypatch.setattr("app.iter_book_batches", recording_iter)
+    resp = client.get("/api/books/export")
+    assert resp.status_code == 200
+    assert resp.is_streamed
+    assert resp.mimetype == "application/x-ndjson"
+
+    rows = [json.loads(line) for line in resp.data.decode("utf-8").splitlines()]
+    assert [r["id"] for r in rows] == books
+    assert set(rows[0]) == set(export.EXPORT_COLUMNS)
+    assert batch_sizes == [10, 10, 5]
+
+
+def test_export_csv_with_filters(client):
+    resp = client.get("/api/books/export?format=csv&genre=thriller&min_rating=3.5")
+    assert resp.status_code == 200
+    assert resp.mimetype == "text/csv"
+
+    rows = list(csv.DictReader(io.StringIO(resp.data.decode("utf-8"))))
+    expected = db.session.scalars(
+        db.select(export.Book.id)
+        .where(export.Book.genre.ilike("%thriller%"), export.Book.rating >= 3.5)
+        .order_by(export.Book.id)
+    ).all()
+    assert [int(r["id"]) for r in rows] == expected
+
+
+def test_export_since_version_only_returns_changed_books(client):
+    version = int(client.get("/api/books/export").headers["X-Catalog-Version"])
+
+    apply_bulk_changes(
+        BulkBooksRequest(
+            upserts=[
+                {"id": 3, "title": "Nuevo título", "author": "A", "genre": "Ensayo", "rating": 4.0},
+                {"title": "Libro nuevo", "author": "B", "genre": "Ensayo", "rating": 3.0},
+            ],
+            deletes=[5],
+        )
+    )
+
+    resp = client.get(f"/api/books/export?since_version={version}")
+    rows = [json.loads(line) for line in resp.data.decode("utf-8").splitlines()]
+    assert [r["title"] for r in rows] == ["Nuevo título", "Libro nuevo"]
+    assert int(resp.headers["X-Catalog-Version"]) == version + 1
+
+
+def test_export_rejects_invalid_parameters(client):
+    assert client.get("/api/books/export?format=xml").status_code == 400
+    assert client.get("/api/books/export?min_rating=alto").status_code == 400
+    assert client.get("/api/books/export?since_version=ayer").status_code == 400
@@ -0,0 +1,129 @@
+# tests/test_facets.py
+import pytest
+
+import recommender
+from catalog import apply_bulk_changes, get_catalog_fingerprint
+from database import db
+from facets import FacetIndex, get_facet_index
+from models import Book
+from schemas import BulkBooksRequest, RecommendationRequest
+
+
+@pytest.fixture(autouse=True)
+def books(catalog):
+    return catalog(60, seed=11)
+
+
+def _fresh_snapshot():
+    index = FacetIndex()
+    index.rebuild(get_catalog_fingerprint())
+    return index.snapshot()
+
+
+def _bulk():
+    return BulkBooksRequest(
+        upserts=[
+            {"id": 1, "title": "Cambiado", "author": "A", "genre": "Poesía", "rating": 1.2},
+            {"title": "Nuevo", "author": "B", "genre": "Cómic", "rating": 5.0},
+        ],
+        deletes=[2, 3],
+    )
+
+
+def test_facets_endpoint_matches_group_by(client):
+    data = client.get("/api/facets").get_json()
+
+    counts = dict(
+        db.session.execute(db.select(Book.genre, db.func.count()).group_by(Book.genre)).all()
+    )
+    above_4 = db.session.scalar(db.select(db.func.count()).where(Book.rating >= 4.0))
+
+    assert data["total"] == 60
+    assert {g["genre"]: g["count"] for g in data["genres"]} == counts
+    assert sum(data["rating_histogram"]) == 60
+    assert data["at_least"][data["thresholds"].index(4.0)] == above_4
+
+
+def test_facets_are_updated_incrementally_on_catalog_writes(app):
+    index = get_facet_index()
+    event = apply_bulk_changes(_bulk())
+
+    # El suscriptor ya ha aplicado el lote, sin reconstruir
+    assert index.version == event.version
+    assert index.snapshot() == _fresh_snapshot()
+    assert any(g["genre"] == "Cómic" for g in index.snapshot()["genres"])
+
+
+def test_facets_catch_up_with_changes_from_other_processes(app):
+    index = get_facet_index()
+    # Simula un lote aplicado por otro proceso: este índice no se entera
+    app.extensions.pop("facets")
+    event = apply_bulk_changes(_bulk())
+    app.extensions["facets"] = index
+    assert index.version < event.version
+
+    assert get_facet_index().version == event.version
+    assert index.snapshot() == _fresh_snapshot()
+
+
+def test_recommend_short_circuits_when_facets_have_no_matches(app, monkeypatch):
+    index = get_facet_index()
+    best_thriller = db.session.scalar(
+        db.select(db.func.max(Book.rating)).where(Book.genre == "Thriller")
+    )
+
+    def no_sql(stmt):
+        raise AssertionError("no debería consultarse la BD")
+
+    with monkeypatch.context() as patched:
+        patched.setattr(recommender, "fetch_book_rows", no_sql)
+        assert recommender.recommend_books(RecommendationRequest(favorite_genre="Western")) == []
+        assert recommender.recommend_books(
+            RecommendationRequest(favorite_genre="thriller", min_rating=round(best_thriller + 0.1, 1))
+        ) == []
+
+        # Sin tildes ni mayúsculas también cuenta como posible coincidencia
+        assert index.may_have_matches("FANTASIA", 0)
+
+    # Con coincidencias posibles sí se consulta, y los comodines de LIKE nunca se atajan
+    assert recommender.recommend_books(RecommendationRequest(favorite_genre="THRILLER", min_rating=0))
+    assert recommender.recommend_books(RecommendationRequest(favorite_genre="Th_iller", min_rating=0))
+
+
+def test_recommend_sees_a_database_reseeded_behind_the_app(client):
+    """
+    Recrear la BD sin pasar por apply_bulk_changes (como seed_data.py
+    antes) deja la versión en 0: el índice lo detecta por la huella y no
+    ataja búsquedas que sí tienen resultados.
+    """
+    apply_bulk_changes(_bulk())
+    assert client.get("/api/recommend?favorite_genre=Western&min_rating=0").get_json() == {
+        "recommendations": []
+    }
+
+    # Vaciar todas las tablas equivale a recrearlas (sin DDL dentro de la transacción del test)
+    for table in reversed(db.metadata.sorted_tables):
+        db.session.execute(table.delete())
+    db.session.add(Book(title="Valor de ley", author="Charles Portis", genre="Western", rating=4.2))
+    db.session.commit()
+
+    data = client.get("/api/recommend?favorite_genre=Western&min_rating=0").get_json()
+    assert [b["title"] for b in data["recommendations"]] == ["Valor de ley"]
+    assert get_facet_index().snapshot()["total"] == 1
+
+
+def test_recommend_sees_a_row_updated_in_place(client):
+    """
+    Un UPDATE de una sola fila por fuera de apply_bulk_changes cambia la
+    huella (triggers de books): el "no hay resultados" deja de valer.
+    """
+    db.session.add(Book(title="Sendas de otoño", author="A", genre="Haiku", rating=3.0))
+    db.session.commit()
+    query = {"favorite_genre": "Haik", "min_rating": 4.5}
+    assert client.post("/api/recommend", json=query).get_json()["recommendations"] == []
+
+    db.session.execute(db.update(Book).where(Book.genre == "Haiku").values(rating=4.8))
+    db.session.commit()
+
+    data = client.post("/api/recommend", json=query).get_json()
+    assert [b["title"] for b in data["recommendations"]] == ["Sendas de otoño"]
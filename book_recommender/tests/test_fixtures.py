@@ -0,0 +1,47 @@
+# tests/test_fixtures.py
+import pytest
+
+from catalog import apply_bulk_changes, get_catalog_version
+from catalog_factory import make_books
+from database import db
+from models import Book
+from schemas import BulkBooksRequest
+
+
+def _count_books():
+    return db.session.scalar(db.select(db.func.count()).select_from(Book))
+
+
+def test_committed_writes_are_visible_within_the_test(client, catalog, admin_headers):
+    ids = catalog(30, seed=2)
+    assert ids == list(range(1, 31))
+
+    resp = client.post(
+        "/api/books/bulk",
+        json={"upserts": [{"title": "Nuevo", "author": "A", "genre": "Ensayo", "rating": 4.0}]},
+        headers=admin_headers,
+    )
+    assert resp.status_code == 200
+    # La petición ha hecho commit en su propia sesión: el test lo ve
+    assert _count_books() == 31
+    assert get_catalog_version() == 1
+
+
+def test_each_test_starts_from_an_empty_catalog(app):
+    # Lo que escribió el test anterior se ha deshecho
+    assert _count_books() == 0
+    assert get_catalog_version() == 0
+
+
+def test_failed_batch_rolls_back_only_its_savepoint(app, catalog):
+    catalog(5)
+    with pytest.raises(Exception):
+        apply_bulk_changes(BulkBooksRequest(upserts=[{"title": None, "author": "A", "genre": "X"}]))
+    db.session.rollback()
+    assert _count_books() == 5
+
+
+def test_catalog_is_deterministic(app, catalog):
+    catalog(20, seed=7)
+    rows = db.session.execute(db.select(Book.title, Book.rating).order_by(Book.id)).all()
+    assert [(r.title, r.rating) for r in rows] == [(b["title"], b["rating"]) for b in make_books(20, 7)]
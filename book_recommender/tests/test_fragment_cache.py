@@ -0,0 +1,75 @@
+# tests/test_fragment_cache.py
+import pytest
+
+import app as app_module
+from catalog import apply_bulk_changes
+from fragment_cache import FragmentCache
+from schemas import BulkBooksRequest
+
+
+@pytest.fixture
+def books(catalog):
+    return catalog(30, seed=5)
+
+
+def test_recommendations_page_reuses_cached_fragment(client, admin_headers, books, monkeypatch):
+    calls = []
+    real_recommend = app_module.recommend_books
+
+    def counting_recommend(params):
+        calls.append(params)
+        return real_recommend(params)
+
+    monkeypatch.setattr(app_module, "recommend_books", counting_recommend)
+
+    first = client.get("/recommendations?favorite_genre=Thriller&min_rating=3")
+    second = client.post("/recommendations", data={"favorite_genre": " Thriller ", "min_rating": "3"})
+    assert first.status_code == second.status_code == 200
+    assert first.data == second.data
+    assert b"<h2>Recomendaciones</h2>" in first.data
+    assert len(calls) == 1
+
+    stats = client.get("/api/admin/metrics", headers=admin_headers).get_json()["html_fragments"]
+    assert stats["hits"] == 1 and stats["misses"] == 1
+
+
+def test_catalog_change_renders_new_fragment(client, books):
+    url = "/recommendations?favorite_genre=Poesía&min_rating=0&limit=50"
+    assert b"Versos de prueba" not in client.get(url).data
+
+    apply_bulk_changes(
+        BulkBooksRequest(
+            upserts=[
+                {
+                    "title": "Versos de prueba",
+                    "author": "Autora",
+                    "genre": "Poesía",
+                    "rating": 5.0,
+                    "n_ratings": 10,
+                }
+            ]
+        )
+    )
+    assert b"Versos de prueba" in client.get(url).data
+
+
+def test_static_pages_match_rendered_templates(make_app):
+    prerendered = make_app(HTML_PRERENDER=True)
+    plain = make_app()
+    for path in ("/", "/chat", "/docs"):
+        assert prerendered.test_client().get(path).data == plain.test_client().get(path).data
+
+
+def test_fragment_cache_is_bounded():
+    cache = FragmentCache(max_entries=2, max_bytes=10)
+    for key in "abc":
+        cache.get_or_render(key, lambda: "1234")
+    assert cache.snapshot()["entries"] == 2
+    assert cache.snapshot()["evicted"] == 1
+
+    # Un fragmento que no cabe se devuelve pero no se guarda
+    assert cache.get_or_render("big", lambda: "x" * 11) == "x" * 11
+    assert cache.snapshot()["bytes"] <= 10
+
+    cache.get_or_render("a", lambda: "nuevo")
+    assert cache.snapshot()["misses"] == 5
@@ -0,0 +1,100 @@
+# tests/test_intent_router.py
+import json
+
+from database import db
+from intent_router import IntentRouter
+from models import Book
+
+GENRES = ["Fantasía", "Ciencia ficción", "Histórica", "Thriller"]
+
+
+def test_structured_queries_are_parsed():
+    """
+    Género (sin tildes, plurales), nota mínima y número de libros.
+    """
+    router = IntentRouter(GENRES)
+
+    query = router.parse("fantasía con nota mayor de 4.5")
+    assert (query.genre, query.min_rating, query.limit) == ("Fantasía", 4.5, 5)
+
+    query = router.parse("Recomiéndame 3 thrillers")
+    assert (query.genre, query.min_rating, query.limit) == ("Thriller", None, 3)
+
+    query = router.parse("libros de ciencia ficcion de al menos 4,2 estrellas")
+    assert (query.genre, query.min_rating) == ("Ciencia ficción", 4.2)
+
+
+def test_open_ended_queries_go_to_llm():
+    """
+    Mensajes abiertos o que dependen del contexto no se resuelven localmente.
+    """
+    router = IntentRouter(GENRES)
+
+    assert router.parse("algo de fantasía parecido a Dune pero más oscuro") is None
+    assert router.parse("una historia de amor") is None
+    assert router.parse("hola") is None
+    assert router.parse("¿y con nota mayor de 4?", first_turn=False) is None
+
+
+def test_negations_comparisons_and_several_genres_go_to_llm():
+    """
+    El router no sabe excluir un género, filtrar por nota máxima ni
+    combinar géneros: esos mensajes no se sirven como un top del género.
+    """
+    router = IntentRouter(GENRES)
+
+    assert router.parse("no quiero fantasía") is None
+    assert router.parse("nada de fantasía") is None
+    assert router.parse("sin thrillers") is None
+    assert router.parse("fantasía con menos de 3 estrellas") is None
+    assert router.parse("el peor thriller") is None
+    assert router.parse("fantasía con nota menor de 3") is None
+    assert router.parse("ciencia ficción o fantasía") is None
+    assert router.parse("fantasía épica") is None  # palabra sin reconocer
+
+    # "al menos" sigue siendo una nota mínima
+    assert router.parse("fantasía de al menos 4 estrellas").min_rating == 4.0
+
+
+def test_numbers_before_libros_are_counts_not_ratings():
+    """
+    "4 libros" es un nº de libros; "más de 4 libros" no es un nº exacto.
+    """
+    router = IntentRouter(GENRES + ["Terror"])
+
+    query = router.parse("dame 4 libros de terror con nota mayor de 3")
+    assert (query.genre, query.min_rating, query.limit) == ("Terror", 3.0, 4)
+
+    assert router.parse("dame más de 4 libros de terror") is None
+    assert router.parse("al menos 3 novelas de terror") is None
+
+
+def test_chat_answers_simple_query_without_llm(client, admin_headers):
+    """
+    /api/chat responde una consulta simple con el recomendador SQL
+    (sin cargar el LLM) y lo refleja en las métricas.
+    """
+    db.session.add_all(
+        [
+            Book(title="El nombre del viento", author="Patrick Rothfuss", genre="Fantasía", rating=4.7),
+            Book(title="Eragon", author="Christopher Paolini", genre="Fantasía", rating=3.9),
+            Book(title="Dune", author="Frank Herbert", genre="Ciencia ficción", rating=4.6),
+        ]
+    )
+    db.session.commit()
+
+    response = client.post(
+        "/api/chat",
+        data=json.dumps({"message": "fantasía con nota mayor de 4.5"}),
+        content_type="application/json",
+    )
+
+    assert response.status_code == 200
+    assert response.headers["X-Chat-Route"] == "local"
+    data = response.get_json()
+    assert [b["title"] for b in data["recommendations"]] == ["El nombre del viento"]
+    assert data["reply"].startswith("Aquí tienes 1 libro de Fantasía con nota")
+    assert data["session_id"]
+
+    metrics = client.get("/api/admin/metrics", headers=admin_headers).get_json()["chat_routing"]
+    assert (metrics["routed"], metrics["llm"]) == (1, 0)
@@ -0,0 +1,48 @@
+# tests/test_load_test.py
+from catalog_factory import make_books
+from load_test import FakeGeminiModel, run
+
+
+def test_make_books_is_deterministic():
+    books = make_books(50, seed=7)
+    assert books == make_books(50, seed=7)
+    assert books != make_books(50, seed=8)
+    assert all(1.0 <= b["rating"] <= 5.0 for b in books)
+
+
+def test_chat_uses_configured_model_factory(make_app, catalog):
+    """
+    Con CHAT_LLM_MODEL_FACTORY el chat no necesita Gemini ni API key.
+    """
+    model = FakeGeminiModel(latency=0, jitter=0, error_rate=0)
+    catalog(40, seed=1)
+
+    resp = make_app(CHAT_LLM_MODEL_FACTORY=lambda: model).test_client().post(
+        "/api/chat", json={"message": "Algo con giros inesperados y un narrador poco fiable"}
+    )
+    assert resp.status_code == 200
+    data = resp.get_json()
+    assert data["reply"] == "Te recomiendo estos libros."
+    assert 1 <= len(data["recommendations"]) <= 3
+
+
+def test_load_test_smoke():
+    """
+    Ejecución corta de extremo a extremo: servidor en otro proceso + clientes.
+    Los errores simulados del LLM se degradan a libros populares, no a 5xx.
+    """
+    result = run(
+        books=200,
+        levels=(2,),
+        duration=0.5,
+        llm_latency=0.01,
+        llm_jitter=0.0,
+        llm_error_rate=0.5,
+    )
+    routes = result["levels"][0]["routes"]
+    assert set(routes) == {"recommend", "recommendations", "chat"}
+    for summary in routes.values():
+        assert summary["requests"] > 0
+        assert summary["error_rate"] == 0
+        assert summary["p50_ms"] <= summary["p95_ms"] <= summary["p99_ms"]
+    assert result["server_metrics"]["chat_routing"]["llm"] > 0
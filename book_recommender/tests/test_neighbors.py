@@ -0,0 +1,143 @@
+# tests/test_neighbors.py
+import numpy as np
+import pytest
+
+import neighbors
+from catalog import apply_bulk_changes
+from database import db
+from models import Book
+from neighbors import NeighborFile, block_topk, build_neighbors, compute_neighbors, load_vectors
+from schemas import BulkBooksRequest
+
+
+@pytest.fixture
+def app_config(tmp_path):
+    return {"NEIGHBORS_PATH": str(tmp_path / "neighbors.bin")}
+
+
+@pytest.fixture
+def books(catalog):
+    return catalog(120, seed=4)
+
+
+def _brute_force_scores(vectors, k):
+    scores = vectors @ vectors.T
+    np.fill_diagonal(scores, -np.inf)
+    scores[scores <= 0] = -np.inf
+    return -np.sort(-scores, axis=1)[:, :k]
+
+
+def test_blockwise_topk_matches_brute_force():
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(97, 16)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    positions, scores = compute_neighbors(vectors, range(97), k=5, block_size=10, col_block=7)
+    np.testing.assert_allclose(scores, _brute_force_scores(vectors, 5), rtol=1e-5)
+    for i, row in enumerate(positions):
+        assert i not in row
+        np.testing.assert_allclose(vectors[row] @ vectors[i], scores[i], rtol=1e-5)
+
+    # Restringido a unos candidatos
+    cand = np.array([1, 2, 3, 50])
+    positions, _ = block_topk(vectors, [2, 60], k=10, cand_pos=cand)
+    assert set(positions[0]) - {-1} <= {1, 3, 50}
+    assert set(positions[1]) - {-1} <= set(cand)
+
+
+def test_parallel_build_writes_the_same_file(tmp_path, books):
+    serial = build_neighbors(str(tmp_path / "serial.bin"), k=8, block_size=16, workers=1)
+    parallel = build_neighbors(str(tmp_path / "parallel.bin"), k=8, block_size=16, workers=2)
+
+    assert serial["mode"] == parallel["mode"] == "full"
+    assert (tmp_path / "serial.bin").read_bytes() == (tmp_path / "parallel.bin").read_bytes()
+    nf = NeighborFile(str(tmp_path / "serial.bin"))
+    assert len(nf) == 120 and nf.k == 8
+    assert (tmp_path / "serial.bin").stat().st_size == 28 + 120 * (8 + 256 * 4 + 8 * 4 + 8 * 2)
+    np.testing.assert_array_equal(nf.vectors, load_vectors()[1])
+
+
+def test_incremental_build_matches_full_rebuild(tmp_path, app, books):
+    path = app.config["NEIGHBORS_PATH"]
+    build_neighbors(path, k=6, workers=1)
+    assert build_neighbors(path, k=6, workers=1)["mode"] == "unchanged"
+
+    apply_bulk_changes(
+        BulkBooksRequest(
+            upserts=[
+                {"id": 7, "title": "La torre de hierro", "author": "A", "genre": "Fantasía",
+                 "description": "Fantasía sobre una profecía y un imperio.", "rating": 4.0},
+                {"title": "Dragones del sur", "author": "B", "genre": "Fantasía",
+                 "description": "Fantasía sobre una guerra y un secreto.", "rating": 4.5},
+            ],
+            deletes=[10, 11],
+        )
+    )
+    result = build_neighbors(path, k=6, workers=1)
+    full = build_neighbors(str(tmp_path / "full.bin"), k=6, workers=1, full=True)
+    ids, vectors = load_vectors()
+
+    assert result["mode"] == "incremental" and result["recomputed"] < full["recomputed"]
+    inc, ref = NeighborFile(path), NeighborFile(str(tmp_path / "full.bin"))
+    assert inc.catalog_version == ref.catalog_version == 1
+    np.testing.assert_array_equal(inc.ids, ids)
+    np.testing.assert_allclose(
+        inc.scores.astype(np.float32), ref.scores.astype(np.float32), atol=2e-3
+    )
+    assert not np.isin(inc.ids[inc.positions[inc.positions >= 0]], [10, 11]).any()
+
+
+def test_similar_endpoint(app, client, admin_headers, books, monkeypatch):
+    # Sin fichero no se calcula nada al momento
+    none = client.get("/api/books/5/similar?limit=4").get_json()
+    assert none["source"] == "unavailable" and none["similar"] == []
+
+    build_neighbors(app.config["NEIGHBORS_PATH"], k=10, workers=1)
+    monkeypatch.setattr(app.extensions["neighbors"], "check_interval", 0)
+    pre = client.get("/api/books/5/similar?limit=4").get_json()
+    assert pre["source"] == "precomputed" and len(pre["similar"]) == 4
+    assert all(b["id"] != 5 for b in pre["similar"])
+    assert pre["similar"][0]["similarity"] >= pre["similar"][-1]["similarity"] > 0
+    # Nunca más vecinos que los k del fichero
+    assert len(client.get("/api/books/5/similar?limit=50").get_json()["similar"]) == 10
+
+    assert client.get("/api/books/9999/similar").status_code == 404
+    metrics = client.get("/api/admin/metrics", headers=admin_headers).get_json()["neighbors"]
+    assert metrics["loaded"] and metrics["books"] == 120
+
+
+def test_books_edited_after_the_build_are_computed_live(app, client, books, monkeypatch):
+    build_neighbors(app.config["NEIGHBORS_PATH"], k=10, workers=1)
+    monkeypatch.setattr(app.extensions["neighbors"], "check_interval", 0)
+    before = client.get("/api/books/6/similar?limit=50").get_json()
+
+    # Con el mismo texto, el cálculo al momento da las mismas similitudes que el fichero
+    # (el catálogo sintético tiene muchos empates, así que los IDs pueden variar)
+    book = db.session.get(Book, 6)
+    apply_bulk_changes(
+        BulkBooksRequest(
+            upserts=[{"id": 6, "title": book.title, "author": book.author, "genre": book.genre,
+                      "description": book.description, "rating": 1.0}]
+        )
+    )
+    live = client.get("/api/books/6/similar?limit=50").get_json()
+    assert live["source"] == "live"
+    np.testing.assert_allclose(
+        [b["similarity"] for b in live["similar"]], [b["similarity"] for b in before["similar"]], atol=2e-3
+    )
+
+    apply_bulk_changes(
+        BulkBooksRequest(
+            upserts=[{"id": 5, "title": "Versos del mar", "author": "A", "genre": "Poesía",
+                      "description": "Poemas sobre el mar y la memoria.", "rating": 4.0}]
+        )
+    )
+    # Solo se calculan los vectores de los libros cambiados, no los de todo el catálogo
+    texts = []
+    real_text_vectors = neighbors.text_vectors
+    monkeypatch.setattr(neighbors, "text_vectors", lambda t: texts.extend(t) or real_text_vectors(t))
+    edited = client.get("/api/books/5/similar?limit=50").get_json()
+    assert edited["source"] == "live" and len(texts) == 2
+    assert 0 < len(edited["similar"]) <= 10 and all(b["id"] != 5 for b in edited["similar"])
+    # Los demás libros siguen usando el fichero
+    assert client.get("/api/books/7/similar?limit=4").get_json()["source"] == "precomputed"
@@ -0,0 +1,205 @@
+# tests/test_retrieval.py
+import json
+from types import SimpleNamespace
+
+import pytest
+
+import retrieval
+from catalog import apply_bulk_changes, get_catalog_fingerprint
+from database import db
+from models import Book
+from recommender import recommend_books
+from retrieval import (
+    CandidateGenerator,
+    CatalogIndex,
+    GenreGenerator,
+    KeywordGenerator,
+    RetrievalQuery,
+    VectorGenerator,
+    genre_matcher,
+    get_engine,
+    rrf_fuse,
+    weighted_fuse,
+)
+from schemas import BulkBooksRequest, RecommendationRequest
+
+
+@pytest.fixture
+def target(catalog):
+    """
+    Catálogo de 200 libros más uno poco valorado que solo se encuentra
+    buscando por su texto; devuelve el ID de este último.
+    """
+    catalog(200, seed=5)
+    book = Book(
+        title="El alquimista de Toledo",
+        author="Nadie Conocido",
+        genre="Fantasía",
+        description="Un alquimista cría dragones en secreto.",
+        rating=3.1,
+        n_ratings=4,
+    )
+    db.session.add(book)
+    db.session.commit()
+    return book.id
+
+
+def test_fusion():
+    single = {"popularity": [(3, 4.9), (1, 4.8), (2, 4.1)]}
+    assert rrf_fuse(single, {}) == [3, 1, 2]
+    assert weighted_fuse(single, {}) == [3, 1, 2]
+
+    # Un libro que aparece en dos etapas sube por encima de los primeros de una sola
+    lists = {"keyword": [(7, 9.0), (5, 2.0)], "popularity": [(3, 4.9), (5, 4.5)]}
+    assert rrf_fuse(lists, {"keyword": 1.0, "popularity": 1.0})[0] == 5
+    # Puntuaciones normalizadas a [0, 1] en cada etapa: 7 -> 1, 3 -> 0.1, 5 -> 0
+    assert weighted_fuse(lists, {"keyword": 1.0, "popularity": 0.1}) == [7, 3, 5]
+
+
+def test_keyword_and_vector_stages_find_book_by_its_text(target):
+    engine = get_engine()
+    fingerprint = get_catalog_fingerprint()
+    query = RetrievalQuery(text="Dragón y alquimistas")
+    for stage in (KeywordGenerator(), VectorGenerator()):
+        assert stage.generate(engine, query, 5, fingerprint)[0][0] == target
+
+    books = recommend_books(RecommendationRequest(query="un alquimista con dragones", min_rating=0))
+    assert books[0].id == target
+    # Los filtros se respetan aunque el texto encaje
+    assert target not in [
+        b.id for b in recommend_books(RecommendationRequest(query="alquimista", min_rating=4.0))
+    ]
+
+
+def test_filters_match_sql(target):
+    for genre in ["ción", "FICCIÓN", "thriller", "th_iller", "Novela%negra", "ía"]:
+        expected = set(db.session.scalars(db.select(Book.genre).where(Book.genre.ilike(f"%{genre}%"))))
+        matches = genre_matcher(genre)
+        assert {g for g in db.session.scalars(db.select(Book.genre)) if matches(g)} == expected
+
+        params = RecommendationRequest(
+            query="una guerra y un secreto", favorite_genre=genre, min_rating=3.8, limit=20
+        )
+        for book in recommend_books(params):
+            assert book.genre in expected and book.rating >= 3.8
+
+
+def test_without_query_the_classic_order_is_kept(client, target):
+    classic = client.get("/api/recommend?favorite_genre=Thriller&min_rating=3&limit=10")
+    assert "Server-Timing" not in classic.headers
+
+    ids = get_engine().retrieve(RetrievalQuery(genre="Thriller", min_rating=3), 10)
+    assert ids == [b["id"] for b in classic.get_json()["recommendations"]]
+
+
+@pytest.mark.parametrize(
+    "app_config", [{"RETRIEVAL_FUSION": "weighted", "RETRIEVAL_BUDGETS": {"vector": 0}}]
+)
+def test_server_timing_and_metrics(client, admin_headers, target):
+    for _ in range(2):
+        resp = client.get("/api/recommend?query=dragones&min_rating=0")
+        assert resp.status_code == 200
+
+    timing = resp.headers["Server-Timing"]
+    assert "retrieval-keyword;dur=" in timing and "retrieval-fusion;dur=" in timing
+    assert "retrieval-vector" not in timing
+
+    metrics = client.get("/api/admin/metrics", headers=admin_headers).get_json()["retrieval"]
+    assert metrics["fusion"] == "weighted"
+    assert metrics["stages"]["keyword"]["calls"] == 2
+    assert metrics["stages"]["keyword"]["cache_hits"] == 1
+    assert metrics["stages"]["vector"]["calls"] == 0
+
+
+def test_generators_must_implement_generate():
+    with pytest.raises(TypeError):
+        CandidateGenerator()
+
+
+def test_index_is_updated_from_the_change_feed(target, monkeypatch):
+    engine = get_engine()
+    old = engine.catalog_index(get_catalog_fingerprint())
+    assert old.vectors.shape[0] == old.n_docs == 201
+
+    event = apply_bulk_changes(
+        BulkBooksRequest(
+            upserts=[
+                {"id": 7, "title": "El alquimista de Sevilla", "author": "A", "genre": "Poesía",
+                 "description": "Versos sobre dragones.", "rating": 4.9, "n_ratings": 10},
+                {"title": "Dragones del sur", "author": "B", "genre": "Fantasía",
+                 "description": "Un alquimista y una guerra.", "rating": 4.5},
+            ],
+            deletes=[10, 11],
+        )
+    )
+
+    # Solo se leen los libros cambiados: construir desde cero fallaría
+    rebuild = CatalogIndex.__init__
+    monkeypatch.setattr(CatalogIndex, "__init__", lambda *a, **k: pytest.fail("reconstrucción completa"))
+    fingerprint = get_catalog_fingerprint()
+    assert fingerprint.version == event.version
+    new = engine.catalog_index(fingerprint)
+    monkeypatch.setattr(CatalogIndex, "__init__", rebuild)
+    fresh = CatalogIndex(retrieval._index_rows(), fingerprint=fingerprint)
+
+    assert old.n_docs == 201 and new.n_docs == fresh.n_docs == 200
+    assert new.position(10) is None and new.genres[new.position(7)] == "Poesía"
+    assert new.avg_len == pytest.approx(fresh.avg_len)
+
+    # Las etapas dan lo mismo con el índice actualizado que con uno nuevo
+    queries = [
+        RetrievalQuery(text="alquimista dragones"),
+        RetrievalQuery(text="poesía", min_rating=4),
+        RetrievalQuery(text="fantasía guerra", genre="ía"),
+    ]
+    for query in queries:
+        for stage in (GenreGenerator(), KeywordGenerator(), VectorGenerator()):
+            results = [
+                {
+                    book_id: round(score, 5)
+                    for book_id, score in stage.generate(
+                        SimpleNamespace(catalog_index=lambda fp: index), query, 1000, fingerprint
+                    )
+                }
+                for index in (new, fresh)
+            ]
+            assert results[0] == results[1], (stage.name, query)
+
+
+def test_index_is_rebuilt_after_writes_outside_the_change_feed(target):
+    engine = get_engine()
+    old = engine.catalog_index(get_catalog_fingerprint())
+
+    db.session.execute(db.update(Book).where(Book.id == target).values(genre="Poesía"))
+    db.session.commit()
+
+    fingerprint = get_catalog_fingerprint()
+    assert fingerprint.version == old.fingerprint.version
+    new = engine.catalog_index(fingerprint)
+    assert new is not old and new.genres[new.position(target)] == "Poesía"
+
+
+class _PromptRecorder:
+    def __init__(self):
+        self.prompts = []
+
+    def generate_content(self, parts):
+        self.prompts.append(parts[-1])
+
+        class Response:
+            text = json.dumps({"answer": "Mira estos.", "book_ids": []})
+
+        return Response()
+
+
+def test_chat_candidates_come_from_the_user_message(make_app, target):
+    model = _PromptRecorder()
+    client = make_app(CHAT_LLM_MODEL_FACTORY=lambda: model, CHAT_LOCAL_ROUTER=False).test_client()
+
+    client.post("/api/chat", json={"message": "Quiero leer sobre un alquimista"})
+    client.post(
+        "/api/chat",
+        json={"messages": [{"role": "user", "content": "¿Algo de dragones?"}]},
+    )
+    assert all(f"ID {target}:" in prompt for prompt in model.prompts)
+    assert len(model.prompts) == 2
@@ -0,0 +1,101 @@
+# tests/test_sessions.py
+import json
+from types import SimpleNamespace
+
+import pytest
+
+import chat_llm
+from database import db
+from models import Book, ChatSessionRecord
+from sessions import ChatSession, SessionStore, SQLiteSessionBackend
+
+
+class FakeGenai:
+    """
+    Sustituto de google.generativeai que guarda los prompts recibidos.
+    """
+
+    def __init__(self):
+        self.prompts = []
+
+    def configure(self, api_key):
+        pass
+
+    def GenerativeModel(self, name):
+        def generate_content(parts):
+            self.prompts.append(parts[1])
+            return SimpleNamespace(text=json.dumps({"answer": "Te gustará", "book_ids": [1]}))
+
+        return SimpleNamespace(generate_content=generate_content)
+
+
+def test_store_evicts_lru_and_expires_by_ttl():
+    """
+    El almacén expulsa la sesión menos usada y olvida las caducadas.
+    """
+    store = SessionStore(max_sessions=2, ttl=60)
+    a, b, c = ChatSession("a"), ChatSession("b"), ChatSession("c")
+    store.put(a)
+    store.put(b)
+    assert store.get("a") is a  # "a" pasa a ser la más reciente
+    store.put(c)
+
+    assert store.get("b") is None
+    assert store.get("a") is a
+
+    a.updated_at -= 120
+    assert store.get("a") is None
+    assert store.snapshot()["expired"] == 1
+
+
+@pytest.mark.parametrize("app_config", [{"CHAT_SESSION_BACKEND": "sqlite"}])
+def test_chat_session_sends_only_new_message(client, monkeypatch):
+    """
+    Con sesión, el segundo turno solo envía el mensaje nuevo: el historial
+    y los candidatos del primer turno se reutilizan en el servidor (SQLite).
+    """
+    fake = FakeGenai()
+    monkeypatch.setattr(chat_llm, "_get_genai", lambda: fake)
+    monkeypatch.setenv("GEMINI_API_KEY", "test")
+
+    db.session.add(Book(id=1, title="Dune", author="Frank Herbert", genre="Ciencia ficcion", rating=4.6))
+    db.session.commit()
+
+    def post(payload):
+        return client.post("/api/chat", data=json.dumps(payload), content_type="application/json")
+
+    first = post({"message": "Quiero ciencia ficción con naves y política"}).get_json()
+    session_id = first["session_id"]
+    assert first["recommendations"][0]["title"] == "Dune"
+
+    calls = []
+    monkeypatch.setattr(chat_llm, "_get_candidate_books", lambda: calls.append(1))
+    second = post({"session_id": session_id, "message": "¿Y algo más corto?"}).get_json()
+
+    assert second["session_id"] == session_id
+    assert calls == []  # candidatos reutilizados de la sesión
+    assert "Quiero ciencia ficción con naves y política" in fake.prompts[-1]
+    assert "¿Y algo más corto?" in fake.prompts[-1]
+
+    # La sesión persiste en SQLite: un almacén nuevo la recupera
+    restored = SessionStore(backend=SQLiteSessionBackend()).get(session_id)
+    assert len(restored.messages) == 4
+
+
+def test_sqlite_backend_purges_expired_sessions(app):
+    """
+    Las sesiones caducadas se borran de chat_sessions al guardar otra
+    (como mucho una vez por purge_interval).
+    """
+    store = SessionStore(ttl=60, backend=SQLiteSessionBackend(), purge_interval=0)
+
+    old = ChatSession("old")
+    store.put(old)
+    old.updated_at -= 120
+    store.backend.save(old)
+
+    store.put(ChatSession("new"))
+    assert db.session.get(ChatSessionRecord, "old") is None
+    assert db.session.get(ChatSessionRecord, "new") is not None
+    assert store.get("old") is None
+    assert store.snapshot()["purged"] == 1
@@ -0,0 +1,91 @@
+# tests/test_slow_queries.py
+import pytest
+
+import slow_queries
+from slow_queries import SlowQueryLog, _is_full_scan
+
+
+# El registro escucha los eventos del engine: tiene que configurarse en la
+# app del fixture `app`, dueña de la conexión del test (ver conftest.py).
+@pytest.fixture
+def app_config():
+    return {"SLOW_QUERY_THRESHOLD_MS": 0}
+
+
+@pytest.fixture(autouse=True)
+def books(catalog):
+    return catalog(30, seed=3)
+
+
+@pytest.mark.parametrize(
+    "app_config", [{"SLOW_QUERY_THRESHOLD_MS": 0, "SLOW_QUERY_KEEP_PARAMS": True}]
+)
+def test_slow_queries_are_recorded_with_plan(client, admin_headers):
+    # Con umbral 0 todas las consultas cuentan como lentas
+    assert client.get("/api/recommend?favorite_genre=Thriller&min_rating=3").status_code == 200
+
+    resp = client.get("/api/admin/slow-queries", headers=admin_headers)
+    assert resp.status_code == 200
+    data = resp.get_json()
+    assert data["slow"] > 0
+
+    books_query = next(
+        s for s in data["statements"] if "FROM books" in s["statement"] and "LIKE" in s["statement"]
+    )
+    assert books_query["count"] == 1
+    assert any("books" in step for step in books_query["plan"])
+    # Sin índices sobre genre/rating la búsqueda recorre la tabla entera
+    assert books_query["full_scan"] is True
+    assert "3.0" in books_query["parameters"]
+    assert data["recent"][0]["duration_ms"] >= 0
+
+
+@pytest.mark.parametrize("app_config", [{"SLOW_QUERY_THRESHOLD_MS": 10_000}])
+def test_fast_queries_are_not_recorded(client, admin_headers):
+    client.get("/api/recommend")
+
+    data = client.get("/api/admin/slow-queries?order=max", headers=admin_headers).get_json()
+    assert data["executed"] > 0
+    assert data["slow"] == 0
+    assert data["statements"] == [] and data["recent"] == []
+
+
+def test_parameters_are_redacted_by_default(client, admin_headers):
+    client.get("/api/recommend?favorite_genre=Thriller&min_rating=3")
+
+    data = client.get("/api/admin/slow-queries", headers=admin_headers).get_json()
+    params = [p for s in data["statements"] for p in s["parameters"]]
+    params += [p for r in data["recent"] for p in r["parameters"]]
+    assert params and set(params) == {"?"}
+
+
+def test_slow_query_log_is_off_by_default_and_needs_the_admin_token(make_app, client, admin_headers):
+    default = make_app()
+    assert "slow_queries" not in default.extensions
+    assert default.test_client().get("/api/admin/slow-queries", headers=admin_headers).status_code == 404
+
+    assert client.get("/api/admin/slow-queries").status_code == 401
+    disabled = make_app(SLOW_QUERY_THRESHOLD_MS=0, ADMIN_TOKEN=None).test_client()
+    assert disabled.get("/api/admin/slow-queries", headers=admin_headers).status_code == 404
+
+
+def test_full_scan_detection():
+    assert _is_full_scan(["SCAN books", "USE TEMP B-TREE FOR ORDER BY"])
+    assert not _is_full_scan(["SEARCH books USING INTEGER PRIMARY KEY (rowid=?)"])
+    assert not _is_full_scan(["SCAN books USING INDEX ix_books_rating"])
+
+
+def test_statement_stats_evict_the_cheapest_statement(monkeypatch):
+    """
+    Sin hueco para una sentencia nueva se descarta la que menos tiempo
+    acumula, no la más antigua.
+    """
+    monkeypatch.setattr(slow_queries, "MAX_STATEMENTS", 3)
+    log = SlowQueryLog()
+    for statement, elapsed_ms in [("A", 900.0), ("B", 150.0), ("C", 400.0), ("B", 150.0), ("D", 120.0)]:
+        log._accumulate(statement, elapsed_ms, [], None)
+    assert {s["statement"] for s in log.snapshot()["statements"]} == {"A", "C", "D"}
+
+    log._accumulate("E", 110.0, [], None)
+    stats = {s["statement"]: s["total_ms"] for s in log.snapshot()["statements"]}
+    assert stats == {"A": 900.0, "C": 400.0, "E": 110.0}
@@ -0,0 +1,11 @@
+# tests/test_startup.py
+from bench_startup import measure_once
+
+
+def test_create_app_does_not_load_llm_stack():
+    """
+    Arrancar la app (import + create_app) no debe importar chat_llm
+    ni google.generativeai: el chatbot se carga en la primera petición.
+    """
+    result = measure_once()
+    assert result["llm_loaded"] is False
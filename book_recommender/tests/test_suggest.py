@@ -0,0 +1,126 @@
+# tests/test_suggest.py
+import json
+import threading
+
+import pytest
+
+import suggest
+from database import db
+from models import Book
+from suggest import SuggestIndex
+from text_utils import fold_text
+
+
+@pytest.fixture(autouse=True)
+def dune(app):
+    db.session.add(Book(title="Dune", author="Frank Herbert", genre="Ciencia ficcion", rating=4.6))
+    db.session.commit()
+
+
+def _add_karamazov(client, admin_headers):
+    resp = client.post(
+        "/api/books/bulk",
+        data=json.dumps(
+            {"upserts": [{"title": "Hermanos Karamazov", "author": "Dostoievski",
+                          "genre": "Clasico", "rating": 4.7, "n_ratings": 50}]}
+        ),
+        content_type="application/json",
+        headers=admin_headers,
+    )
+    assert resp.status_code == 200
+
+
+def test_prefix_matching_is_accent_insensitive_and_ranked():
+    """
+    Las sugerencias ignoran tildes/mayúsculas, casan con cualquier palabra
+    y se ordenan por popularidad.
+    """
+    index = SuggestIndex(
+        [
+            ("Fantasía", "genre", 500),
+            ("Fantasmas de Gaudí", "title", 10),
+            ("El Señor de los Anillos", "title", 250),
+        ]
+    )
+
+    assert [s["text"] for s in index.suggest("fan")] == ["Fantasía", "Fantasmas de Gaudí"]
+    assert [s["text"] for s in index.suggest("FANTASI")] == ["Fantasía"]
+    assert [s["text"] for s in index.suggest("senor de")] == ["El Señor de los Anillos"]
+    assert [s["text"] for s in index.suggest("fan", kind="title")] == ["Fantasmas de Gaudí"]
+    assert index.suggest("   ") == []
+
+
+def test_long_prefixes_with_many_matches_use_the_precomputed_top():
+    """
+    Los prefijos largos que abarcan muchas claves ("sombra del") dan lo
+    mismo que recorrer todo el rango, en total y por tipo.
+    """
+    entries = [(f"La sombra del viento {i}", "title", i % 97) for i in range(300)]
+    entries += [(f"Sombra {i}", "author", i % 89) for i in range(200)]
+    index = SuggestIndex(entries)
+
+    def scan(prefix, kind=None):
+        matching = [
+            i for i, (text, k, _) in enumerate(entries)
+            if (kind is None or k == kind)
+            and any(" ".join(fold_text(text).split()[n:]).startswith(prefix)
+                    for n in range(len(text.split())))
+        ]
+        ranked = sorted(matching, key=lambda i: (-entries[i][2], i))
+        return [entries[i][0] for i in ranked[:suggest.MAX_SUGGESTIONS]]
+
+    for prefix in ("s", "sombra", "sombra del", "la sombra del viento 1"):
+        assert (None, prefix) in index._top
+        for kind in (None, "title", "author"):
+            assert [s["text"] for s in index.suggest(prefix, kind=kind)] == scan(prefix, kind)
+
+
+def test_suggest_endpoint_refreshes_after_catalog_change(client, admin_headers):
+    """
+    /api/suggest se actualiza cuando cambia la versión del catálogo.
+    """
+    data = client.get("/api/suggest?prefix=her").get_json()
+    assert data["suggestions"] == [{"text": "Frank Herbert", "kind": "author"}]
+
+    _add_karamazov(client, admin_headers)
+    data = client.get("/api/suggest?prefix=her").get_json()
+    assert data["suggestions"][0] == {"text": "Hermanos Karamazov", "kind": "title"}
+
+
+@pytest.mark.parametrize("app_config", [{"SUGGEST_BACKGROUND_REBUILD": True}])
+def test_background_rebuild_serves_the_previous_index(app, client, admin_headers, monkeypatch):
+    """
+    Mientras se reconstruye en segundo plano se sirve el índice anterior.
+    """
+    assert client.get("/api/suggest?prefix=her").get_json()["suggestions"]
+    _add_karamazov(client, admin_headers)
+
+    # El hilo no puede usar la conexión del test: construye sin tocar la BD
+    release = threading.Event()
+
+    def build(fingerprint):
+        release.wait(5)
+        return SuggestIndex([("Hermanos Karamazov", "title", 50)], fingerprint=fingerprint)
+
+    monkeypatch.setattr(suggest, "build_suggest_index", build)
+    data = client.get("/api/suggest?prefix=her").get_json()
+    assert data["suggestions"] == [{"text": "Frank Herbert", "kind": "author"}]
+
+    release.set()
+    app.extensions["suggest"].wait()
+    data = client.get("/api/suggest?prefix=her").get_json()
+    assert data["suggestions"] == [{"text": "Hermanos Karamazov", "kind": "title"}]
+
+
+@pytest.mark.parametrize("app_config", [{"SUGGEST_REFRESH_SECONDS": 0}])
+def test_suggest_sees_books_renamed_outside_the_change_feed(client):
+    """
+    Un UPDATE directo en books no cambia la versión, pero sí la huella.
+    """
+    assert client.get("/api/suggest?prefix=arrakis").get_json()["suggestions"] == []
+
+    db.session.execute(db.update(Book).where(Book.title == "Dune").values(title="Arrakis"))
+    db.session.commit()
+
+    data = client.get("/api/suggest?prefix=arrakis").get_json()
+    assert data["suggestions"] == [{"text": "Arrakis", "kind": "title"}]
@@ -0,0 +1,10 @@
+# text_utils.py
+import unicodedata
+
+
+def fold_text(text: str) -> str:
+    """
+    Pasa a minúsculas y elimina tildes ("Fantasía" -> "fantasia").
+    """
+    normalized = unicodedata.normalize("NFKD", text or "")
+    return "".join(c for c in normalized if not unicodedata.combining(c)).lower()